@@ -10,10 +10,14 @@ from modules.delete_elements import delete_elements_by_config
 from config.delete_config import delete_config_file
 
 from config.lap_gauss_config import lap_gauss_config_file
-from modules.lap_gauss_processing import process_laplace_gaussian_wrapper
+from modules.lap_gauss_processing import build_lap_gauss_work_units, process_lap_gauss_unit, write_lap_gauss_file
 
 from config.exp_config import exponential_config_file
-from modules.exp_processing import process_resource
+from modules.exp_processing import build_exp_work_units, process_exp_unit, split_slot_values, write_exp_file
+
+from modules.fused_pipeline import process_resource_fused
+from modules.column_cache import prune_cache
+from modules.rng import create_seed_sequence
 
 from modules.id_mapping import build_global_id_mapping, update_references_parallel, global_id_mapping
 
@@ -24,19 +28,11 @@ from modules_graph.node_config_creation import analyze_dataset_and_create_node_c
 
 
 
-def main():
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-
-    original_folder_path = os.path.join(BASE_DIR, "data", "original10")
-    temp_output_folder_path = os.path.join(BASE_DIR, "data", "temp_anonymized")
-    final_output_folder_path = os.path.join(BASE_DIR, "data", "anonymized")
-    id_mapping_output_folder_path = os.path.join(BASE_DIR, "data", "id_mapped")
-    config_output_path = os.path.join(BASE_DIR, "config", "graph_config.py")
-    node_config_output_path = os.path.join(BASE_DIR, "config", "node_config.py")
-
-
-    max_iterations = 1000
-
+def run_sequential_pipeline(original_folder_path, temp_output_folder_path, final_output_folder_path, max_iterations,
+                            cache_folder_path=None, seed_sequence=None):
+    """
+    Runs Algorithm 1, Algorithm 2 and the final deletion as separate stages, each reading and writing every file.
+    """
     # ----------------- Step 1: Algorithm 1 -----------------
     print("Start Algorithm 1 Anonymization...")
 
@@ -46,17 +42,39 @@ def main():
     #     filename for filename in os.listdir(original_folder_path) if filename.endswith(".xml")
     # ]
 
+    # Extract every file once and split the resources into (file, attribute) units, largest columns first
+    work_units = build_lap_gauss_work_units(lap_gauss_config_file, original_folder_path, cache_folder_path)
+
+    with ProcessPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                process_lap_gauss_unit, # Parallelization of (file, attribute) units per CPU Kernel
+                unit,
+                original_folder_path,
+                max_iterations,
+                "analytic",
+                seed_sequence
+            )
+            for unit in work_units
+        ]
+        unit_results = {}
+        for future in futures:
+            filename, attribute, anonymized = future.result()
+            unit_results.setdefault(filename, {})[attribute] = anonymized
+
+    # Merge the accepted values and write every file exactly once
+    file_attributes = {unit["filename"]: lap_gauss_config_file[unit["resource"]] for unit in work_units}
     with ProcessPoolExecutor() as executor:
         futures = [
             executor.submit(
-                process_laplace_gaussian_wrapper, # Parallelization of Ressources per CPU Kernel
-                resource,
-                attributes,
+                write_lap_gauss_file,
+                filename,
+                results,
+                file_attributes[filename],
                 original_folder_path,
-                temp_output_folder_path,  
-                max_iterations
+                temp_output_folder_path
             )
-            for resource, attributes in lap_gauss_config_file.items()
+            for filename, results in unit_results.items()
         ]
         for future in futures:
             future.result()
@@ -68,25 +86,54 @@ def main():
 
     os.makedirs(final_output_folder_path, exist_ok=True)
 
-    
+    # Algorithm 2 reads the temporary output and writes its result once, only the other files are copied
+    exp_filenames = []
     for filename in os.listdir(temp_output_folder_path):
-        if filename.endswith('.xml'):
+        if not filename.endswith('.xml'):
+            continue
+        if any(filename.startswith(resource) for resource in exponential_config_file):
+            exp_filenames.append(filename)
+        else:
             temp_file_path = os.path.join(temp_output_folder_path, filename)
             final_output_file_path = os.path.join(final_output_folder_path, filename)
             shutil.copy(temp_file_path, final_output_file_path)
 
-    
+    # Extract once and split the resources into (resource, attribute) units, largest attributes first
+    exp_units, resource_file_slot_values = build_exp_work_units(exponential_config_file, temp_output_folder_path)
+
     with ProcessPoolExecutor() as executor:
         futures = [
             executor.submit(
-                process_resource,
-                resource,
-                attributes,
-                final_output_folder_path,  
-                final_output_folder_path,  
-                max_iterations
+                process_exp_unit, # Parallelization of (resource, attribute) units per CPU Kernel
+                unit,
+                max_iterations,
+                seed_sequence
             )
-            for resource, attributes in exponential_config_file.items()
+            for unit in exp_units
+        ]
+        resource_assignments = {}
+        for future in futures:
+            resource, attribute, values = future.result()
+            resource_assignments.setdefault(resource, {})[attribute] = values
+
+    # Split the accepted values back into the files, every file has exactly one writer
+    # (files without values, e.g. not parsable ones, are copied by write_exp_file)
+    file_assignments = {filename: {} for filename in exp_filenames}
+    for resource, assignments in resource_assignments.items():
+        for filename, values in split_slot_values(assignments, resource_file_slot_values[resource]).items():
+            file_assignments.setdefault(filename, {})[resource] = values
+
+    with ProcessPoolExecutor() as executor:
+        futures = [
+            executor.submit(
+                write_exp_file,
+                filename,
+                assignments,
+                exponential_config_file,
+                temp_output_folder_path,
+                final_output_folder_path
+            )
+            for filename, assignments in file_assignments.items()
         ]
         for future in futures:
             future.result()
@@ -101,6 +148,71 @@ def main():
 
     logging.info(f"The combined anonymization has been completed. Final output: {final_output_folder_path}")
 
+
+def main():
+    # Configured before the first message, otherwise logging.info installs a WARNING handler and hides the seed
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+    original_folder_path = os.path.join(BASE_DIR, "data", "original10")
+    temp_output_folder_path = os.path.join(BASE_DIR, "data", "temp_anonymized")
+    final_output_folder_path = os.path.join(BASE_DIR, "data", "anonymized")
+    id_mapping_output_folder_path = os.path.join(BASE_DIR, "data", "id_mapped")
+    config_output_path = os.path.join(BASE_DIR, "config", "graph_config.py")
+    node_config_output_path = os.path.join(BASE_DIR, "config", "node_config.py")
+    # Extracted attribute values per file content, re-tuning rmse_range/tvd_range then skips the XML parsing.
+    # The cache holds the un-anonymized values, so it is opt-in, e.g. os.path.join(BASE_DIR, "data", "cache")
+    cache_folder_path = None
+
+
+    max_iterations = 1000
+
+    # Seed of the noise: every (file, attribute) or (resource, attribute) unit draws from its own child stream,
+    # so a run is reproducible for a given seed independent of the worker scheduling (None = fresh entropy)
+    seed = None
+    seed_sequence = create_seed_sequence(seed)
+    logging.info(f"Seed of the run: {seed_sequence.entropy}")
+
+    # Fused mode: Algorithm 1, Algorithm 2 and the deletion are applied to every record in one read and one write
+    fused_pipeline = True
+
+    if fused_pipeline:
+        print("Start fused anonymization (Algorithm 1, Algorithm 2 and deletion)...")
+
+        os.makedirs(final_output_folder_path, exist_ok=True)
+
+        with ProcessPoolExecutor() as executor:
+            futures = [
+                executor.submit(
+                    process_resource_fused,
+                    resource,
+                    original_folder_path,
+                    final_output_folder_path,
+                    attributes,
+                    exponential_config_file.get(resource, {}),
+                    delete_config_file.get(resource),
+                    max_iterations,
+                    "analytic",
+                    cache_folder_path,
+                    seed_sequence
+                )
+                for resource, attributes in lap_gauss_config_file.items()
+            ]
+            for future in futures:
+                future.result()
+
+        print("Fused anonymization completed!")
+    else:
+        run_sequential_pipeline(
+            original_folder_path, temp_output_folder_path, final_output_folder_path, max_iterations, cache_folder_path,
+            seed_sequence
+        )
+
+    # Remove the cached original values of changed or deleted input files
+    if cache_folder_path is not None:
+        prune_cache(cache_folder_path, original_folder_path)
+
     # # ----------------- Step 4: ID-Mapping -----------------
     # print("Start ID Mapping...")
 
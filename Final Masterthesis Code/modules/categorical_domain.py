@@ -0,0 +1,100 @@
+import numpy as np
+
+from modules.exp_adjustment import add_laplace_noise_to_count_array
+from modules.exp_dummy_handler import calculate_dummy_counter, create_dummy_value_for_attribute
+
+
+class CategoricalDomain:
+    """
+    Dictionary-encoded values of one Algorithm 2 attribute.
+
+    Every distinct value (a string or a tuple of strings such as ('M', 'Married', 'Married')) is mapped to an
+    int32 code once. The slots are kept as a code array, the original counts as a NumPy array indexed by code,
+    so counting, noising, sampling and the TVD of the feedback loop work on arrays and never hash the values.
+    """
+
+    def __init__(self, values):
+        """
+        :param values: List with the original value of every slot
+        """
+        self.categories = []
+        self.codes_by_value = {}
+        self.codes = self.encode(values)
+        self.counts = np.bincount(self.codes, minlength=self.size).astype(np.int64)
+
+    @property
+    def size(self):
+        """
+        :return: Number of distinct values
+        """
+        return len(self.categories)
+
+    def encode(self, values):
+        """
+        Maps values to their codes, unknown values receive a new code.
+
+        :param values: Iterable of values
+        :return: int32 array with the codes
+        """
+        codes = []
+        for value in values:
+            code = self.codes_by_value.get(value)
+            if code is None:
+                code = len(self.categories)
+                self.codes_by_value[value] = code
+                self.categories.append(value)
+            codes.append(code)
+        return np.array(codes, dtype=np.int32)
+
+    def decode(self, codes):
+        """
+        :param codes: Array with codes
+        :return: List with the values of the codes
+        """
+        return [self.categories[code] for code in np.asarray(codes).tolist()]
+
+    def count_codes(self, codes):
+        """
+        :param codes: Array with codes (e.g. an assignment of the slots)
+        :return: int64 array with the frequency of every code
+        """
+        return np.bincount(codes, minlength=self.size).astype(np.int64)
+
+    def utility_scores(self):
+        """
+        Array counterpart of calculate_utility_scores (relative frequencies).
+
+        :return: Float array with the utility score of every code
+        """
+        total_count = self.counts.sum()
+        if total_count == 0:
+            raise ValueError("The total number of entries is 0.")
+        return self.counts / total_count
+
+    def noisy_counts(self, epsilon, rng=None):
+        """
+        Laplace noise with sensitivity 1 on every count, clamped to 1, proportionally topped up to the
+        original total and rounded (see add_laplace_noise_to_count_array).
+
+        :param epsilon: Data protection parameter ε
+        :param rng: Optional numpy.random.Generator (see modules.rng)
+        :return: int64 array with the noisy count of every code
+        """
+        return add_laplace_noise_to_count_array(self.counts, epsilon, rng)
+
+    def add_dummy(self, details):
+        """
+        Adds the dummy value of the attribute to the original counts (see add_dummy_to_pool).
+        """
+        dummy_counter = calculate_dummy_counter(dict(zip(self.categories, self.counts.tolist())))
+        code = self.encode([create_dummy_value_for_attribute(details)])[0]
+        self.counts = np.pad(self.counts, (0, self.size - self.counts.size))
+        self.counts[code] += dummy_counter
+
+    def scale_dummy(self, details, factor):
+        """
+        Multiplies the original count of the dummy value of the attribute.
+        """
+        code = self.codes_by_value.get(create_dummy_value_for_attribute(details))
+        if code is not None:
+            self.counts[code] *= factor
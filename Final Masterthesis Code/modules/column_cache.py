@@ -0,0 +1,297 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+
+from modules.exp_extract_attributes import collect_slot_values_in_record
+from modules.lap_gauss_anonymization import extract_attribute_columns_from_file
+
+# The cache holds the ORIGINAL, un-anonymized attribute values (dates, decimals, categories such as addresses).
+# It is therefore disabled by default, must never be shipped next to the anonymized output and is pruned with
+# prune_cache at the end of a run.
+
+# Increase when the layout of the cache files changes, old entries are then ignored
+CACHE_VERSION = 3
+
+# Keys of an attribute configuration that determine the extracted values (tuning ranges and parameters do not)
+EXTRACTION_KEYS = ("type", "path", "paths", "filter")
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """
+    Hashes the content of a file (SHA-256).
+
+    :param file_path: Path to the file
+    :param chunk_size: Number of bytes read at once
+    :return: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_hash(algorithm, attribute, settings):
+    """
+    Hashes the extraction-relevant part of an attribute configuration, so re-tuning rmse_range or
+    tvd_range reuses the cached values.
+
+    :param algorithm: "lap_gauss" or "exp"
+    :param attribute: Name of the attribute
+    :param settings: Settings of the attribute from the configuration
+    :return: Hex digest
+    """
+    signature = {key: settings[key] for key in EXTRACTION_KEYS if key in settings}
+    payload = json.dumps([CACHE_VERSION, algorithm, attribute, signature], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def prune_cache(cache_folder, original_folder_path):
+    """
+    Deletes the cache entries of files that no longer exist or whose content has changed, so every input
+    revision does not leave another copy of the original values behind.
+
+    :param cache_folder: Folder of the cache
+    :param original_folder_path: Folder with the current input files
+    :return: Number of deleted entries
+    """
+    if not os.path.isdir(cache_folder):
+        return 0
+
+    deleted = 0
+    current_hashes = {}
+    for entry in os.listdir(cache_folder):
+        filename, _, hash_prefix = entry.rpartition(".")
+        file_path = os.path.join(original_folder_path, filename)
+        if filename not in current_hashes:
+            current_hashes[filename] = file_hash(file_path)[:16] if os.path.isfile(file_path) else None
+        if current_hashes[filename] != hash_prefix:
+            shutil.rmtree(os.path.join(cache_folder, entry), ignore_errors=True)
+            deleted += 1
+    return deleted
+
+
+def cache_entry_path(cache_folder, filename, content_hash, algorithm, attribute, settings):
+    """
+    Builds the path prefix of the cache files of one attribute of one file.
+
+    :return: Path prefix (the files append ".json" and ".<array>.npy")
+    """
+    folder = os.path.join(cache_folder, f"{filename}.{content_hash[:16]}")
+    return os.path.join(folder, f"{algorithm}.{config_hash(algorithm, attribute, settings)[:16]}")
+
+
+def save_array(path, array):
+    """
+    Saves a NumPy array atomically (temporary file in the same folder, then os.replace).
+    """
+    fd, temp_path = tempfile.mkstemp(suffix=".npy", dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as file:
+        np.save(file, array)
+    os.replace(temp_path, path)
+
+
+def save_entry(prefix, arrays, metadata):
+    """
+    Writes the arrays of a cache entry and finally its metadata. The metadata file marks the entry as complete.
+
+    :param prefix: Path prefix from cache_entry_path
+    :param arrays: Dictionary {name: NumPy array}
+    :param metadata: JSON-serializable dictionary
+    """
+    os.makedirs(os.path.dirname(prefix), exist_ok=True)
+    for name, array in arrays.items():
+        save_array(f"{prefix}.{name}.npy", array)
+
+    fd, temp_path = tempfile.mkstemp(suffix=".json", dir=os.path.dirname(prefix))
+    with os.fdopen(fd, "w", encoding="utf-8") as file:
+        json.dump(metadata, file)
+    os.replace(temp_path, f"{prefix}.json")
+
+
+def load_entry(prefix, names):
+    """
+    Memory-maps the arrays of a complete cache entry.
+
+    :param prefix: Path prefix from cache_entry_path
+    :param names: Names of the arrays
+    :return: Tuple (metadata, {name: read-only memory-mapped array}), or None if the entry does not exist
+    """
+    try:
+        with open(f"{prefix}.json", encoding="utf-8") as file:
+            metadata = json.load(file)
+        return metadata, {name: np.load(f"{prefix}.{name}.npy", mmap_mode="r") for name in names}
+    except (OSError, ValueError):
+        return None
+
+
+def encode_categories(values):
+    """
+    Dictionary-encodes a list of categories (strings or tuples of strings).
+
+    :return: Tuple (list of distinct categories in order of appearance, int32 array with the category ids)
+    """
+    ids = {}
+    codes = np.fromiter((ids.setdefault(value, len(ids)) for value in values), dtype=np.int32, count=len(values))
+    return list(ids), codes
+
+
+def decode_categories(categories, codes):
+    """
+    Decodes category ids from encode_categories (tuples are restored from their JSON lists).
+    """
+    categories = [tuple(category) if isinstance(category, list) else category for category in categories]
+    return [categories[code] for code in codes.tolist()]
+
+
+def save_attribute_column(prefix, column, records_processed):
+    """
+    Caches an Algorithm 1 column: the values (epoch-based dates or floats), the record offsets and the
+    dictionary-encoded timezone suffixes and date precisions.
+    """
+    tz_categories, tz_codes = encode_categories(column["tz_suffixes"])
+    precision_categories, precision_codes = encode_categories(column["precisions"].tolist())
+    save_entry(
+        prefix,
+        {
+            "values": column["values"], "record_offsets": column["record_offsets"], "tz_codes": tz_codes,
+            "precision_codes": precision_codes,
+        },
+        {
+            "kind": column["kind"], "records": records_processed, "tz_categories": tz_categories,
+            "precision_categories": precision_categories,
+        },
+    )
+
+
+def load_attribute_column(prefix, attribute):
+    """
+    Loads a cached Algorithm 1 column.
+
+    :return: Tuple (column, number of records), or None if the column is not cached
+    """
+    entry = load_entry(prefix, ("values", "record_offsets", "tz_codes", "precision_codes"))
+    if entry is None:
+        return None
+    metadata, arrays = entry
+    column = {
+        "attribute": attribute,
+        "kind": metadata["kind"],
+        "elements": [],
+        "values": arrays["values"],
+        "tz_suffixes": decode_categories(metadata["tz_categories"], arrays["tz_codes"]),
+        "precisions": np.array(
+            decode_categories(metadata["precision_categories"], arrays["precision_codes"]), dtype=str
+        ),
+        "record_offsets": arrays["record_offsets"],
+    }
+    return column, metadata["records"]
+
+
+def save_slot_values(prefix, values, record_offsets, records_processed):
+    """
+    Caches the slot values of an Algorithm 2 attribute as dictionary-encoded category ids with record offsets.
+    """
+    categories, codes = encode_categories(values)
+    save_entry(
+        prefix,
+        {"codes": codes, "record_offsets": np.array(record_offsets, dtype=np.int64)},
+        {"records": records_processed, "categories": categories},
+    )
+
+
+def load_slot_values(prefix):
+    """
+    Loads the cached slot values of an Algorithm 2 attribute.
+
+    :return: Tuple (list of slot values, number of records), or None if the attribute is not cached
+    """
+    entry = load_entry(prefix, ("codes", "record_offsets"))
+    if entry is None:
+        return None
+    metadata, arrays = entry
+    return decode_categories(metadata["categories"], arrays["codes"]), metadata["records"]
+
+
+def extract_resource_file(file_path, lap_gauss_attributes, exp_attributes, cache_folder=None):
+    """
+    Extracts the Algorithm 1 columns and the Algorithm 2 slot values of an XML file in one streaming pass.
+    With a cache folder, the values are stored per file content and attribute configuration and memory-mapped
+    on later runs, so the file is only parsed if one of the configured attributes is not cached yet.
+
+    :param file_path: Path to the XML file
+    :param lap_gauss_attributes: Algorithm 1 configuration of the resource (may be empty)
+    :param exp_attributes: Algorithm 2 configuration of the resource (may be empty)
+    :param cache_folder: Folder of the cache (None disables the cache, the cache holds un-anonymized values)
+    :return: Tuple (dictionary {attribute: column}, number of records, dictionary {attribute: slot values})
+    """
+    if cache_folder is not None:
+        filename = os.path.basename(file_path)
+        content_hash = file_hash(file_path)
+        lap_gauss_prefixes = {
+            attribute: cache_entry_path(cache_folder, filename, content_hash, "lap_gauss", attribute, settings)
+            for attribute, settings in lap_gauss_attributes.items()
+        }
+        exp_prefixes = {
+            attribute: cache_entry_path(cache_folder, filename, content_hash, "exp", attribute, details)
+            for attribute, details in exp_attributes.items()
+        }
+
+        cached = load_cached_resource_file(lap_gauss_prefixes, exp_prefixes)
+        if cached is not None:
+            return cached
+
+    slot_values = {attr: [] for attr in exp_attributes}
+    slot_offsets = {attr: [0] for attr in exp_attributes}
+
+    def collect_record(record):
+        collect_slot_values_in_record(record, exp_attributes, slot_values)
+        for attr, offsets in slot_offsets.items():
+            offsets.append(len(slot_values[attr]))
+
+    columns, records_processed = extract_attribute_columns_from_file(file_path, lap_gauss_attributes, collect_record)
+
+    if cache_folder is not None:
+        for attribute, prefix in lap_gauss_prefixes.items():
+            if attribute in columns:
+                save_attribute_column(prefix, columns[attribute], records_processed)
+            else:
+                # Attributes without a column (e.g. date groupings) are cached as empty so they do not force a parse
+                save_entry(prefix, {}, {"kind": None, "records": records_processed})
+        for attr, prefix in exp_prefixes.items():
+            save_slot_values(prefix, slot_values[attr], slot_offsets[attr], records_processed)
+
+    return columns, records_processed, slot_values
+
+
+def load_cached_resource_file(lap_gauss_prefixes, exp_prefixes):
+    """
+    Loads all configured attributes of a file from the cache.
+
+    :return: Same as extract_resource_file, or None if at least one attribute is not cached
+    """
+    columns = {}
+    records_processed = 0
+    for attribute, prefix in lap_gauss_prefixes.items():
+        entry = load_entry(prefix, ())
+        if entry is None:
+            return None
+        if entry[0]["kind"] is None:
+            records_processed = entry[0]["records"]
+            continue
+        cached = load_attribute_column(prefix, attribute)
+        if cached is None:
+            return None
+        columns[attribute], records_processed = cached
+
+    slot_values = {}
+    for attr, prefix in exp_prefixes.items():
+        cached = load_slot_values(prefix)
+        if cached is None:
+            return None
+        slot_values[attr], records_processed = cached
+
+    return columns, records_processed, slot_values
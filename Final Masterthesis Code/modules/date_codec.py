@@ -0,0 +1,187 @@
+import logging
+import numpy as np
+
+# Representable range of datetime objects, used to skip noisy values that cannot be written back
+MIN_DATETIME64 = np.datetime64("0001-01-01T00:00:00", "s")
+MAX_DATETIME64 = np.datetime64("9999-12-31T23:59:59", "s")
+EPOCH_DATETIME64 = np.datetime64("1970-01-01T00:00:00", "s")
+
+# Precision of a FHIR date/dateTime value by the length of its local part (without time zone), "" is malformed
+PRECISION_BY_LENGTH = np.array(["", "", "", "", "Y", "", "", "M", "", "", "D", "", "", "", "", "", "m", "", "", "s",
+                                "", "", "", "ms", "", "", "us"])
+
+
+def split_time_zones(texts):
+    """
+    Splits FHIR date/dateTime strings into their local part and their time zone suffix ("Z", "+hh:mm",
+    "-hh:mm" or "" for dates and values without time zone) on a character matrix, without a Python loop.
+
+    :param texts: NumPy unicode array
+    :return: Tuple (unicode array with the local parts, int64 array with their lengths, unicode array with
+             the suffixes, int64 array with the UTC offsets in seconds, boolean array with the well-formed suffixes)
+    """
+    count = texts.size
+    width = max(texts.dtype.itemsize // 4, 1)
+    chars = np.ascontiguousarray(texts, dtype=f"U{width}").view("U1").reshape(count, width)
+    digits = chars.view(np.uint32).astype(np.int64) - ord("0")
+    lengths = np.char.str_len(texts)
+    rows = np.arange(count)
+
+    def char_at(positions):
+        return chars[rows, np.clip(positions, 0, width - 1)]
+
+    def digit_at(positions):
+        return digits[rows, np.clip(positions, 0, width - 1)]
+
+    has_time = char_at(np.full(count, 10)) == "T"
+    is_utc = has_time & (char_at(lengths - 1) == "Z")
+    sign_positions = lengths - 6
+    signs = char_at(sign_positions)
+    has_offset = has_time & (sign_positions > 10) & ((signs == "+") | (signs == "-"))
+
+    hours = digit_at(sign_positions + 1) * 10 + digit_at(sign_positions + 2)
+    minutes = digit_at(sign_positions + 4) * 10 + digit_at(sign_positions + 5)
+    well_formed = ~has_offset | (
+        (char_at(sign_positions + 3) == ":") & (hours >= 0) & (hours <= 14) & (minutes >= 0) & (minutes < 60)
+    )
+    offsets = np.where(has_offset & well_formed, (hours * 3600 + minutes * 60) * np.where(signs == "-", -1, 1), 0)
+
+    # Cut the local part by blanking the suffix characters (empty characters end a numpy string)
+    local_lengths = lengths - 6 * has_offset - is_utc
+    local_chars = chars.copy()
+    local_chars[np.arange(width) >= local_lengths[:, None]] = ""
+    local_texts = local_chars.view(f"U{width}").reshape(count)
+
+    suffix_chars = np.full((count, 6), "", dtype="U1")
+    suffix_positions = np.clip(sign_positions[:, None] + np.arange(6), 0, width - 1)
+    suffix_chars[has_offset] = chars[rows[:, None], suffix_positions][has_offset]
+    suffix_chars[is_utc, 0] = "Z"
+    suffixes = suffix_chars.view("U6").reshape(count)
+
+    return local_texts, local_lengths, suffixes, offsets, well_formed
+
+
+def normalize_fractions(local_texts, local_lengths):
+    """
+    Pads or truncates the fractional seconds of local dateTime parts to milliseconds (1 to 3 digits) or
+    microseconds (4 and more digits), so the precision of every value follows from its length.
+
+    :param local_texts: NumPy unicode array with the local parts (see split_time_zones)
+    :param local_lengths: int64 array with their lengths
+    :return: Tuple (unicode array with the normalized local parts, int64 array with their lengths)
+    """
+    count = local_texts.size
+    width = max(local_texts.dtype.itemsize // 4, 26)
+    chars = np.ascontiguousarray(local_texts, dtype=f"U{width}").view("U1").reshape(count, width).copy()
+
+    has_fraction = (local_lengths > 20) & (chars[:, 19] == ".")
+    target_lengths = np.where(local_lengths <= 23, 23, 26)
+    columns = np.arange(width)
+    pad = has_fraction[:, None] & (columns >= local_lengths[:, None]) & (columns < target_lengths[:, None])
+    chars[pad] = "0"
+    chars[has_fraction[:, None] & (columns >= target_lengths[:, None])] = ""
+
+    return chars.view(f"U{width}").reshape(count), np.where(has_fraction, target_lengths, local_lengths)
+
+
+def parse_dates(texts, check_round_trip=True):
+    """
+    Parses FHIR date/dateTime strings (YYYY, YYYY-MM, YYYY-MM-DD, YYYY-MM-DDThh:mm:ss[.f...][Z|±hh:mm]) in bulk
+    with NumPy datetime64. Values without time zone are read as UTC. Fractional seconds are read with
+    millisecond or microsecond precision (see normalize_fractions).
+
+    :param texts: List of strings
+    :param check_round_trip: Formats the parsed values with format_dates and parses them again; values that do
+                             not come back unchanged are marked as not parsed, so they are never written back
+    :return: Tuple (int64 array with the UTC epoch seconds, list of time zone suffixes,
+             array with the precisions (datetime64 units, e.g. "D" or "s"), boolean array with the parsed values)
+    """
+    texts = np.array(texts, dtype=str)
+    if not texts.size:
+        return np.array([], dtype=np.int64), [], np.array([], dtype=str), np.array([], dtype=bool)
+
+    local_texts, local_lengths, suffixes, offsets, valid = split_time_zones(texts)
+    local_texts, local_lengths = normalize_fractions(local_texts, local_lengths)
+    precisions = PRECISION_BY_LENGTH[np.clip(local_lengths, 0, PRECISION_BY_LENGTH.size - 1)]
+    precisions[local_lengths >= PRECISION_BY_LENGTH.size] = ""
+    valid &= precisions != ""
+
+    try:
+        timestamps = np.where(valid, local_texts, "NaT").astype("datetime64[s]")
+    except ValueError:
+        # At least one malformed value: parse one by one to keep the others
+        timestamps = np.array([parse_date(text) for text in np.where(valid, local_texts, "NaT").tolist()])
+    valid &= ~np.isnat(timestamps)
+
+    seconds = np.where(valid, (timestamps - EPOCH_DATETIME64).astype(np.int64), 0) - offsets
+    suffixes = suffixes.tolist()
+
+    if check_round_trip and valid.any():
+        indices = np.flatnonzero(valid)
+        valid_suffixes = np.array(suffixes, dtype="U6")[indices]
+        formatted = format_dates(seconds[indices], valid_suffixes.tolist(), precisions[indices])
+        reparsed_seconds, reparsed_suffixes, reparsed_precisions, reparsed_valid = parse_dates(
+            ["" if text is None else text for text in formatted], check_round_trip=False
+        )
+        round_trips = (reparsed_valid & (reparsed_seconds == seconds[indices])
+                       & (reparsed_precisions == precisions[indices])
+                       & (np.array(reparsed_suffixes, dtype="U6") == valid_suffixes))
+        if not round_trips.all():
+            logging.warning(f"{int((~round_trips).sum())} date values do not round-trip and are skipped.")
+            valid[indices[~round_trips]] = False
+
+    return seconds, suffixes, precisions, valid
+
+
+def parse_date(text):
+    """
+    Parses a single local date/dateTime string, the fallback of parse_dates for malformed values.
+
+    :return: datetime64[s] (NaT if the value is malformed)
+    """
+    try:
+        return np.datetime64(text, "s")
+    except ValueError:
+        return np.datetime64("NaT", "s")
+
+
+def time_zone_offsets(tz_suffixes):
+    """
+    Converts time zone suffixes into UTC offsets. Every distinct suffix is parsed once.
+
+    :param tz_suffixes: Suffixes ("Z", "+hh:mm", "-hh:mm" or "")
+    :return: int64 array with the offsets in seconds
+    """
+    suffixes, codes = np.unique(np.array(tz_suffixes, dtype="U6"), return_inverse=True)
+    offsets = [
+        (-1 if suffix[0] == "-" else 1) * (int(suffix[1:3]) * 3600 + int(suffix[4:6]) * 60)
+        if len(suffix) == 6 and suffix[0] in "+-" else 0
+        for suffix in suffixes.tolist()
+    ]
+    return np.array(offsets, dtype=np.int64)[codes.reshape(-1)]
+
+
+def format_dates(seconds, tz_suffixes, precisions):
+    """
+    Formats UTC epoch seconds back into FHIR date/dateTime strings in the local time and precision of the
+    original values, one vectorized call per distinct precision.
+
+    :param seconds: Array with the UTC epoch seconds
+    :param tz_suffixes: Time zone suffixes of the original values
+    :param precisions: Precisions of the original values (see parse_dates)
+    :return: List with the formatted values (None for values outside the datetime range)
+    """
+    seconds = np.asarray(seconds, dtype=np.int64) + time_zone_offsets(tz_suffixes)
+    lower = (MIN_DATETIME64 - EPOCH_DATETIME64).astype(np.int64)
+    upper = (MAX_DATETIME64 - EPOCH_DATETIME64).astype(np.int64)
+    valid = (seconds >= lower) & (seconds <= upper)
+    timestamps = EPOCH_DATETIME64 + np.where(valid, seconds, 0).astype("timedelta64[s]")
+
+    precisions = np.asarray(precisions, dtype=str)
+    formatted = np.empty(seconds.size, dtype="U32")
+    for precision in np.unique(precisions).tolist():
+        mask = precisions == precision
+        formatted[mask] = np.datetime_as_string(timestamps[mask], unit=precision)
+    formatted = np.char.add(formatted, np.array(tz_suffixes, dtype="U6"))
+
+    return [text if is_valid else None for text, is_valid in zip(formatted.tolist(), valid.tolist())]
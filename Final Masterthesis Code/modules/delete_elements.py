@@ -1,5 +1,7 @@
 import os
 import xml.etree.ElementTree as ET
+from modules.path_index import build_path_index, collect_configured_paths, find_all
+from modules.xml_stream import stream_records
 
 def delete_elements_by_config(input_folder, output_folder, config):
     """
@@ -17,26 +19,14 @@ def delete_elements_by_config(input_folder, output_folder, config):
 
         print(f"Edit file: {input_file_path}")
 
-        try:
-            # Load XML
-            tree = ET.parse(input_file_path)
-            root = tree.getroot()
-
-            # Iterate over the configuration paths
-            for record_path in file_config.get("record_paths", []):
-                element_path = record_path["path"]
-
-                print(f"Search elements with path: {element_path}")
+        for record_path in file_config.get("record_paths", []):
+            print(f"Search elements with path: {record_path['path']}")
 
-                # Search for parent nodes and delete the children
-                for parent in root.findall(element_path.rsplit("/", 1)[0]):
-                    print(f"Found parent node: {ET.tostring(parent, encoding='unicode')}")
-                    for element in parent.findall(element_path.split("/")[-1]):
-                        print(f"Delete element: {ET.tostring(element, encoding='unicode')}")
-                        parent.remove(element)
-
-            # Save the edited file
-            tree.write(output_file_path, encoding="utf-8", xml_declaration=True)
+        try:
+            # Stream the XML record by record and save the edited file
+            stream_records(
+                input_file_path, output_file_path, lambda record: delete_elements_in_record(record, file_config)
+            )
             print(f"File saved successfully: {output_file_path}")
 
         except ET.ParseError as e:
@@ -48,3 +38,23 @@ def delete_elements_by_config(input_folder, output_folder, config):
             if file_name.startswith(resource_type) and file_name.endswith(".xml"):
                 process_file(file_name, file_config)
 
+
+def delete_elements_in_record(root, file_config):
+    """
+    Deletes the configured elements below an element (a single record).
+
+    :param root: XML element in which the elements are searched.
+    :param file_config: Configuration of the resource with the paths of the elements to be deleted.
+    """
+    index = build_path_index(root, collect_configured_paths(file_config))
+
+    # Iterate over the configuration paths
+    for record_path in file_config.get("record_paths", []):
+        element_path = record_path["path"]
+
+        # Search for parent nodes and delete the children
+        for parent in find_all(root, element_path.rsplit("/", 1)[0], index):
+            print(f"Found parent node: {ET.tostring(parent, encoding='unicode')}")
+            for element in parent.findall(element_path.split("/")[-1]):
+                print(f"Delete element: {ET.tostring(element, encoding='unicode')}")
+                parent.remove(element)
@@ -1,5 +1,10 @@
 import numpy as np
 import logging
+from modules.rng import get_rng
+
+# Coefficients of the Chebyshev fit of erfc (Numerical Recipes, erfcc), fractional error below 1.2e-7
+ERFC_COEFFICIENTS = (0.17087277, -0.82215223, 1.48851587, -1.13520398, 0.27886807, -0.18628806, 0.09678418,
+                     0.37409196, 1.00002368, -1.26551223)
 
 
 # Min-max normalization function for calculating utility scores
@@ -28,29 +33,72 @@ def calculate_utility_scores(counter):
 
 
 # Function for adding Laplace noise to counters
-def add_laplace_noise_to_counters(original_counters, epsilon):
-    noisy_counters = {}
+def add_laplace_noise_to_counters(original_counters, epsilon, rng=None):
+    """
+    Adds Laplace noise to the counters of an attribute (see add_laplace_noise_to_count_array).
+
+    :param original_counters: Dictionary or counter with the original frequencies.
+    :param epsilon: Data protection parameter ε.
+    :param rng: Optional numpy.random.Generator (see modules.rng).
+    :return: Dictionary with the noisy integer counts.
+    """
+    keys = list(original_counters.keys())
+    counts = np.array([original_counters[key] for key in keys], dtype=np.float64)
+    noisy_counts = add_laplace_noise_to_count_array(counts, epsilon, rng)
+    return {key: int(count) for key, count in zip(keys, noisy_counts.tolist())}
+
+
+def add_laplace_noise_to_count_array(counts, epsilon, rng=None):
+    """
+    Adds Laplace noise (sensitivity 1) to a whole count vector with a single draw:
+    1. noise, 2. clamp to 1, 3. proportional top-up of the missing total, 4. integer rounding that preserves the total.
+
+    :param counts: NumPy array with the original counts.
+    :param epsilon: Data protection parameter ε.
+    :param rng: Optional numpy.random.Generator (see modules.rng).
+    :return: int64 array with the noisy counts.
+    """
     sensitivity = 1
-    scale = sensitivity / epsilon
-    total_original = sum(original_counters.values())
-    
-    # 1. Add Laplace noise
-    for key, count in original_counters.items():
-        noise = np.random.laplace(0, scale)
-        noisy_counters[key] = max(1, count + noise)
-
-    # 2. Proportional adjustment of the difference
-    total_noisy = sum(noisy_counters.values())
-    if total_noisy < total_original:
-        diff = total_original - total_noisy
-        total_weights = sum(original_counters.values())
-        for key in noisy_counters.keys():
-            weight = original_counters[key] / total_weights
-            noisy_counters[key] += diff * weight
+    noise = get_rng(rng).laplace(0, sensitivity / epsilon, size=len(counts))
+    return noisy_counts_from_noise(np.asarray(counts, dtype=np.float64), noise).astype(np.int64)
+
+
+def add_laplace_noise_to_count_arrays(count_arrays, epsilons, rng=None):
+    """
+    Batched add_laplace_noise_to_count_array for all attributes of a resource: the noise of every attribute
+    is drawn in one call and scaled by the ε of its attribute.
 
-    # 3. Ensure integerity
-    noisy_counters = {key: int(round(value)) for key, value in noisy_counters.items()}
-    return noisy_counters
+    :param count_arrays: Dictionary {attribute: NumPy array with the original counts}.
+    :param epsilons: Dictionary {attribute: ε}.
+    :param rng: Optional numpy.random.Generator (see modules.rng).
+    :return: Dictionary {attribute: int64 array with the noisy counts}.
+    """
+    sensitivity = 1
+    sizes = [len(counts) for counts in count_arrays.values()]
+    noise = get_rng(rng).laplace(0, 1, size=sum(sizes))
+    offsets = np.concatenate(([0], np.cumsum(sizes)))
+
+    noisy_arrays = {}
+    for position, (attr, counts) in enumerate(count_arrays.items()):
+        attr_noise = noise[offsets[position]:offsets[position + 1]] * (sensitivity / epsilons[attr])
+        noisy_arrays[attr] = noisy_counts_from_noise(np.asarray(counts, dtype=np.float64), attr_noise).astype(np.int64)
+    return noisy_arrays
+
+
+def round_preserving_total(values):
+    """
+    Rounds non-negative values to integers so that the rounded total equals the rounded total of the values
+    (largest remainder method: floor everything, then give the missing units to the largest fractional parts).
+
+    :param values: NumPy array with float values.
+    :return: Float array with integer values.
+    """
+    rounded = np.floor(values)
+    missing = int(round(values.sum() - rounded.sum()))
+    if missing > 0:
+        remainders = values - rounded
+        rounded[np.argpartition(-remainders, missing - 1)[:missing]] += 1
+    return rounded
 
 
 
@@ -97,4 +145,160 @@ def adjust_epsilon_based_on_tvd(settings, tvd, tvd_range, attribute_name):
 
     epsilon = max(min(epsilon, 1.0), epsilon_min)
     settings["epsilon"] = round(epsilon, 4)
-    return settings
\ No newline at end of file
+    return settings
+
+
+
+
+# Analytical selection of epsilon based on the expected TVD
+def noisy_counts_from_noise(counts, noise):
+    """
+    Noisy counts for a given noise draw (clamp to 1, proportional top-up of the missing total,
+    rounding that preserves the total).
+
+    :param counts: NumPy array with the original counts.
+    :param noise: NumPy array with the Laplace noise (same shape as counts).
+    :return: NumPy array with the noisy integer counts.
+    """
+    total_original = counts.sum()
+    noisy = np.maximum(1, counts + noise)
+    total_noisy = noisy.sum()
+    if total_noisy < total_original:
+        noisy = noisy + (total_original - total_noisy) * counts / total_original
+    return round_preserving_total(noisy)
+
+
+def expected_sampled_counts(noisy_counts, weights, n_slots):
+    """
+    Expected number of selections per value when n_slots values are drawn without replacement from the
+    noisy counters with selection weights exp(ε * utility / 2) (fluid approximation, "water-filling"):
+    n_k = min(c_k, λ * w_k), with λ chosen so that the selections sum up to the number of draws.
+
+    :param noisy_counts: NumPy array with the noisy counts c_k.
+    :param weights: NumPy array with the selection weights w_k.
+    :param n_slots: Number of slots that are resampled.
+    :return: NumPy array with the expected selections per value.
+    """
+    total = min(n_slots, noisy_counts.sum())
+    ratios = noisy_counts / weights
+    order = np.argsort(ratios)
+
+    # For λ between two consecutive ratios the values below are capped, the others grow with λ
+    capped = np.concatenate(([0.0], np.cumsum(noisy_counts[order])[:-1]))
+    free_weights = np.cumsum(weights[order][::-1])[::-1]
+    candidates = (total - capped) / free_weights
+    lam = candidates[np.argmax(candidates <= ratios[order])]
+
+    return np.minimum(noisy_counts, lam * weights)
+
+
+def expected_tvd(original_counts, utility_scores, epsilon, n_slots, noise_samples):
+    """
+    Expected TVD between the original distribution and the output of the exponential mechanism for an ε.
+    The expectation over the counter noise is estimated with fixed standard Laplace draws (common random
+    numbers), which makes the curve smooth in ε. Slots that are not resampled keep their original values.
+
+    :param original_counts: NumPy array with the original counts.
+    :param utility_scores: NumPy array with the utility scores.
+    :param epsilon: Data protection parameter ε.
+    :param n_slots: Number of slots of the attribute.
+    :param noise_samples: 2D NumPy array with standard Laplace draws (samples x values).
+    :return: Expected TVD (float).
+    """
+    scores = epsilon * utility_scores / 2
+    weights = np.exp(scores - scores.max())
+    original_probs = original_counts / original_counts.sum()
+
+    deviations, sigmas = [], []
+    for noise in noise_samples:
+        noisy_counts = noisy_counts_from_noise(original_counts, noise / epsilon)
+        selected = expected_sampled_counts(noisy_counts, weights, n_slots)
+        anonymized = selected + (n_slots - selected.sum()) * original_probs
+
+        # Sampling variance of the selections (multinomial with finite population correction)
+        pool = noisy_counts.sum()
+        correction = (pool - n_slots) / (pool - 1) if pool > n_slots else 0.0
+        sigmas.append(np.sqrt(np.maximum(selected * (1 - selected / n_slots) * correction, 0)) / n_slots)
+        deviations.append(anonymized / n_slots - original_probs)
+
+    # E|deviation| of all samples in one vectorized call
+    tvds = 0.5 * np.sum(expected_absolute_value(np.array(deviations), np.array(sigmas)), axis=1)
+    return float(np.mean(tvds))
+
+
+def erfc(x):
+    """
+    Complementary error function on NumPy arrays (element-wise, no Python loop).
+
+    :param x: NumPy array.
+    :return: NumPy array with erfc(x).
+    """
+    z = np.abs(x)
+    t = 1 / (1 + 0.5 * z)
+    result = t * np.exp(-z * z + np.polyval(ERFC_COEFFICIENTS, t))
+    return np.where(x >= 0, result, 2 - result)
+
+
+def expected_absolute_value(mu, sigma):
+    """
+    Expected value E|X| of normally distributed X ~ N(mu, sigma²) (element-wise over arrays of any shape,
+    sigma = 0 gives |mu|).
+
+    :param mu: NumPy array with the means.
+    :param sigma: NumPy array with the standard deviations.
+    :return: NumPy array with E|X|.
+    """
+    result = np.abs(mu)
+    spread = sigma > 0
+    m, s = mu[spread], sigma[spread]
+    phi = 0.5 * erfc((m / s) / np.sqrt(2))
+    result[spread] = s * np.sqrt(2 / np.pi) * np.exp(-(m / s) ** 2 / 2) + m * (1 - 2 * phi)
+    return result
+
+
+def solve_epsilon_for_tvd(original_counts, utility_scores, tvd_range, n_slots, attribute_name,
+                          epsilon_bounds=(0.0001, 1.0), samples=64, iterations=40, rng=None):
+    """
+    Selects ε by bisection (on log ε) on the expected TVD curve, so that the expected TVD hits the middle of
+    the target range. The result only has to be confirmed once on the real data.
+
+    :param original_counts: Dictionary or counter with the original frequencies, or a NumPy array over
+                            dictionary-encoded values (see CategoricalDomain).
+    :param utility_scores: Dictionary with the utility scores, or a NumPy array aligned with original_counts.
+    :param tvd_range: Target range (min, max) of the TVD.
+    :param n_slots: Number of slots of the attribute.
+    :param attribute_name: Name of the attribute (for logging).
+    :param epsilon_bounds: Permitted range of ε.
+    :param samples: Number of noise draws for the expectation.
+    :param iterations: Number of bisection steps.
+    :param rng: Optional numpy.random.Generator (see modules.rng).
+    :return: Selected ε (float).
+    """
+    if isinstance(original_counts, dict):
+        keys = list(original_counts.keys())
+        counts = np.array([original_counts[key] for key in keys], dtype=np.float64)
+        utilities = np.array([utility_scores[key] for key in keys], dtype=np.float64)
+    else:
+        counts = np.asarray(original_counts, dtype=np.float64)
+        utilities = np.asarray(utility_scores, dtype=np.float64)
+    noise_samples = get_rng(rng).laplace(0, 1, size=(samples, counts.size))
+
+    min_tvd, max_tvd = tvd_range
+    target_tvd = (min_tvd + max_tvd) / 2
+
+    # The expected TVD decreases with ε (less counter noise)
+    low, high = np.log(epsilon_bounds[0]), np.log(epsilon_bounds[1])
+    for _ in range(iterations):
+        middle = (low + high) / 2
+        tvd = expected_tvd(counts, utilities, np.exp(middle), n_slots, noise_samples)
+        if tvd > target_tvd:
+            low = middle
+        else:
+            high = middle
+
+    # The last midpoint is within (high - low) of the bracket centre and its expected TVD is already known
+    epsilon = float(np.exp(middle))
+    logging.info(
+        f"Analytical epsilon for '{attribute_name}': {epsilon:.4f} (expected TVD {tvd:.4f}, target {target_tvd})."
+    )
+    return max(round(epsilon, 4), epsilon_bounds[0])
@@ -1,6 +1,8 @@
 from modules.mechanisms import exponential_mechanism_with_noisy_counters
+from modules.path_index import (build_path_index, collect_configured_paths, compile_combination, find_all, find_first,
+                                match_child_chain)
 
-def anonymize_elements_modular(tree, utility_scores, counters, dynamic_epsilon, active_attributes, config):
+def anonymize_elements_modular(tree, utility_scores, counters, dynamic_epsilon, active_attributes, config, rng=None):
     """
     Anonymizes the relevant elements based on the extended exponential mechanism and the configuration.
 
@@ -11,8 +13,12 @@ def anonymize_elements_modular(tree, utility_scores, counters, dynamic_epsilon,
         dynamic_epsilon (dict): Dynamic \(\epsilon\)-value for each attribute.
         active_attributes (dict): Status-tracking for each attribute (True, when active).
         config (dict): Configuration file with attribute definitions.
+        rng: Optional numpy.random.Generator (see modules.rng).
     """
     root = tree.getroot()
+    index = build_attribute_index(
+        root, {attr: details for attributes in config.values() for attr, details in attributes.items()}
+    )
 
     # Iterate over the configuration to anonymize all defined attributes
     for resource, attributes in config.items():
@@ -23,59 +29,161 @@ def anonymize_elements_modular(tree, utility_scores, counters, dynamic_epsilon,
             # Extract the specific \(\epsilon\) value for the attribute
             epsilon = dynamic_epsilon[attr]["epsilon"]
 
-            # Anonymization based on the attribute type
-            if details["type"] == "simple":
-                path = details["path"]
-                for element in root.findall(path):
-                    if element.text and counters[attr]:
-                        new_value = exponential_mechanism_with_noisy_counters(
-                            utility_scores[attr], counters[attr], epsilon, root, attr
-                        )
-                        element.text = str(new_value)
-
-            elif details["type"] == "combination":
-                paths = details["paths"]
-                for elements in zip(*(root.findall(path) for path in paths)):
-                    if all(e is not None and e.text for e in elements) and counters[attr]:
-                        new_values = exponential_mechanism_with_noisy_counters(
-                            utility_scores[attr], counters[attr], epsilon, root, attr
-                        )
-                        for elem, new_value in zip(elements, new_values):
-                            elem.text = str(new_value)
-
-            elif details["type"] == "nested":
-                path = details["path"]
-                filter_url = details["filter"]["url"]
-                value_path = details["filter"]["value_path"]
-                for item in root.findall(path):
-                    url_element = item.find(".//url")
-                    if url_element is not None and url_element.text == filter_url:
-                        value_element = item.find(value_path)
-                        if value_element is not None and value_element.text and counters[attr]:
-                            new_value = exponential_mechanism_with_noisy_counters(
-                                utility_scores[attr], counters[attr], epsilon, root, attr
-                            )
-                            value_element.text = str(new_value)
-
-            elif details["type"] == "nested_combination":
-                path = details["path"]
-                filter_url = details["filter"]["url"]
-                value_paths = details["filter"]["value_paths"]
-
-                for item in root.findall(path):
-                    # Apply filter
-                    url_element = item.find(".//url")
-                    if url_element is not None and url_element.text == filter_url:
-                        # Extract the combination of values
-                        combination_elements = []
-                        for value_path in value_paths:
-                            value_element = item.find(value_path)
-                            if value_element is not None and value_element.text:
-                                combination_elements.append(value_element)
-                        if len(combination_elements) == len(value_paths) and counters[attr]:
-                            # Calculate new values
-                            new_values = exponential_mechanism_with_noisy_counters(
-                                utility_scores[attr], counters[attr], epsilon, root, attr
-                            )
-                            for elem, new_value in zip(combination_elements, new_values):
-                                elem.text = str(new_value)
+            # Anonymization of every slot of the attribute
+            for elements, _ in iter_attribute_slots(root, details, index):
+                if not counters[attr]:
+                    break
+                new_value = exponential_mechanism_with_noisy_counters(
+                    utility_scores[attr], counters[attr], epsilon, root, attr, rng
+                )
+                assign_slot_value(elements, new_value, details)
+
+
+def iter_attribute_slots(root, details, index=None):
+    """
+    Yields the anonymizable positions ("slots") of an attribute below an element in document order.
+    A slot is only yielded if all of its elements carry a text.
+
+    Args:
+        root: XML element (root of the tree or a single record).
+        details (dict): Definition of the attribute from the configuration.
+        index (dict): Optional path index of root (see build_path_index).
+
+    Returns:
+        Generator of tuples (list of elements, value). The value is a string for simple and nested
+        attributes and a tuple of strings for combinations.
+    """
+    if details["type"] == "simple":
+        for element in find_all(root, details["path"], index):
+            if element.text:
+                yield [element], element.text.strip()
+
+    elif details["type"] == "combination":
+        for group in iter_combination_groups(root, details["paths"], index):
+            for elements in zip(*group):
+                if all(e is not None and e.text for e in elements):
+                    yield list(elements), tuple(e.text.strip() for e in elements)
+
+    elif details["type"] == "nested":
+        filter_url = details["filter"]["url"]
+        value_path = details["filter"]["value_path"]
+        for item in find_all(root, details["path"], index):
+            url_element = find_first(item, ".//url", index, details["path"])
+            if url_element is not None and url_element.text == filter_url:
+                value_element = find_first(item, value_path, index, details["path"])
+                if value_element is not None and value_element.text:
+                    yield [value_element], value_element.text.strip()
+
+    elif details["type"] == "nested_combination":
+        filter_url = details["filter"]["url"]
+        value_paths = details["filter"]["value_paths"]
+        for item in find_all(root, details["path"], index):
+            # Apply filter
+            url_element = find_first(item, ".//url", index, details["path"])
+            if url_element is not None and url_element.text == filter_url:
+                # Extract the combination of values
+                combination_elements = []
+                for value_path in value_paths:
+                    value_element = find_first(item, value_path, index, details["path"])
+                    if value_element is not None and value_element.text:
+                        combination_elements.append(value_element)
+                if len(combination_elements) == len(value_paths):
+                    yield combination_elements, tuple(e.text.strip() for e in combination_elements)
+
+
+def iter_combination_groups(root, paths, index=None):
+    """
+    Yields the element lists of the paths of a combination in aligned groups, so the values of one address
+    (or one maritalStatus) are combined with each other and never with those of a neighbouring one.
+
+    Paths with a common anchor (e.g. ".//address/item") are grouped per anchor element. Paths without a
+    common anchor are grouped per <record>.
+
+    Args:
+        root: XML element (root of the tree or a single record).
+        paths (list): Paths of the combination.
+        index (dict): Optional path index of root (see build_attribute_index).
+
+    Returns:
+        Generator of lists with one element list per path.
+    """
+    plan = compile_combination(tuple(paths))
+    if plan is not None:
+        anchor_path, chains = plan
+        for anchor in find_all(root, anchor_path, index):
+            yield [match_child_chain(anchor, chain) for chain in chains]
+        return
+
+    records = root.findall("record")
+    if not records:
+        yield [find_all(root, path, index) for path in paths]
+        return
+    for record in records:
+        yield [record.findall(path) for path in paths]
+
+
+def build_attribute_index(root, attributes):
+    """
+    Builds the path index for all attributes of a resource, including the url and value lookups below the
+    items of nested attributes (shared by all nested attributes on the same item path).
+
+    Args:
+        root: XML element (root of the tree or a single record).
+        attributes (dict): Configuration of the attributes.
+
+    Returns:
+        dict: Path index (see build_path_index).
+    """
+    relative_paths = {}
+    for details in attributes.values():
+        if details["type"] in ("nested", "nested_combination"):
+            value_paths = details["filter"].get("value_paths", [details["filter"].get("value_path")])
+            relative_paths.setdefault(details["path"], [".//url"]).extend(path for path in value_paths if path)
+    # Combinations with a common anchor only need the anchor elements
+    paths = []
+    for attr, details in attributes.items():
+        plan = compile_combination(tuple(details["paths"])) if details["type"] == "combination" else None
+        paths.extend([plan[0]] if plan else collect_configured_paths({attr: details}))
+    return build_path_index(root, paths, relative_paths)
+
+
+def assign_slot_value(elements, value, details):
+    """
+    Writes a (new) value into the elements of a slot.
+
+    Args:
+        elements (list): Elements of the slot from iter_attribute_slots.
+        value: String or, for combinations, tuple of strings.
+        details (dict): Definition of the attribute from the configuration.
+    """
+    if details["type"] in ("combination", "nested_combination"):
+        for elem, new_value in zip(elements, value):
+            elem.text = str(new_value)
+    else:
+        elements[0].text = str(value)
+
+
+def make_slot_writer(assignments, attributes):
+    """
+    Creates a record transformation that writes accepted slot values back in the order of the extraction.
+
+    Args:
+        assignments (dict): {attribute: list of accepted slot values of one file}.
+        attributes (dict): Configuration of the attributes of the resource.
+
+    Returns:
+        Function that receives a record element and assigns the next slot values in place.
+    """
+    offsets = {attr: 0 for attr in assignments}
+    assigned_attributes = {attr: attributes[attr] for attr in assignments}
+
+    def write_slots(record):
+        index = build_attribute_index(record, assigned_attributes)
+        for attr, values in assignments.items():
+            for elements, _ in iter_attribute_slots(record, attributes[attr], index):
+                if offsets[attr] >= len(values):
+                    break
+                assign_slot_value(elements, values[offsets[attr]], attributes[attr])
+                offsets[attr] += 1
+
+    return write_slots
@@ -1,6 +1,8 @@
 import os
 import xml.etree.ElementTree as ET
 from collections import Counter
+from modules.exp_anonymization import build_attribute_index, iter_attribute_slots
+from modules.xml_stream import iter_records
 
 def extract_attributes_modular(folder_path, config):
     """
@@ -27,51 +29,71 @@ def extract_attributes_modular(folder_path, config):
         
         file_path = os.path.join(folder_path, filename)
         try:
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-
-            # Iteriere über die Attribute der Ressource
-            for attr, details in config[resource].items():
-                if details["type"] == "simple":
-                    path = details["path"]
-                    for element in root.findall(path):
-                        if element.text:
-                            attribute_counts[attr][element.text.strip()] += 1
-
-                elif details["type"] == "combination":
-                    paths = details["paths"]
-                    for group in zip(*(root.findall(path) for path in paths)):
-                        combination = tuple(e.text.strip() for e in group if e is not None)
-                        if len(combination) == len(paths):
-                            attribute_counts[attr][combination] += 1
-
-                elif details["type"] == "nested":
-                    path = details["path"]
-                    filter_url = details["filter"]["url"]
-                    value_path = details["filter"]["value_path"]
-                    for item in root.findall(path):
-                        url_element = item.find(".//url")
-                        if url_element is not None and url_element.text == filter_url:
-                            value_element = item.find(value_path)
-                            if value_element is not None and value_element.text:
-                                attribute_counts[attr][value_element.text.strip()] += 1
-
-                elif details["type"] == "nested_combination":
-                    path = details["path"]
-                    filter_url = details["filter"]["url"]
-                    value_paths = details["filter"]["value_paths"]
-                    for item in root.findall(path):
-                        url_element = item.find(".//url")
-                        if url_element is not None and url_element.text == filter_url:
-                            combination = []
-                            for value_path in value_paths:
-                                value_element = item.find(value_path)
-                                if value_element is not None and value_element.text:
-                                    combination.append(value_element.text.strip())
-                            if len(combination) == len(value_paths):
-                                attribute_counts[attr][tuple(combination)] += 1
+            # Stream the file record by record
+            for record in iter_records(file_path):
+                count_attributes_in_record(record, config[resource], attribute_counts)
         except ET.ParseError:
             print(f"Error parsing the file: {filename}")
             continue
 
     return attribute_counts
+
+
+def count_attributes_in_record(root, attributes, attribute_counts):
+    """
+    Counts the values of the configured attributes of a resource within one element (a single record).
+
+    :param root: XML element in which the attributes are searched.
+    :param attributes: Configuration of the attributes of the resource.
+    :param attribute_counts: Dictionary with the counters, updated in place.
+    """
+    counts, _ = extract_attributes_with_handles(root, attributes)
+    for attr, counter in counts.items():
+        attribute_counts[attr].update(counter)
+
+
+def extract_attributes_with_handles(root, attributes):
+    """
+    Visits an element (a record or a whole tree) once for all attributes and dispatches to every attribute
+    handler (simple, combination, nested, nested_combination) from the same path index.
+
+    :param root: XML element in which the attributes are searched.
+    :param attributes: Configuration of the attributes of the resource.
+    :return: Tuple ({attribute: Counter of the values}, {attribute: list with the element list of every slot}).
+    """
+    index = build_attribute_index(root, attributes)
+    counts = {attr: Counter() for attr in attributes.keys()}
+    handles = {attr: [] for attr in attributes.keys()}
+    for attr, details in attributes.items():
+        for elements, value in iter_attribute_slots(root, details, index):
+            counts[attr][value] += 1
+            handles[attr].append(elements)
+    return counts, handles
+
+
+def extract_slot_values_from_file(file_path, attributes):
+    """
+    Extracts the value of every slot (see iter_attribute_slots) of the configured attributes from an XML file
+    in document order, streaming record by record.
+
+    :param file_path: Path to the XML file.
+    :param attributes: Configuration of the attributes of the resource.
+    :return: A dictionary {attribute: list of slot values}.
+    """
+    slot_values = {attr: [] for attr in attributes.keys()}
+    for record in iter_records(file_path):
+        collect_slot_values_in_record(record, attributes, slot_values)
+    return slot_values
+
+
+def collect_slot_values_in_record(root, attributes, slot_values):
+    """
+    Appends the slot values of the configured attributes within one element (a single record).
+
+    :param root: XML element in which the attributes are searched.
+    :param attributes: Configuration of the attributes of the resource.
+    :param slot_values: Dictionary {attribute: list of slot values}, updated in place.
+    """
+    index = build_attribute_index(root, attributes)
+    for attr, details in attributes.items():
+        slot_values[attr].extend(value for _, value in iter_attribute_slots(root, details, index))
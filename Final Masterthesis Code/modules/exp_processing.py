@@ -1,14 +1,20 @@
 import os
 import csv
+import shutil
 import xml.etree.ElementTree as ET
 import logging
 import time
 import psutil
-from modules.tvd import calculate_tvd
-from modules.exp_extract_attributes import extract_attributes_modular
-from modules.exp_anonymization import anonymize_elements_modular
-from modules.exp_adjustment import calculate_utility_scores, add_laplace_noise_to_counters, adjust_epsilon_based_on_tvd
-from modules.exp_dummy_handler import add_dummy_to_pool, create_dummy_value_for_attribute
+import numpy as np
+from modules.tvd import HistogramAccumulator
+from modules.categorical_domain import CategoricalDomain
+from modules.exp_extract_attributes import extract_slot_values_from_file
+from modules.exp_anonymization import make_slot_writer
+from modules.exp_adjustment import add_laplace_noise_to_count_arrays, adjust_epsilon_based_on_tvd, solve_epsilon_for_tvd
+from modules.mechanisms import ExponentialSampler
+from modules.rng import create_rng
+from modules.work_units import order_units_by_weight
+from modules.xml_stream import stream_records
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -52,88 +58,283 @@ def log_iteration_to_csv(resource, attribute, epsilon, sensitivity, iteration, t
         writer = csv.writer(csv_file)
         writer.writerow([resource, attribute, epsilon, sensitivity, iteration, tvd])
 
-def process_resource(resource, attributes, input_folder, output_folder, max_iterations):
+def apply_dummy_value_at_epsilon_minimum(attr, details, domains, utility_scores, dynamic_epsilon, dummy_added):
+    """
+    Adds a dummy value to the pool of an attribute once ε_min is reached (and quadruples it on repeated hits).
+    The utility scores and ε of the attribute are reset accordingly.
+
+    :param domains: Dictionary {attribute: CategoricalDomain}, the original counts are updated in place
+    """
+    # Add dummy value when ε_min is reached
+    if dynamic_epsilon[attr]["epsilon"] <= 0.0002:
+        if not dummy_added[attr]:
+            logging.warning(f"ε_min achieved for '{attr}'. Add dummy value.")
+            domains[attr].add_dummy(details)
+            utility_scores[attr] = domains[attr].utility_scores()
+            dynamic_epsilon[attr]["epsilon"] = 0.5
+            dummy_added[attr] = True
+            logging.info(f"Dummy value added and ε set to 0.5 for '{attr}'.")
+        else:
+            logging.warning(f"ε_min achieved for '{attr}' again. Double dummy value counter.")
+            domains[attr].scale_dummy(details, 4)
+            utility_scores[attr] = domains[attr].utility_scores()
+            dynamic_epsilon[attr]["epsilon"] = 0.5
+            logging.info(f"Dummy value doubled and ε set to 0.5 for '{attr}'.")
+
+
+def process_resource(resource, attributes, input_folder, output_folder, max_iterations, seed_sequence=None):
+    """
+    Algorithm 2 for one resource in memory: the categorical values of all matching files are extracted once,
+    the exponential mechanism and the TVD check run on these values and only the accepted assignment is
+    written to the output folder (one read and one write per file).
+
+    :param resource: Name of the resource (e.g. "Patient")
+    :param attributes: Configuration of the attributes of the resource
+    :param input_folder: Folder with the input XML files
+    :param output_folder: Folder for the anonymized XML files (may be the input folder)
+    :param max_iterations: Maximum number of iterations
+    :param seed_sequence: Root seed sequence of the run (see modules.rng)
+    """
+    files_to_process = [
+        filename for filename in os.listdir(input_folder)
+        if filename.startswith(resource) and filename.endswith(".xml")
+    ]
+
+    # Extract the slot values once
+    file_slot_values = {}
+    for filename in files_to_process:
+        try:
+            file_slot_values[filename] = extract_slot_values_from_file(os.path.join(input_folder, filename), attributes)
+        except ET.ParseError as e:
+            logging.warning(f"Error parsing the file {filename}: {e}")
+
+    slot_values = merge_slot_values(file_slot_values, attributes)
+    assignments = tune_resource_in_memory(
+        resource, attributes, slot_values, max_iterations, rng=create_rng(seed_sequence, resource)
+    )
+
+    # Write the accepted assignment once (files that could not be extracted are copied unchanged)
+    split_assignments = split_slot_values(assignments, file_slot_values)
+    for filename in files_to_process:
+        file_assignments = split_assignments.get(filename)
+        write_exp_file(
+            filename, {resource: file_assignments} if file_assignments is not None else {}, {resource: attributes},
+            input_folder, output_folder
+        )
+
+
+def build_exp_work_units(config, input_folder):
+    """
+    Extracts the slot values of every resource once and splits Algorithm 2 into (resource, attribute) work units.
+    The attributes of a resource are independent (own counters, ε and TVD), so the units can run concurrently.
+
+    :param config: Exponential configuration (resource -> attributes)
+    :param input_folder: Folder with the input XML files
+    :return: Tuple (list of work units, heaviest first; dictionary {resource: {filename: {attribute: slot values}}})
+    """
+    units = []
+    resource_file_slot_values = {}
+    for resource, attributes in config.items():
+        file_slot_values = {}
+        for filename in os.listdir(input_folder):
+            if filename.startswith(resource) and filename.endswith(".xml"):
+                try:
+                    file_slot_values[filename] = extract_slot_values_from_file(
+                        os.path.join(input_folder, filename), attributes
+                    )
+                except ET.ParseError as e:
+                    logging.warning(f"Error parsing the file {filename}: {e}")
+        resource_file_slot_values[resource] = file_slot_values
+
+        slot_values = merge_slot_values(file_slot_values, attributes)
+        for attr, details in attributes.items():
+            units.append({
+                "resource": resource,
+                "attribute": attr,
+                "details": details,
+                "values": slot_values[attr],
+                "weight": len(slot_values[attr]),
+            })
+    return order_units_by_weight(units), resource_file_slot_values
+
+
+def process_exp_unit(unit, max_iterations, seed_sequence=None):
+    """
+    Tunes a single (resource, attribute) work unit in memory. Runs in a worker process and does not write any file.
+
+    :param unit: Work unit from build_exp_work_units
+    :param max_iterations: Maximum number of iterations
+    :param seed_sequence: Root seed sequence of the run, the unit draws from its own child stream (see modules.rng)
+    :return: Tuple (resource, attribute, accepted slot values)
+    """
+    attr = unit["attribute"]
+    assignments = tune_resource_in_memory(
+        unit["resource"], {attr: unit["details"]}, {attr: unit["values"]}, max_iterations,
+        rng=create_rng(seed_sequence, unit["resource"], attr)
+    )
+    return unit["resource"], attr, assignments[attr]
+
+
+def write_exp_file(filename, resource_assignments, config, input_folder, output_folder):
+    """
+    Merges the accepted slot values of all resources and attributes of a file and writes the file exactly once.
+    A file without assignments (e.g. one that could not be parsed during the extraction) is copied unchanged,
+    so every input file reaches the output folder.
+
+    :param filename: Name of the XML file
+    :param resource_assignments: Dictionary {resource: {attribute: accepted slot values of this file}} (may be empty)
+    :param config: Exponential configuration (resource -> attributes)
+    :param input_folder: Folder with the input XML files
+    :param output_folder: Folder for the anonymized XML files
+    """
+    input_file_path = os.path.join(input_folder, filename)
+    output_file_path = os.path.join(output_folder, filename)
+
+    if resource_assignments:
+        writers = [
+            make_slot_writer(assignments, config[resource]) for resource, assignments in resource_assignments.items()
+        ]
+
+        def write_slots(record):
+            for writer in writers:
+                writer(record)
+
+        try:
+            stream_records(input_file_path, output_file_path, write_slots)
+            logging.info(f"File {filename} successfully anonymized.")
+            return
+        except ET.ParseError as e:
+            logging.warning(f"Error parsing the file {filename}: {e}")
+
+    if os.path.abspath(input_file_path) != os.path.abspath(output_file_path):
+        shutil.copy(input_file_path, output_file_path)
+        logging.info(f"File {filename} copied without Algorithm 2 changes.")
+
+
+def merge_slot_values(file_slot_values, attributes):
+    """
+    Concatenates the slot values of several files in file order (the TVD is measured over the whole resource).
+
+    :param file_slot_values: Dictionary {filename: {attribute: list of slot values}}
+    :param attributes: Configuration of the attributes of the resource
+    :return: Dictionary {attribute: list of slot values}
+    """
+    return {
+        attr: [value for values in file_slot_values.values() for value in values[attr]]
+        for attr in attributes.keys()
+    }
+
+
+def split_slot_values(slot_values, file_slot_values):
+    """
+    Splits merged slot values back into the files they were extracted from (inverse of merge_slot_values).
+
+    :param slot_values: Dictionary {attribute: list of slot values}
+    :param file_slot_values: Dictionary {filename: {attribute: list of slot values}} from the extraction
+    :return: Dictionary {filename: {attribute: list of slot values}}
+    """
+    split_values = {filename: {} for filename in file_slot_values}
+    for attr, values in slot_values.items():
+        start = 0
+        for filename, file_values in file_slot_values.items():
+            end = start + len(file_values[attr])
+            split_values[filename][attr] = values[start:end]
+            start = end
+    return split_values
+
+
+def tune_resource_in_memory(resource, attributes, slot_values, max_iterations, solver="analytic", rng=None):
+    """
+    Runs the TVD feedback loop of Algorithm 2 on extracted slot values without reading or writing any file.
+    Every iteration resamples the active attributes in memory and counts the assignment directly.
+    Slots that are left over when the noisy counter of an attribute is exhausted keep their current value.
+
+    :param resource: Name of the resource (e.g. "Patient")
+    :param attributes: Configuration of the attributes of the resource
+    :param slot_values: Dictionary {attribute: list with the original value of every slot (iter_attribute_slots)}
+    :param max_iterations: Maximum number of iterations
+    :param solver: "analytic" starts from the ε that hits the middle of the TVD range in expectation,
+                   "momentum" starts from ε = 0.5; misses are corrected by adjust_epsilon_based_on_tvd
+    :param rng: Optional numpy.random.Generator (see modules.rng)
+    :return: Dictionary {attribute: list with the accepted value of every slot}
+    """
     logging.basicConfig(level=logging.INFO, format="%(message)s")
-    logging.info(f"Edited resource: {resource}")
+    logging.info(f"Edited resource (in memory): {resource}")
 
-    # Count original values and calculate initial utility scores
-    resource_original_counts = extract_attributes_modular(output_folder, {resource: attributes})
+    # Encode the values once, count them and calculate the initial utility scores on the codes
+    domains = {attr: CategoricalDomain(slot_values.get(attr, [])) for attr in attributes.keys()}
     utility_scores = {
-        attr: calculate_utility_scores(counts) if counts else {}
-        for attr, counts in resource_original_counts.items()
+        attr: domain.utility_scores() if domain.size else None for attr, domain in domains.items()
     }
+    assignments = {attr: domain.codes.copy() for attr, domain in domains.items()}
+    histograms = {attr: HistogramAccumulator(domain.counts, domain.codes) for attr, domain in domains.items()}
 
     active_attributes = {attr: True for attr in attributes.keys()}
     tvd_targets = {attr: details["tvd_range"] for attr, details in attributes.items()}
     dynamic_epsilon = {attr: {"epsilon": 0.5} for attr in attributes.keys()}
     dummy_added = {attr: False for attr in attributes.keys()}
 
+    if solver == "analytic":
+        for attr, domain in domains.items():
+            if domain.size:
+                dynamic_epsilon[attr]["epsilon"] = solve_epsilon_for_tvd(
+                    domain.counts, utility_scores[attr], tvd_targets[attr], len(assignments[attr]), attr, rng=rng
+                )
+
     for iteration in range(1, max_iterations + 1):
         logging.info(f"--- Iteration {iteration} for ressource {resource} ---")
 
         start_time_iteration = time.time()
-        process = psutil.Process(os.getpid())  
-        memory_before = process.memory_info().rss / (1024 * 1024)  
+        process = psutil.Process(os.getpid())
+        memory_before = process.memory_info().rss / (1024 * 1024)
 
-        # Update counter with noise
-        counters = {
-            attr: add_laplace_noise_to_counters(counts, dynamic_epsilon[attr]["epsilon"]) if counts else {}
-            for attr, counts in resource_original_counts.items()
-        }
+        # Update counter with noise (one draw for all attributes of the resource)
+        counted_domains = {attr: domain for attr, domain in domains.items() if domain.size}
+        counters = {attr: None for attr in domains}
+        counters.update(add_laplace_noise_to_count_arrays(
+            {attr: domain.counts for attr, domain in counted_domains.items()},
+            {attr: dynamic_epsilon[attr]["epsilon"] for attr in counted_domains},
+            rng
+        ))
 
         # Calculate number of processed data records
-        records_processed = sum(len(counts) for counts in resource_original_counts.values())
+        records_processed = sum(domain.size for domain in domains.values())
 
         for attr in attributes.keys():
-            # Add dummy value when ε_min is reached
-            if dynamic_epsilon[attr]["epsilon"] <= 0.0002:
-                if not dummy_added[attr]:
-                    logging.warning(f"ε_min achieved for '{attr}'. Add dummy value.")
-                    resource_original_counts = add_dummy_to_pool(attr, attributes[attr], resource_original_counts)
-                    utility_scores[attr] = calculate_utility_scores(resource_original_counts[attr])
-                    dynamic_epsilon[attr]["epsilon"] = 0.5
-                    dummy_added[attr] = True
-                    logging.info(f"Dummy value added and ε set to 0.5 for '{attr}'.")
-                else:
-                    logging.warning(f"ε_min achieved for '{attr}' again. Double dummy value counter.")
-                    dummy_value = create_dummy_value_for_attribute(attributes[attr])
-                    resource_original_counts[attr][dummy_value] *= 4
-                    utility_scores[attr] = calculate_utility_scores(resource_original_counts[attr])
-                    dynamic_epsilon[attr]["epsilon"] = 0.5
-                    logging.info(f"Dummy value doubled and ε set to 0.5 for '{attr}'.")
-
-        # Anonymisierung der Dateien
-        for filename in os.listdir(input_folder):
-            if filename.startswith(resource) and filename.endswith(".xml"):
-                input_file_path = os.path.join(input_folder, filename)
-                output_file_path = os.path.join(output_folder, filename)
+            apply_dummy_value_at_epsilon_minimum(
+                attr, attributes[attr], domains, utility_scores, dynamic_epsilon, dummy_added
+            )
+            histograms[attr].set_reference(domains[attr].counts)
 
-                try:
-                    tree = ET.parse(input_file_path)
-                    anonymize_elements_modular(
-                        tree, utility_scores, counters, dynamic_epsilon,
-                        active_attributes, {resource: attributes}
-                    )
-                    tree.write(output_file_path, xml_declaration=True, encoding='utf-8')
-                    logging.info(f"File {filename} successfully anonymized.")
-                except ET.ParseError as e:
-                    logging.warning(f"Error parsing the file {filename}: {e}")
-                    continue
+        # Resample the slots of the active attributes
+        for attr in attributes.keys():
+            if not active_attributes[attr] or counters[attr] is None:
+                continue
+            epsilon = dynamic_epsilon[attr]["epsilon"]
+            current = assignments[attr]
 
-        memory_after = process.memory_info().rss / (1024 * 1024)  
+            # A dummy value added in this iteration has no noisy counter yet
+            counts = np.pad(counters[attr], (0, domains[attr].size - counters[attr].size))
+
+            # Slots that are left over when the counters are exhausted keep their current value
+            sampler = ExponentialSampler.from_arrays(utility_scores[attr], counts, epsilon, rng=rng)
+            new_codes = sampler.sample_indices(len(current))
+            histograms[attr].replace(current[:len(new_codes)], new_codes)
+            current[:len(new_codes)] = new_codes
+
+        memory_after = process.memory_info().rss / (1024 * 1024)
 
         for attr in attributes.keys():
             track_performance(iteration, attr, start_time_iteration, memory_before, memory_after, records_processed)
-        
+
         # TVD calculation and ε-adjustment
-        anonymized_counts = extract_attributes_modular(output_folder, {resource: attributes})
         stop_iteration = True
 
         for attr in attributes.keys():
-            if not active_attributes[attr] or not resource_original_counts[attr]:
+            if not active_attributes[attr] or not domains[attr].size:
                 continue
 
-            tvd = calculate_tvd(resource_original_counts[attr], anonymized_counts[attr])
+            tvd = histograms[attr].tvd()
             logging.info(f"TVD for '{attr}' after iteration {iteration}: {tvd:.4f}")
 
             sensitivity = attributes[attr].get("sensitivity", "N/A")
@@ -155,3 +356,5 @@ def process_resource(resource, attributes, input_folder, output_folder, max_iter
             break
     else:
         logging.warning(f"Maximum number of iterations ({max_iterations}) for resource '{resource}' achieved.")
+
+    return {attr: domains[attr].decode(codes) for attr, codes in assignments.items()}
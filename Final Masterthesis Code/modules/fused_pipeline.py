@@ -0,0 +1,118 @@
+import os
+import logging
+
+from modules.column_cache import extract_resource_file
+from modules.delete_elements import delete_elements_in_record
+from modules.exp_anonymization import make_slot_writer
+from modules.exp_processing import merge_slot_values, split_slot_values, tune_resource_in_memory
+from modules.lap_gauss_anonymization import format_attribute_column, write_attribute_columns_to_file
+from modules.lap_gauss_processing import tune_attribute_column
+from modules.rng import create_rng
+
+
+def process_resource_fused(resource, original_folder_path, output_folder_path, lap_gauss_attributes, exp_attributes,
+                           delete_config, max_iterations, solver="analytic", cache_folder=None, seed_sequence=None):
+    """
+    Anonymizes all files of a resource with Algorithm 1, Algorithm 2 and the final deletion in one read
+    and one write per file.
+
+    1. Scan: every file is streamed once, the numeric columns (Algorithm 1) and the categorical slot
+       values (Algorithm 2) are extracted in the same pass. Files whose values are already in the
+       extraction cache are not parsed at all.
+    2. Tuning: the RMSE and TVD feedback loops run entirely in memory.
+    3. Write: every file is streamed once more and each record receives its noisy values, its sampled
+       categories and the deletion of the configured paths before it is written to the output.
+
+    :param resource: Name of the resource (e.g. "Patient")
+    :param original_folder_path: Folder with the original XML files
+    :param output_folder_path: Folder for the anonymized XML files
+    :param lap_gauss_attributes: Algorithm 1 configuration of the resource
+    :param exp_attributes: Algorithm 2 configuration of the resource (may be empty)
+    :param delete_config: Deletion configuration of the resource (may be None)
+    :param max_iterations: Maximum number of iterations of the feedback loops
+    :param solver: Epsilon solver of Algorithm 1 (see tune_attribute_column)
+    :param cache_folder: Folder of the extraction cache (None disables the cache, see column_cache)
+    :param seed_sequence: Root seed sequence of the run (see modules.rng); Algorithm 1 draws per (file, attribute)
+                          from the same streams as the sequential pipeline, Algorithm 2 per resource
+    """
+    logging.info(f"Start fused anonymization for resource: {resource}")
+
+    files_to_process = [
+        filename for filename in os.listdir(original_folder_path)
+        if filename.startswith(resource) and filename.endswith(".xml")
+    ]
+
+    # ----- Scan: one read per file (or none with the extraction cache) -----
+    file_columns = {}
+    file_slot_values = {}
+    for filename in files_to_process:
+        input_file_path = os.path.join(original_folder_path, filename)
+
+        try:
+            columns, records_processed, slot_values = extract_resource_file(
+                input_file_path, lap_gauss_attributes, exp_attributes, cache_folder
+            )
+            file_columns[filename] = columns, records_processed
+            file_slot_values[filename] = slot_values
+        except Exception as e:
+            logging.error(f"Error of file {filename}: {e}")
+
+    # ----- Tuning: Algorithm 1 per file and attribute, Algorithm 2 per resource -----
+    file_results = {}
+    for filename, (columns, records_processed) in file_columns.items():
+        input_file_path = os.path.join(original_folder_path, filename)
+        results = {}
+        for attribute, column in columns.items():
+            if not column["values"].size:
+                continue
+            anonymized = tune_attribute_column(
+                resource, filename, attribute, lap_gauss_attributes[attribute], column, max_iterations, solver,
+                input_file_path, os.path.join(output_folder_path, filename), records_processed,
+                create_rng(seed_sequence, filename, attribute)
+            )
+            if anonymized is not None:
+                results[attribute] = format_attribute_column(column, anonymized)
+        file_results[filename] = results
+
+    # The TVD is measured over all files of the resource, the slots are concatenated in file order
+    file_assignments = {filename: {} for filename in file_columns}
+    if exp_attributes:
+        assignments = tune_resource_in_memory(
+            resource, exp_attributes, merge_slot_values(file_slot_values, exp_attributes), max_iterations,
+            rng=create_rng(seed_sequence, resource)
+        )
+        file_assignments = split_slot_values(assignments, file_slot_values)
+
+    # ----- Write: one write per file -----
+    for filename in file_columns:
+        input_file_path = os.path.join(original_folder_path, filename)
+        output_file_path = os.path.join(output_folder_path, filename)
+        try:
+            write_attribute_columns_to_file(
+                input_file_path, output_file_path, lap_gauss_attributes, file_results[filename],
+                make_record_finisher(file_assignments[filename], exp_attributes, delete_config)
+            )
+            logging.info(f"Fused anonymization successfully for file: {filename}")
+        except Exception as e:
+            logging.error(f"Error of file {filename}: {e}")
+
+
+def make_record_finisher(assignments, exp_attributes, delete_config):
+    """
+    Creates the per-record transformation of the write pass after Algorithm 1 has written its values:
+    the accepted Algorithm 2 values are assigned to the slots in scan order, then the configured
+    paths are deleted.
+
+    :param assignments: Dictionary {attribute: accepted values of the slots of one file}
+    :param exp_attributes: Algorithm 2 configuration of the resource
+    :param delete_config: Deletion configuration of the resource (may be None)
+    :return: Function that receives a record element
+    """
+    write_slots = make_slot_writer(assignments, exp_attributes)
+
+    def finish_record(record):
+        write_slots(record)
+        if delete_config:
+            delete_elements_in_record(record, delete_config)
+
+    return finish_record
@@ -1,6 +1,6 @@
-import xml.etree.ElementTree as ET
 import uuid
 import os
+from modules.xml_stream import iter_records, stream_records
 
 # Dictionary for central assignment of original IDs to new IDs
 global_id_mapping = {}
@@ -45,9 +45,7 @@ def build_global_id_mapping(input_dir):
     for file_name in os.listdir(input_dir):
         if file_name.endswith('.xml'): 
             file_path = os.path.join(input_dir, file_name)
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-            for record in root.findall(".//record"):
+            for record in iter_records(file_path):
                 id_element = record.find("id")
                 if id_element is not None and id_element.text:
                     original_id = id_element.text
@@ -59,11 +57,9 @@ def update_references_parallel(args):
     :param args: Tuple with (file_path, output_path, global_id_mapping)
     """
     file_path, output_path, global_id_mapping = args
-    tree = ET.parse(file_path)
-    root = tree.getroot()
 
-    # Update IDs and references within each record
-    for record in root.findall(".//record"):
+    def update_record(record):
+        # Update IDs and references within each record
         id_element = record.find("id")
         if id_element is not None and id_element.text:
             original_id = id_element.text
@@ -72,17 +68,16 @@ def update_references_parallel(args):
                 id_element.text = new_id
                 replace_id_in_record(record, original_id, new_id)
 
-    # Update references outside the records
-    for ref_element in root.findall(".//reference"):
-        if ref_element.text and "/" in ref_element.text:
-            resource_type, original_id = ref_element.text.split("/", 1)
-            if original_id in global_id_mapping:
-                new_id = global_id_mapping[original_id]
-                ref_element.text = f"{resource_type}/{new_id}"
-
-    # Write the updated file
-    tree.write(output_path, encoding='utf-8', xml_declaration=True)
+        # Update the references of the record
+        for ref_element in record.iter("reference"):
+            if ref_element.text and "/" in ref_element.text:
+                resource_type, original_id = ref_element.text.split("/", 1)
+                if original_id in global_id_mapping:
+                    new_id = global_id_mapping[original_id]
+                    ref_element.text = f"{resource_type}/{new_id}"
 
+    # Stream the file and write the updated records
+    stream_records(file_path, output_path, update_record)
 
 def process_files(input_dir, output_dir):
     """
@@ -1,4 +1,5 @@
 import logging
+import math
 from datetime import datetime, timezone
 from dateutil import parser 
 
@@ -75,6 +76,81 @@ def adjust_parameters(settings, rmse, rmse_range, mechanism):
     }
     logging.info(f"Updated Parameter: {settings['parameters']}")
 
+def expected_rmse(epsilon, sensitivity, mechanism, delta=None):
+    """
+    Expected RMSE of the noise added by a mechanism.
+    Laplace: sqrt(2) * b with b = sensitivity / epsilon. Gaussian: sigma.
+
+    :param epsilon: Data protection parameter ε
+    :param sensitivity: Sensitivity of the function
+    :param mechanism: "Laplace" or "Gaussian"
+    :param delta: Parameter δ (only used by the Gaussian mechanism)
+    :return: Expected RMSE
+    """
+    if mechanism == "Gaussian":
+        return sensitivity * math.sqrt(2 * math.log(1.25 / delta)) / epsilon
+    return math.sqrt(2) * sensitivity / epsilon
+
+
+def initialize_parameters_analytically(settings, rmse_range, mechanism, sensitivity=1, delta=1e-5):
+    """
+    Sets epsilon in closed form so that the expected RMSE hits the middle of the RMSE range.
+    Resets the bisection state used by adjust_parameters_bisection.
+
+    :param settings: Settings of the attribute (updated in place)
+    :param rmse_range: Target range [min, max] for the RMSE
+    :param mechanism: "Laplace" or "Gaussian"
+    :param sensitivity: Sensitivity of the function (kept fixed by the solver)
+    :param delta: Parameter δ (only used by the Gaussian mechanism)
+    """
+    target_rmse = (min(rmse_range) + max(rmse_range)) / 2
+    epsilon = expected_rmse(1, sensitivity, mechanism, delta) / target_rmse
+
+    settings["parameters"] = {
+        "epsilon": epsilon,
+        "sensitivity": sensitivity,
+        "delta": delta if mechanism == "Gaussian" else None
+    }
+    settings["epsilon_bracket"] = [None, None]
+    logging.info(f"Analytical epsilon for target RMSE {target_rmse}: {epsilon:.6f}")
+
+
+def adjust_parameters_bisection(settings, rmse, rmse_range, mechanism):
+    """
+    Corrects epsilon after a sampled RMSE missed the target range.
+
+    As long as only one side is known, epsilon is rescaled with RMSE ~ 1/epsilon.
+    As soon as epsilon values with too high and too low RMSE are known, the bracket is bisected
+    (geometric mean, since epsilon spans several orders of magnitude).
+    """
+    min_rmse, max_rmse = min(rmse_range), max(rmse_range)
+    target_rmse = (min_rmse + max_rmse) / 2
+
+    parameters = settings.get("parameters", {})
+    epsilon = parameters.get("epsilon", 0.1)
+    bracket = settings.setdefault("epsilon_bracket", [None, None])
+
+    if min_rmse <= rmse <= max_rmse:
+        logging.info(f"RMSE ({rmse}) in target range ({min_rmse}, {max_rmse}). No adjustment necessary.")
+        return
+
+    # bracket[0]: largest epsilon with too high RMSE, bracket[1]: smallest epsilon with too low RMSE
+    if rmse > max_rmse:
+        bracket[0] = epsilon if bracket[0] is None else max(bracket[0], epsilon)
+    else:
+        bracket[1] = epsilon if bracket[1] is None else min(bracket[1], epsilon)
+
+    if bracket[0] is not None and bracket[1] is not None:
+        epsilon = math.sqrt(bracket[0] * bracket[1])
+        logging.info(f"RMSE ({rmse}) outside ({min_rmse}, {max_rmse}). Bisect epsilon: {epsilon:.6f}")
+    else:
+        epsilon = max(epsilon * rmse / target_rmse, 0.0001) if rmse > 0 else epsilon * 0.5
+        logging.info(f"RMSE ({rmse}) outside ({min_rmse}, {max_rmse}). Rescale epsilon: {epsilon:.6f}")
+
+    parameters["epsilon"] = epsilon
+    settings["parameters"] = parameters
+
+
 def calculate_dynamic_sensitivity(root, config, filename):
     """
     Dynamically calculates the sensitivity for each attribute in the configuration,
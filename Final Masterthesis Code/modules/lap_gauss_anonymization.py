@@ -1,159 +1,314 @@
-from datetime import datetime, timezone, timedelta
-from modules.mechanisms import laplace_mechanism, gaussian_mechanism
-from modules.rmse import calculate_rmse_date, calculate_rmse_decimal
+import numpy as np
+from modules.mechanisms import laplace_mechanism_batch, gaussian_mechanism_batch
+from modules.date_codec import format_dates, parse_dates
+from modules.path_index import build_path_index, collect_configured_paths, find_all
+from modules.xml_stream import iter_records, stream_records
 
-def anonymize_decimal_values(root, config, filename):
+
+def apply_mechanism_batch(values, mechanism, epsilon, sensitivity, delta, rng=None):
+    """
+    Draws the noise of the configured mechanism for all values of an attribute in one call.
+
+    :param values: NumPy array with the original values
+    :param mechanism: Name of the mechanism ("Laplace" or "Gaussian")
+    :param epsilon: Data protection parameter ε
+    :param sensitivity: Sensitivity of the function
+    :param delta: Parameter δ (only used by the Gaussian mechanism)
+    :param rng: Optional numpy.random.Generator (see modules.rng)
+    :return: NumPy array with the anonymized values
+    """
+    if mechanism == "Laplace":
+        return laplace_mechanism_batch(values, epsilon, sensitivity, rng)
+    elif mechanism == "Gaussian":
+        return gaussian_mechanism_batch(values, epsilon, sensitivity, delta, rng)
+    raise ValueError(f"Unknown mechanism: {mechanism}")
+
+
+def collect_decimal_values(root, path, attribute, index=None):
     """
-    Anonymizes decimal values (e.g. 'valueDecimal') in an XML document based on the configuration.
+    Collects all decimal values of an attribute into a NumPy array.
+
     :param root: Root element of the XML tree
-    :param config: Configuration with attributes whose anonymization is adjusted
-    :param filename: Name of the file that is anonymized
-    :return: RMSE results for the anonymized decimal values
-    """
-    original_values = {}
-    anonymized_values = {}
-
-    # Iterate through all resources and their attributes in the configuration
-    for resource, attributes in config.items():
-        if resource.lower() in filename.lower():
-            for attribute, settings in attributes.items():
-                if 'path' in settings and "decimal" in attribute.lower():
-                    path = settings["path"]
-                    mechanism = settings.get("mechanism")
-                    parameters = settings.get("parameters", {"epsilon": 0.01, "sensitivity": 1, "delta": 1e-5})
-
-                    epsilon = parameters.get("epsilon", 0.01)
-                    sensitivity = parameters.get("sensitivity", 1)
-                    delta = parameters.get("delta", 1e-5)
-
-                    if mechanism is None:
-                        raise ValueError(f"No mechanism {attribute} specified in the configuration")
-
-                    for i, element in enumerate(root.findall(path)):
-                        original_value = element.text
-                        if original_value:
-                            try:
-                                original_value_float = float(original_value)
-
-                                # Anonymisierung basierend auf Mechanismus
-                                if mechanism == "Laplace":
-                                    anonymized_value = laplace_mechanism(original_value_float, epsilon, sensitivity)
-                                elif mechanism == "Gaussian":
-                                    anonymized_value = gaussian_mechanism(original_value_float, epsilon, sensitivity, delta)
-                                else:
-                                    raise ValueError(f"Unknown mechanism: {mechanism}")
-
-                                element.text = str(anonymized_value)
-
-                                # Save values for RMSE calculation
-                                attribute_key = f"{attribute}_{i}"
-                                original_values[attribute_key] = original_value_float
-                                anonymized_values[attribute_key] = anonymized_value
-                            except ValueError as e:
-                                print(f"Errors in the anonymization of {attribute}: {e}")
-                                continue
-                            except Exception as e:
-                                print(f"Unknown error in the anonymization of {attribute}: {e}")
-                                continue
-
-    # Calculate RMSE
-    if original_values and anonymized_values:
-        rmse_results = calculate_rmse_decimal(original_values, anonymized_values)
-    else:
-        rmse_results = {}
+    :param path: Path of the attribute
+    :param attribute: Name of the attribute
+    :param index: Optional path index of root (see build_path_index)
+    :return: Tuple (list of elements, float64 array with the values)
+    """
+    elements = []
+    values = []
+    for element in find_all(root, path, index):
+        if element.text:
+            try:
+                values.append(float(element.text))
+                elements.append(element)
+            except ValueError as e:
+                print(f"Errors in the anonymization of {attribute}: {e}")
+    return elements, np.array(values, dtype=np.float64)
+
+
+def collect_date_seconds(root, path, attribute, index=None):
+    """
+    Collects all date/dateTime values of an attribute as UTC epoch seconds, parsed in one bulk pass.
+
+    :param root: Root element of the XML tree
+    :param path: Path of the attribute
+    :param attribute: Name of the attribute
+    :param index: Optional path index of root (see build_path_index)
+    :return: Tuple (list of elements, int64 array with epoch seconds, list of time zone suffixes,
+             array with the precisions of the values)
+    """
+    elements = [element for element in find_all(root, path, index) if element.text]
+    texts = [element.text for element in elements]
+    seconds, tz_suffixes, precisions, valid = parse_dates(texts)
+
+    if not valid.all():
+        for text in np.array(texts, dtype=object)[~valid].tolist():
+            print(f"Errors in the anonymization of {attribute}: Invalid date value '{text}'")
+        elements = [element for element, is_valid in zip(elements, valid.tolist()) if is_valid]
+        tz_suffixes = [suffix for suffix, is_valid in zip(tz_suffixes, valid.tolist()) if is_valid]
+        seconds, precisions = seconds[valid], precisions[valid]
+    return elements, seconds, tz_suffixes, precisions
+
+
+def collect_date_values(root, path, attribute, index=None):
+    """
+    Collects all date values of an attribute as days since the Unix epoch.
 
-    if rmse_results:
-        print(f"RMSE results for {filename}: {rmse_results}")
-    return rmse_results
+    :param root: Root element of the XML tree
+    :param path: Path of the attribute
+    :param attribute: Name of the attribute
+    :param index: Optional path index of root (see build_path_index)
+    :return: Tuple (list of elements, int64 array with epoch days, list of time zone suffixes,
+             array with the precisions of the values)
+    """
+    elements, seconds, tz_suffixes, precisions = collect_date_seconds(root, path, attribute, index)
+    return elements, np.floor_divide(seconds, 86400), tz_suffixes, precisions
+
+
+def format_date_values(anonymized_days, tz_suffixes, precisions):
+    """
+    Converts anonymized epoch days back into date strings in one vectorized pass, in the time zone and
+    precision of the original values (e.g. "birthDate" stays a plain date).
+
+    :param anonymized_days: Float array with the anonymized days since the Unix epoch
+    :param tz_suffixes: Time zone suffixes of the original values
+    :param precisions: Precisions of the original values
+    :return: List with the formatted values (None for values outside the datetime range)
+    """
+    return format_dates(np.floor(np.asarray(anonymized_days) * 86400), tz_suffixes, precisions)
 
 
-def anonymize_dates(root, config, filename):
+def get_attribute_kind(attribute):
     """
-    Anonymizes all relevant date fields in an XML document based on the configuration.
+    Determines how the values of an attribute are encoded, based on its name.
+
+    :param attribute: Name of the attribute
+    :return: "date", "decimal" or None if the attribute is not numeric
+    """
+    if "date" in attribute.lower():
+        return "date"
+    elif "decimal" in attribute.lower():
+        return "decimal"
+    return None
+
+
+def resolve_parameters(settings, kind):
+    """
+    Returns the current mechanism parameters of an attribute with the defaults of its kind.
+
+    :param settings: Settings of the attribute from the configuration
+    :param kind: "date" or "decimal"
+    :return: Tuple (epsilon, sensitivity, delta)
+    """
+    default_delta = 1e-7 if kind == "date" else 1e-5
+    parameters = settings.get("parameters", {"epsilon": 0.01, "sensitivity": 1, "delta": default_delta})
+    delta = parameters.get("delta")
+    return parameters.get("epsilon", 0.01), parameters.get("sensitivity", 1), default_delta if delta is None else delta
+
+
+def extract_attribute_column(root, attribute, settings, index=None):
+    """
+    Extracts the original values of an attribute once into a columnar structure with element handles.
 
     :param root: Root element of the XML tree
-    :param config: Configuration with attributes whose anonymization is adjusted
-    :param filename: Name of the file that is anonymized
-    :return: Dictionary with RMSE values of the anonymized attributes.
-    """
-    original_values = {}
-    anonymized_values = {}
-
-    for resource, attributes in config.items():
-        if resource.lower() in filename.lower():
-            for attribute, settings in attributes.items():
-                if 'path' in settings and any(x in attribute.lower() for x in ['date', 'start', 'end', 'issued']):
-                    path = settings["path"]
-                    mechanism = settings["mechanism"]
-                    parameters = settings.get("parameters", {"epsilon": 0.01, "sensitivity": 1, "delta": 1e-7})
-
-                    if mechanism is None:
-                        raise ValueError(f"No mechanism for {attribute} specified in the configuration")
-
-                    for element in root.findall(path):
-                        original_value = element.text
-                        if original_value:
-                            try:
-                                if attribute == "birthDate":
-                                    original_date = datetime.strptime(original_value, "%Y-%m-%d")
-                                    epoch = datetime(1970, 1, 1)
-                                    days_since_epoch = (original_date - epoch).days
-
-                                    if mechanism == "Laplace":
-                                        anonymized_days = laplace_mechanism(days_since_epoch, parameters["epsilon"], parameters["sensitivity"])
-                                    elif mechanism == "Gaussian":
-                                        anonymized_days = gaussian_mechanism(days_since_epoch, parameters["epsilon"], parameters["sensitivity"], parameters["delta"])
-                                    else:
-                                        raise ValueError(f"Unknown mechanism: {mechanism}")
-
-                                    anonymized_date = epoch + timedelta(days=anonymized_days)
-                                    element.text = anonymized_date.strftime("%Y-%m-%d")  
-
-                                else:
-                                    original_value_datetime = datetime.fromisoformat(original_value)
-
-                                    # Anonymization of date values
-                                    epoch = datetime(1970, 1, 1, tzinfo=timezone.utc)
-                                    days_since_epoch = (original_value_datetime - epoch).days
-
-                                    if mechanism == "Laplace":
-                                        anonymized_days = laplace_mechanism(days_since_epoch, parameters["epsilon"], parameters["sensitivity"])
-                                    elif mechanism == "Gaussian":
-                                        anonymized_days = gaussian_mechanism(days_since_epoch, parameters["epsilon"], parameters["sensitivity"], parameters["delta"])
-                                    else:
-                                        raise ValueError(f"Unknown mechanism: {mechanism}")
-
-                                    anonymized_datetime = epoch + timedelta(days=anonymized_days)
-
-                                    if original_value_datetime.tzinfo:
-                                        anonymized_datetime = anonymized_datetime.replace(tzinfo=original_value_datetime.tzinfo)
-                                    else:
-                                        anonymized_datetime = anonymized_datetime.replace(tzinfo=timezone.utc)
-
-                                    element.text = anonymized_datetime.replace(microsecond=0).isoformat()
-
-                                # Collect values for RMSE
-                                if attribute not in original_values:
-                                    original_values[attribute] = []
-                                    anonymized_values[attribute] = []
-
-                                original_values[attribute].append(original_value)
-                                anonymized_values[attribute].append(element.text)
-                            except Exception as e:
-                                print(f"Errors in the anonymization of {attribute}: {e}")
-                                continue
-
-    # Calculate RMSE
-    rmse_results = {}
-    for attribute, original_list in original_values.items():
-        anonymized_list = anonymized_values[attribute]
-        if original_list and anonymized_list:
-            rmse = calculate_rmse_date(
-                {f"{attribute}_{i}": original for i, original in enumerate(original_list)},
-                {f"{attribute}_{i}": anonymized for i, anonymized in enumerate(anonymized_list)},
-            )
-            if rmse and attribute in rmse:
-                rmse_results[attribute] = rmse[attribute]
-                print(f"RMSE for {attribute} in {filename}: {rmse}")
-
-    return rmse_results
+    :param attribute: Name of the attribute
+    :param settings: Settings of the attribute from the configuration
+    :param index: Optional path index of root (see build_path_index)
+    :return: Dictionary with 'attribute', 'kind', 'elements', 'values', 'tz_suffixes' and 'precisions', or None
+    """
+    kind = get_attribute_kind(attribute)
+    if kind is None or "path" not in settings:
+        return None
+
+    if kind == "date":
+        elements, values, tz_suffixes, precisions = collect_date_values(root, settings["path"], attribute, index)
+    else:
+        elements, values = collect_decimal_values(root, settings["path"], attribute, index)
+        tz_suffixes = []
+        precisions = np.array([], dtype=str)
+
+    return {
+        "attribute": attribute,
+        "kind": kind,
+        "elements": elements,
+        "values": values,
+        "tz_suffixes": tz_suffixes,
+        "precisions": precisions,
+    }
+
+
+def noise_attribute_column(column, mechanism, epsilon, sensitivity, delta, rng=None):
+    """
+    Draws a candidate anonymization for a column, always starting from the pristine original values.
+    Date values are truncated to the resolution in which they are written back.
+
+    :param column: Column from extract_attribute_column
+    :param mechanism: Name of the mechanism ("Laplace" or "Gaussian")
+    :param epsilon: Data protection parameter ε
+    :param sensitivity: Sensitivity of the function
+    :param delta: Parameter δ (only used by the Gaussian mechanism)
+    :param rng: Optional numpy.random.Generator (see modules.rng)
+    :return: Float array with the anonymized values
+    """
+    anonymized = apply_mechanism_batch(column["values"], mechanism, epsilon, sensitivity, delta, rng)
+    if column["kind"] == "date":
+        if column["attribute"] == "birthDate":
+            anonymized = np.floor(anonymized)
+        else:
+            anonymized = np.floor(anonymized * 86400) / 86400
+    return anonymized
+
+
+def format_attribute_column(column, anonymized):
+    """
+    Formats the accepted anonymized values of a column for the write pass in one vectorized call.
+
+    :param column: Column from extract_attribute_columns_from_file
+    :param anonymized: Float array with the accepted anonymized values
+    :return: Dictionary with 'texts' (None for date values outside the datetime range) and 'record_offsets'
+    """
+    if column["kind"] == "date":
+        texts = format_date_values(anonymized, column["tz_suffixes"], column["precisions"])
+    else:
+        texts = [str(value) for value in anonymized.tolist()]
+    return {"texts": texts, "record_offsets": np.array(column["record_offsets"], dtype=np.int64)}
+
+
+def write_attribute_texts(attribute, elements, texts):
+    """
+    Writes formatted anonymized values back into the XML elements.
+
+    :param attribute: Name of the attribute
+    :param elements: Elements of the values
+    :param texts: Formatted values (see format_attribute_column)
+    """
+    for element, text in zip(elements, texts):
+        if text is None:
+            print(f"Errors in the anonymization of {attribute}: date value out of range")
+            continue
+        element.text = text
+
+
+def extract_attribute_columns_from_file(file_path, attributes, record_callback=None):
+    """
+    Extracts the columns of several attributes from an XML file in one streaming pass.
+    Only the values are kept, the element handles are dropped together with their record. Date values are
+    collected as text and parsed in one bulk pass per file (see date_codec).
+    The values of record i are values[record_offsets[i]:record_offsets[i + 1]].
+
+    :param file_path: Path to the XML file
+    :param attributes: Dictionary {attribute: settings}
+    :param record_callback: Optional function that receives every record, e.g. to extract further values
+                            in the same pass
+    :return: Tuple (dictionary {attribute: column}, number of records)
+    """
+    parts = {
+        attribute: ([], [0]) for attribute, settings in attributes.items()
+        if get_attribute_kind(attribute) is not None and "path" in settings
+    }
+    paths = collect_configured_paths(attributes)
+    records_processed = 0
+
+    for record in iter_records(file_path):
+        records_processed += 1
+        index = build_path_index(record, paths)  # One walk per record serves every attribute
+        for attribute, (values, record_offsets) in parts.items():
+            path = attributes[attribute]["path"]
+            if get_attribute_kind(attribute) == "date":
+                values.extend(element.text for element in find_all(record, path, index) if element.text)
+            else:
+                values.extend(collect_decimal_values(record, path, attribute, index)[1].tolist())
+            record_offsets.append(len(values))
+        if record_callback is not None:
+            record_callback(record)
+
+    columns = {}
+    for attribute, (values, record_offsets) in parts.items():
+        kind = get_attribute_kind(attribute)
+        record_offsets = np.array(record_offsets, dtype=np.int64)
+        tz_suffixes = []
+        precisions = np.array([], dtype=str)
+        if kind == "date":
+            seconds, tz_suffixes, precisions, valid = parse_dates(values)
+            if not valid.all():
+                for text in np.array(values, dtype=object)[~valid].tolist():
+                    print(f"Errors in the anonymization of {attribute}: Invalid date value '{text}'")
+                # Offsets over the parsed values only
+                record_offsets = np.concatenate(([0], np.cumsum(valid)))[record_offsets]
+                tz_suffixes = [suffix for suffix, is_valid in zip(tz_suffixes, valid.tolist()) if is_valid]
+                seconds, precisions = seconds[valid], precisions[valid]
+            values = np.floor_divide(seconds, 86400)
+        else:
+            values = np.array(values, dtype=np.float64)
+
+        columns[attribute] = {
+            "attribute": attribute,
+            "kind": kind,
+            "elements": [],
+            "values": values,
+            "tz_suffixes": tz_suffixes,
+            "precisions": precisions,
+            "record_offsets": record_offsets,
+        }
+    return columns, records_processed
+
+
+def write_attribute_columns_to_file(input_file_path, output_file_path, attributes, results, record_callback=None):
+    """
+    Streams an XML file to the output and writes the accepted values of every attribute record by record.
+    The values of record i are taken from the record offsets of the extraction, so only records with values
+    that could not be parsed are extracted again.
+
+    :param input_file_path: Path to the original XML file
+    :param output_file_path: Path to the output XML file
+    :param attributes: Dictionary {attribute: settings}
+    :param results: Dictionary {attribute: formatted values from format_attribute_column}
+    :param record_callback: Optional function that further transforms every record before it is written
+    :return: Number of records written
+    """
+    record_numbers = {"next": 0}
+    paths = collect_configured_paths({attribute: attributes[attribute] for attribute in results})
+
+    def transform(record):
+        index = build_path_index(record, paths)
+        record_number = record_numbers["next"]
+        record_numbers["next"] += 1
+
+        for attribute, formatted in results.items():
+            record_offsets = formatted["record_offsets"]
+            if record_number + 1 >= record_offsets.size:
+                print(f"Errors in the anonymization of {attribute}: more records than extracted")
+                continue
+
+            texts = formatted["texts"][record_offsets[record_number]:record_offsets[record_number + 1]]
+            elements = [element for element in find_all(record, attributes[attribute]["path"], index) if element.text]
+            if len(elements) != len(texts):
+                # The extraction skipped values that could not be parsed
+                elements = extract_attribute_column(record, attribute, attributes[attribute], index)["elements"]
+            write_attribute_texts(attribute, elements, texts)
+
+        if record_callback is not None:
+            record_callback(record)
+
+    return stream_records(input_file_path, output_file_path, transform)
+
@@ -4,10 +4,17 @@ import csv
 import time
 import psutil
 
-import xml.etree.ElementTree as ET
+from modules.column_cache import extract_resource_file
 from modules.dates_grouping import anonymize_date_grouping, anonymize_deceased_date_grouping
-from modules.lap_gauss_anonymization import anonymize_dates, anonymize_decimal_values
-from modules.lap_gauss_adjustment import adjust_parameters, calculate_dynamic_sensitivity
+from modules.lap_gauss_anonymization import (
+    format_attribute_column, noise_attribute_column, resolve_parameters, write_attribute_columns_to_file
+)
+from modules.lap_gauss_adjustment import (
+    adjust_parameters, adjust_parameters_bisection, calculate_dynamic_sensitivity, initialize_parameters_analytically
+)
+from modules.rmse import calculate_error_metrics
+from modules.rng import create_rng
+from modules.work_units import order_units_by_weight
 
 
 
@@ -173,9 +180,74 @@ def log_iteration_to_csv(resource, attribute, epsilon, sensitivity, delta, itera
 #     except Exception as e:
 #         logging.error(f"Error on {filename}: {e}")
 
-def process_laplace_gaussian_wrapper(resource, attributes, original_folder_path, temp_output_folder_path, max_iterations):
+def tune_attribute_column(resource, filename, attribute, settings, column, max_iterations, solver="analytic",
+                          input_file_path=None, output_file_path=None, records_processed=0, rng=None):
+    """
+    Runs the RMSE feedback loop for a single attribute column.
+    Every iteration draws a new candidate from the pristine original values in NumPy.
+
+    :param settings: Settings of the attribute (the parameters are updated in place)
+    :param column: Column from extract_attribute_column
+    :param solver: "analytic" starts from the closed-form epsilon and corrects it by bisection,
+                   "momentum" uses the iterative momentum adjustment of adjust_parameters
+    :param rng: Optional numpy.random.Generator of the (file, attribute) unit (see modules.rng)
+    :return: Accepted (or last) anonymized values, or None if no candidate could be drawn
+    """
+    rmse_range = settings.get("rmse_range", [0, 100])
+    mechanism = settings.get("mechanism", "Laplace")
+
+    if solver == "analytic":
+        _, sensitivity, delta = resolve_parameters(settings, column["kind"])
+        initialize_parameters_analytically(settings, rmse_range, mechanism, sensitivity, delta)
+
+    anonymized = None
+    for iteration in range(1, max_iterations + 1):
+        start_time_iteration = time.time()
+        logging.info(f"--- Iteration {iteration} gestartet für '{attribute}' in Datei: {filename} ---")
+
+        epsilon, sensitivity, delta = resolve_parameters(settings, column["kind"])
+        try:
+            anonymized = noise_attribute_column(column, mechanism, epsilon, sensitivity, delta, rng)
+        except ValueError as e:
+            print(f"Errors in the anonymization of {attribute}: {e}")
+            return None
+
+        error_metrics = calculate_error_metrics(column["values"], anonymized)
+        current_rmse = error_metrics["rmse"]
+        logging.info(
+            f"RMSE für '{attribute}' in {filename}: {current_rmse:.4f} "
+            f"(MAE: {error_metrics['mae']:.4f}, max error: {error_metrics['max_error']:.4f})"
+        )
+
+        track_performance(
+            iteration, attribute, input_file_path, output_file_path, start_time_iteration, records_processed
+        )
+
+        log_iteration_to_csv(
+            resource, attribute, epsilon, sensitivity, settings.get("parameters", {}).get("delta"),
+            iteration, current_rmse
+        )
+
+        # Check whether the RMSE is within the target range
+        if rmse_range[0] <= current_rmse <= rmse_range[1]:
+            break
+
+        if solver == "analytic":
+            adjust_parameters_bisection(settings, current_rmse, rmse_range, mechanism)
+        else:
+            adjust_parameters(settings, current_rmse, rmse_range, mechanism)
+        logging.info(f"Adjusted parameters for '{attribute}': {settings['parameters']}")
+
+    return anonymized
+
+
+def process_laplace_gaussian_wrapper(resource, attributes, original_folder_path, temp_output_folder_path, max_iterations,
+                                     solver="analytic", cache_folder=None, seed_sequence=None):
     """
     Verarbeitet alle Dateien für eine bestimmte Ressource (z. B. "Patient", "Observation").
+
+    The original values of each attribute are extracted once per file (streaming) and tuned with
+    tune_attribute_column. Only the accepted noise is written back at the end.
     """
     logging.info(f"Start Laplace/Gaussian anonymization for resource: {resource}")
 
@@ -191,72 +263,101 @@ def process_laplace_gaussian_wrapper(resource, attributes, original_folder_path,
         try:
             logging.info(f"Processing file: {filename}")
 
-            start_time_total = time.time()
-            process = psutil.Process(os.getpid())
-
-            memory_before_loading = process.memory_info().rss / (1024 * 1024)  # RAM in MB
-
-            # Load original XML file
-            tree = ET.parse(input_file_path)
-            root = tree.getroot()
-
-            memory_after_loading = process.memory_info().rss / (1024 * 1024)  # RAM in MB
-            
-            # Enter number of data records
-            records_processed = len(root.findall(".//record"))
-
-            iteration = 0
-            all_within_range = False
-
-            while iteration < max_iterations and not all_within_range:
-                start_time_iteration = time.time()
-                all_within_range = True
-                rmse_results = {}
-                logging.info(f"--- Iteration {iteration + 1} gestartet für Datei: {filename} ---")
-
-                # Processing the attributes for the resource
-                for attribute, settings in attributes.items():
-                    rmse_range = settings.get("rmse_range", [0, 100])
-                    mechanism = settings.get("mechanism", "Laplace")
-
-                    if "path" in settings:
-                        rmse = {}
-                        if "date" in attribute.lower():
-                            rmse = anonymize_dates(root, {resource: {attribute: settings}}, filename)
-                        elif "decimal" in attribute.lower():
-                            rmse = anonymize_decimal_values(root, {resource: {attribute: settings}}, filename)
-
-                        if rmse and attribute in rmse:
-                            current_rmse = rmse[attribute]
-                            rmse_results[attribute] = current_rmse
-                            logging.info(f"RMSE für '{attribute}' in {filename}: {current_rmse:.4f}")
-
-                            track_performance(
-                                iteration + 1, attribute, input_file_path, temp_output_file_path, start_time_iteration, records_processed
-                            )
-
-                            parameters = settings.get("parameters", {})
-                            epsilon = parameters.get("epsilon", 0.01)
-                            sensitivity = parameters.get("sensitivity", 1)
-                            delta = parameters.get("delta", None)
-
-                            log_iteration_to_csv(
-                                resource, attribute, epsilon, sensitivity, delta, iteration + 1, current_rmse
-                            )
-
-                            # Check whether the RMSE is within the target range
-                            if not (rmse_range[0] <= current_rmse <= rmse_range[1]):
-                                all_within_range = False
-                                adjust_parameters(settings, current_rmse, rmse_range, mechanism)
-                                logging.info(f"Adjusted parameters for '{attribute}': {settings['parameters']}")
-
-                iteration += 1
-                logging.info(f"--- Iteration {iteration} completed for file: {filename} ---")
-
-            
-            tree.write(temp_output_file_path, xml_declaration=True, encoding="utf-8", method="xml")
+            # Stream the original XML file once (or load the cached columns) and keep only the value columns
+            columns, records_processed, _ = extract_resource_file(input_file_path, attributes, {}, cache_folder)
+
+            results = {}
+            for attribute, column in columns.items():
+                if not column["values"].size:
+                    continue
+
+                anonymized = tune_attribute_column(
+                    resource, filename, attribute, attributes[attribute], column, max_iterations, solver,
+                    input_file_path, temp_output_file_path, records_processed,
+                    create_rng(seed_sequence, filename, attribute)
+                )
+                if anonymized is not None:
+                    results[attribute] = format_attribute_column(column, anonymized)
+
+            # Write the accepted candidates back in one streaming pass
+            write_attribute_columns_to_file(input_file_path, temp_output_file_path, attributes, results)
             logging.info(f"Laplace/Gaussian successfully for file: {filename}")
 
         except Exception as e:
             logging.error(f"Error of file {filename}: {e}")
 
+
+def build_lap_gauss_work_units(config, original_folder_path, cache_folder=None):
+    """
+    Extracts the columns of every file once and splits Algorithm 1 into (file, attribute) work units, each
+    carrying its column. The attributes of a file are independent (own parameters and RMSE), so the units
+    can run concurrently.
+
+    :param config: Laplace/Gaussian configuration (resource -> attributes)
+    :param original_folder_path: Folder with the original XML files
+    :param cache_folder: Folder of the extraction cache (None disables the cache, see column_cache)
+    :return: List of work units, largest columns first
+    """
+    units = []
+    for filename in os.listdir(original_folder_path):
+        if not filename.endswith(".xml"):
+            continue
+        for resource, attributes in config.items():
+            if not filename.startswith(resource):
+                continue
+            columns, records_processed, _ = extract_resource_file(
+                os.path.join(original_folder_path, filename), attributes, {}, cache_folder
+            )
+            for attribute, settings in attributes.items():
+                column = columns.get(attribute)
+                units.append({
+                    "resource": resource,
+                    "filename": filename,
+                    "attribute": attribute,
+                    "settings": settings,
+                    "column": column,
+                    "records_processed": records_processed,
+                    "weight": column["values"].size if column is not None else 0,
+                })
+    return order_units_by_weight(units)
+
+
+def process_lap_gauss_unit(unit, original_folder_path, max_iterations, solver="analytic", seed_sequence=None):
+    """
+    Tunes a single (file, attribute) work unit on its extracted column. Runs in a worker process and neither
+    reads nor writes any file.
+
+    :param unit: Work unit from build_lap_gauss_work_units
+    :param seed_sequence: Root seed sequence of the run, the unit draws from its own child stream (see modules.rng)
+    :return: Tuple (filename, attribute, accepted values formatted by format_attribute_column or None)
+    """
+    filename, attribute, column = unit["filename"], unit["attribute"], unit["column"]
+    input_file_path = os.path.join(original_folder_path, filename)
+
+    if column is None or not column["values"].size:
+        return filename, attribute, None
+
+    anonymized = tune_attribute_column(
+        unit["resource"], filename, attribute, unit["settings"], column, max_iterations, solver,
+        input_file_path, None, unit["records_processed"], create_rng(seed_sequence, filename, attribute)
+    )
+    if anonymized is None:
+        return filename, attribute, None
+    return filename, attribute, format_attribute_column(column, anonymized)
+
+
+def write_lap_gauss_file(filename, results, attributes, original_folder_path, temp_output_folder_path):
+    """
+    Merges the accepted values of all attributes of a file and writes the file exactly once.
+    Errors are not caught: a file that cannot be written must not silently drop out of the output.
+
+    :param filename: Name of the XML file
+    :param results: Dictionary {attribute: accepted values formatted by format_attribute_column}
+    :param attributes: Configuration of the attributes of the resource
+    """
+    input_file_path = os.path.join(original_folder_path, filename)
+    temp_output_file_path = os.path.join(temp_output_folder_path, filename)
+
+    accepted = {attribute: anonymized for attribute, anonymized in results.items() if anonymized is not None}
+    write_attribute_columns_to_file(input_file_path, temp_output_file_path, attributes, accepted)
+    logging.info(f"Laplace/Gaussian successfully for file: {filename}")
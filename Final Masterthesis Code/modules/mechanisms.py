@@ -1,20 +1,21 @@
 import numpy as np
-import random
+from modules.rng import get_rng
 
-def laplace_mechanism(value, epsilon, sensitivity):
+def laplace_mechanism(value, epsilon, sensitivity, rng=None):
     """
     Applies the Laplace mechanism to anonymize a value.
 
     :param value: Original value
     :param epsilon: Data protection parameter ε
     :param sensitivity: Sensitivity of the function
+    :param rng: Optional numpy.random.Generator (see modules.rng)
     :return: Anonymized value
     """
-    noise = np.random.laplace(0, sensitivity / epsilon)
+    noise = get_rng(rng).laplace(0, sensitivity / epsilon)
     return value + noise
 
 
-def gaussian_mechanism(value, epsilon, sensitivity, delta):
+def gaussian_mechanism(value, epsilon, sensitivity, delta, rng=None):
     """
     Applies the Gaussian mechanism to anonymize a value.
 
@@ -22,14 +23,47 @@ def gaussian_mechanism(value, epsilon, sensitivity, delta):
     :param epsilon: Data protection parameter ε
     :param sensitivity: Sensitivity of the function
     :param delta: Parameter δ for error control
+    :param rng: Optional numpy.random.Generator (see modules.rng)
     :return: Anonymized value
     """
     sigma = sensitivity * np.sqrt(2 * np.log(1.25 / delta)) / epsilon
-    noise = np.random.normal(0, sigma)
+    noise = get_rng(rng).normal(0, sigma)
     return value + noise
 
 
-def exponential_mechanism_with_noisy_counters(utility_scores, counters, epsilon, root, attribute_name):
+def laplace_mechanism_batch(values, epsilon, sensitivity, rng=None):
+    """
+    Applies the Laplace mechanism to a whole array of values with a single noise draw.
+
+    :param values: Array with the original values
+    :param epsilon: Data protection parameter ε
+    :param sensitivity: Sensitivity of the function
+    :param rng: Optional numpy.random.Generator (see modules.rng)
+    :return: NumPy array with the anonymized values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    noise = get_rng(rng).laplace(0, sensitivity / epsilon, size=values.shape)
+    return values + noise
+
+
+def gaussian_mechanism_batch(values, epsilon, sensitivity, delta, rng=None):
+    """
+    Applies the Gaussian mechanism to a whole array of values with a single noise draw.
+
+    :param values: Array with the original values
+    :param epsilon: Data protection parameter ε
+    :param sensitivity: Sensitivity of the function
+    :param delta: Parameter δ for error control
+    :param rng: Optional numpy.random.Generator (see modules.rng)
+    :return: NumPy array with the anonymized values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    sigma = sensitivity * np.sqrt(2 * np.log(1.25 / delta)) / epsilon
+    noise = get_rng(rng).normal(0, sigma, size=values.shape)
+    return values + noise
+
+
+def exponential_mechanism_with_noisy_counters(utility_scores, counters, epsilon, root, attribute_name, rng=None):
     """
     Exponential mechanism for selecting a value from a discrete set with utility scores.
 
@@ -38,6 +72,7 @@ def exponential_mechanism_with_noisy_counters(utility_scores, counters, epsilon,
     :param epsilon: Data protection parameter ε
     :param root: Root element of the XML structure (for future extensions)
     :param attribute_name: Name of the attribute
+    :param rng: Optional numpy.random.Generator (see modules.rng)
     :return: Selected value
     """
     sensitivity = 1 
@@ -54,7 +89,8 @@ def exponential_mechanism_with_noisy_counters(utility_scores, counters, epsilon,
         probabilities = {key: score / total_sum for key, score in exp_scores.items()}
 
         # Selection of the value
-        chosen_value = random.choices(list(probabilities.keys()), weights=probabilities.values(), k=1)[0]
+        keys = list(probabilities.keys())
+        chosen_value = keys[get_rng(rng).choice(len(keys), p=list(probabilities.values()))]
 
         # Update the counter
         counters[chosen_value] -= 1
@@ -62,3 +98,112 @@ def exponential_mechanism_with_noisy_counters(utility_scores, counters, epsilon,
             del counters[chosen_value]  # Remove values with 0 as numerator
 
         return chosen_value
+
+
+class ExponentialSampler:
+    """
+    Vectorized exponential mechanism with noisy counters for one attribute.
+
+    Utilities, selection weights and the remaining counts are kept in NumPy arrays. The semantics are the same
+    as repeated calls of exponential_mechanism_with_noisy_counters: every draw selects a value with a probability
+    proportional to exp(ε * utility / (2 * sensitivity)) among the values whose counter is still positive, and
+    the counter of the selected value is decremented.
+
+    The draws are simulated in one vectorized pass as competing exponential clocks: every value fires at rate
+    weight, and its counter is used up after count firings. The firing times of value i are cumulative sums of
+    count_i standard exponential draws divided by weight_i. Because the clocks are memoryless, the next firing
+    among the values that still have a counter is value i with probability weight_i / (sum of their weights),
+    exactly as in the sequential mechanism. The n earliest firing times (argpartition) in ascending order are
+    the n draws in the order of drawing, independent of how many counters are 1.
+    """
+
+    def __init__(self, utility_scores, counters, epsilon, sensitivity=1, rng=None):
+        """
+        :param utility_scores: Dictionary of utility scores {key: score}
+        :param counters: Dictionary of available values {key: count}
+        :param epsilon: Data protection parameter ε
+        :param sensitivity: Sensitivity of the utility function
+        :param rng: Optional numpy.random.Generator (see modules.rng)
+        """
+        self.rng = get_rng(rng)
+        self.keys = list(counters.keys())
+        self.counts = np.array([counters[key] for key in self.keys], dtype=np.int64)
+        utilities = np.array([utility_scores[key] for key in self.keys], dtype=np.float64)
+        self.weights = self.selection_weights(utilities, epsilon, sensitivity)
+
+    @classmethod
+    def from_arrays(cls, utility_scores, counts, epsilon, sensitivity=1, rng=None):
+        """
+        Creates a sampler over dictionary-encoded values (see CategoricalDomain), the keys are the codes.
+
+        :param utility_scores: NumPy array with the utility score of every code
+        :param counts: NumPy array with the available count of every code
+        :param epsilon: Data protection parameter ε
+        :param sensitivity: Sensitivity of the utility function
+        :param rng: Optional numpy.random.Generator (see modules.rng)
+        :return: ExponentialSampler
+        """
+        sampler = cls.__new__(cls)
+        sampler.rng = get_rng(rng)
+        sampler.keys = np.arange(len(counts))
+        sampler.counts = np.array(counts, dtype=np.int64)
+        sampler.weights = cls.selection_weights(np.asarray(utility_scores, dtype=np.float64), epsilon, sensitivity)
+        return sampler
+
+    @staticmethod
+    def selection_weights(utilities, epsilon, sensitivity):
+        """
+        :return: Unnormalized selection weights exp(ε * utility / (2 * sensitivity))
+        """
+        # Shift by the maximum before exponentiating, the probabilities are invariant to it
+        scores = (epsilon * utilities) / (2 * sensitivity)
+        return np.exp(scores - scores.max()) if scores.size else scores
+
+    def remaining(self):
+        """
+        :return: Number of values that can still be drawn
+        """
+        return int(self.counts[self.counts > 0].sum())
+
+    def sample(self, size):
+        """
+        Draws up to `size` values. Fewer values are returned once all counters are exhausted.
+
+        :param size: Number of values to draw
+        :return: List with the selected keys in the order of drawing
+        """
+        return [self.keys[index] for index in self.sample_indices(size).tolist()]
+
+    def sample_indices(self, size):
+        """
+        Draws up to `size` values like sample, but returns the positions of the selected keys.
+
+        :param size: Number of values to draw
+        :return: int64 array with the selected positions in the order of drawing
+        """
+        counts = np.maximum(self.counts, 0)
+        total = int(counts.sum())
+        size = min(size, total)
+        if size <= 0:
+            return np.array([], dtype=np.int64)
+
+        # One firing per remaining count: cumulative exponential arrivals within every value, scaled by its rate
+        items = np.repeat(np.arange(len(counts)), counts)
+        arrivals = np.cumsum(self.rng.standard_exponential(size=total))
+        value_starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        offsets = np.concatenate(([0.0], arrivals))[value_starts]
+        with np.errstate(divide="ignore"):
+            times = (arrivals - offsets[items]) / self.weights[items]
+
+        # The earliest firings, in the order in which they occur
+        selected = np.argpartition(times, size - 1)[:size] if size < total else np.arange(total)
+        drawn = items[selected[np.argsort(times[selected], kind="stable")]].astype(np.int64)
+
+        self.counts -= np.bincount(drawn, minlength=len(self.keys))
+        return drawn
+
+    def remaining_counters(self):
+        """
+        :return: Dictionary {key: count} of the values whose counter is still positive
+        """
+        return {key: int(count) for key, count in zip(self.keys, self.counts) if count > 0}
@@ -0,0 +1,170 @@
+import re
+from collections import defaultdict
+from functools import lru_cache
+
+# Paths of the form ".//a/b/c": a descendant "a" with the child chain "b/c" (the form used in the configurations)
+DESCENDANT_CHAIN = re.compile(r"^\.//[A-Za-z_][\w.-]*(/[A-Za-z_][\w.-]*)*$")
+
+
+@lru_cache(maxsize=None)
+def compile_path(path):
+    """
+    Compiles a configured path once into a tag matcher.
+
+    :param path: ElementPath string (e.g. ".//location/item/location/display")
+    :return: Tuple with the tags of the chain, or None if the path uses other syntax (then findall is used)
+    """
+    if not DESCENDANT_CHAIN.match(path):
+        return None
+    return tuple(path[3:].split("/"))
+
+
+def collect_configured_paths(attributes):
+    """
+    Collects all element paths of a configuration section (Algorithm 1, Algorithm 2 or deletion).
+
+    :param attributes: Attributes of a resource ({attribute: settings}) or a deletion configuration
+    :return: List of unique paths
+    """
+    paths = []
+    if "record_paths" in attributes:
+        for record_path in attributes["record_paths"]:
+            # The deletion searches the parent nodes of the configured path
+            paths.append(record_path["path"].rsplit("/", 1)[0])
+        return list(dict.fromkeys(paths))
+
+    for settings in attributes.values():
+        if "path" in settings:
+            paths.append(settings["path"])
+        paths.extend(settings.get("paths", []))
+    return list(dict.fromkeys(paths))
+
+
+@lru_cache(maxsize=None)
+def compile_index_plan(paths, relative_paths):
+    """
+    Compiles the paths of a configuration once into the traversal plan of build_path_index.
+
+    :param paths: Tuple of paths
+    :param relative_paths: Tuple of (anchor path, tuple of relative paths)
+    :return: Tuple (compiled paths, {head tag: [(path, child chain)]}, keys of the relative lookups)
+    """
+    compiled_paths = []
+    chains = defaultdict(list)
+    for path in paths + tuple(anchor for anchor, _ in relative_paths):
+        steps = compile_path(path)
+        if steps is not None and path not in compiled_paths:
+            compiled_paths.append(path)
+            chains[steps[0]].append((path, steps[1:]))
+
+    relative_keys = [
+        (anchor_path, relative_path)
+        for anchor_path, anchor_relative_paths in relative_paths if anchor_path in compiled_paths
+        for relative_path in anchor_relative_paths
+    ]
+    return compiled_paths, dict(chains), list(dict.fromkeys(relative_keys))
+
+
+def build_path_index(root, paths, relative_paths=None):
+    """
+    Groups the elements of all compiled paths below an element. Paths that start with the same tag share
+    one traversal (Element.iter over that tag), the child chains are matched below every hit. Elements are
+    listed in the same order as findall returns them.
+
+    Relative lookups below matched elements (e.g. item.find(".//url") for every ".//extension/item") are
+    shared by all attributes on the same anchor path: for every anchor path in relative_paths, the first
+    match of each relative path is cached per anchor element under the key (anchor path, relative path)
+    and resolved on first use by find_first.
+
+    :param root: XML element (root of the tree or a single record)
+    :param paths: Iterable of paths
+    :param relative_paths: Optional dictionary {anchor path: list of paths relative to the anchor elements}
+    :return: Dictionary {path: list of elements, (anchor path, relative path): {anchor element: first match}}
+             (paths that cannot be compiled are not included)
+    """
+    relative_paths = tuple((anchor, tuple(relative)) for anchor, relative in (relative_paths or {}).items())
+    compiled_paths, chains, relative_keys = compile_index_plan(tuple(paths), relative_paths)
+
+    index = {path: [] for path in compiled_paths}
+    for key in relative_keys:
+        index[key] = {}
+
+    for head, head_chains in chains.items():
+        for element in root.iter(head):
+            if element is root:
+                continue
+            for path, rest in head_chains:
+                index[path].extend(match_child_chain(element, rest))
+
+    return index
+
+
+@lru_cache(maxsize=None)
+def compile_combination(paths):
+    """
+    Splits the paths of a combination into their common anchor path and the child chains below the anchor
+    (e.g. ".//address/item/city" and ".//address/item/state" into ".//address/item" with "city" and "state").
+
+    :param paths: Tuple of paths
+    :return: Tuple (anchor path, tuple of child chains), or None if the paths share no common anchor
+    """
+    steps = [compile_path(path) for path in paths]
+    if not steps or any(path_steps is None for path_steps in steps):
+        return None
+
+    prefix = []
+    for tags in zip(*steps):
+        if len(set(tags)) != 1:
+            break
+        prefix.append(tags[0])
+    # Every path keeps at least one step below the anchor
+    prefix = prefix[:min(len(path_steps) for path_steps in steps) - 1]
+    if not prefix:
+        return None
+    return ".//" + "/".join(prefix), tuple(path_steps[len(prefix):] for path_steps in steps)
+
+
+def match_child_chain(element, chain):
+    """
+    Follows a chain of child tags below an element.
+
+    :param element: XML element
+    :param chain: Tuple of tags
+    :return: List of the matched elements in document order
+    """
+    matches = [element]
+    for tag in chain:
+        matches = [child for match in matches for child in match if child.tag == tag]
+    return matches
+
+
+def find_all(root, path, index=None):
+    """
+    Looks up the elements of a path in a path index and falls back to findall.
+
+    :param root: XML element
+    :param path: ElementPath string
+    :param index: Optional index from build_path_index for the same element
+    :return: List of elements
+    """
+    if index is not None and path in index:
+        return index[path]
+    return root.findall(path)
+
+
+def find_first(element, path, index=None, anchor_path=None):
+    """
+    Looks up the first element of a path below an anchor element, cached in a path index, and falls back to find.
+
+    :param element: Anchor element (matched by anchor_path)
+    :param path: ElementPath string relative to the anchor element
+    :param index: Optional index from build_path_index with relative lookups for anchor_path
+    :param anchor_path: Path by which the anchor element was found
+    :return: Element or None
+    """
+    if index is None or (anchor_path, path) not in index:
+        return element.find(path)
+    cache = index[(anchor_path, path)]
+    if element not in cache:
+        cache[element] = element.find(path)
+    return cache[element]
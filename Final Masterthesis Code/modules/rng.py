@@ -0,0 +1,63 @@
+import os
+import zlib
+import numpy as np
+
+# Unseeded generator of the current process, recreated after a fork so workers never share a stream
+default_rng_state = {"pid": None, "rng": None}
+
+
+def create_seed_sequence(seed=None):
+    """
+    Creates the root seed sequence of a run. Without a seed, fresh entropy is used; its value is available
+    as seed_sequence.entropy so the run can be repeated.
+
+    :param seed: Integer seed (or None)
+    :return: numpy.random.SeedSequence
+    """
+    return np.random.SeedSequence(seed)
+
+
+def spawn_seed_sequence(seed_sequence, *names):
+    """
+    Spawns the child seed sequence of a work unit (e.g. a worker, file or attribute).
+
+    Like SeedSequence.spawn, the child extends the spawn key of the parent, but it is identified by its names
+    instead of the spawn order. A unit therefore receives the same independent stream no matter in which
+    order or in which process the units are executed.
+
+    :param seed_sequence: Parent numpy.random.SeedSequence
+    :param names: Names that identify the unit (e.g. filename, attribute)
+    :return: numpy.random.SeedSequence
+    """
+    spawn_key = tuple(zlib.crc32(str(name).encode("utf-8")) for name in names)
+    return np.random.SeedSequence(
+        seed_sequence.entropy, spawn_key=seed_sequence.spawn_key + spawn_key, pool_size=seed_sequence.pool_size
+    )
+
+
+def create_rng(seed_sequence=None, *names):
+    """
+    Creates the random generator of a work unit.
+
+    :param seed_sequence: Root numpy.random.SeedSequence of the run (None gives an unseeded generator)
+    :param names: Names that identify the unit (see spawn_seed_sequence)
+    :return: numpy.random.Generator
+    """
+    if seed_sequence is None:
+        return get_rng()
+    return np.random.default_rng(spawn_seed_sequence(seed_sequence, *names))
+
+
+def get_rng(rng=None):
+    """
+    Returns the given generator or the unseeded generator of the current process (default of the mechanisms).
+
+    :param rng: numpy.random.Generator or None
+    :return: numpy.random.Generator
+    """
+    if rng is not None:
+        return rng
+    if default_rng_state["pid"] != os.getpid():
+        default_rng_state["pid"] = os.getpid()
+        default_rng_state["rng"] = np.random.default_rng()
+    return default_rng_state["rng"]
@@ -22,3 +22,88 @@ def calculate_tvd(original_counts, anonymized_counts):
     # Calculate the Total Variation Distance
     tvd = 0.5 * np.sum(np.abs(original_probs - anonymized_probs))
     return tvd
+
+
+def calculate_tvd_from_arrays(original_counts, anonymized_counts):
+    """
+    Calculates the Total Variation Distance (TVD) between two distributions given as count arrays over the
+    same (dictionary-encoded) values.
+
+    :param original_counts: NumPy array with the original frequencies of the values.
+    :param anonymized_counts: NumPy array with the anonymized frequencies of the values (same length).
+    :return: TVD value (float), which indicates the deviation between the two distributions.
+    """
+    original_total = original_counts.sum()
+    anonymized_total = anonymized_counts.sum()
+    original_probs = original_counts / original_total if original_total > 0 else original_counts
+    anonymized_probs = anonymized_counts / anonymized_total if anonymized_total > 0 else anonymized_counts
+    return float(0.5 * np.sum(np.abs(original_probs - anonymized_probs)))
+
+
+class HistogramAccumulator:
+    """
+    Running histogram of the anonymized values of one attribute over dictionary-encoded values (see
+    CategoricalDomain), compared against a reference histogram of the original values.
+
+    The anonymized counts are updated as values are assigned (add / remove / replace), so the TVD is
+    available in O(categories) right after sampling without counting the whole assignment again.
+    """
+
+    def __init__(self, reference_counts, codes=None):
+        """
+        :param reference_counts: NumPy array with the original frequency of every code
+        :param codes: Optional array with the codes that are initially assigned
+        """
+        self.reference_counts = np.asarray(reference_counts)
+        self.counts = np.zeros(len(self.reference_counts), dtype=np.int64)
+        if codes is not None:
+            self.add(codes)
+
+    def set_reference(self, reference_counts):
+        """
+        Replaces the reference histogram (e.g. after a dummy value was added). New codes start with count 0.
+        """
+        self.reference_counts = np.asarray(reference_counts)
+        self.resize(len(self.reference_counts))
+
+    def resize(self, size):
+        """
+        Extends the histogram to `size` codes.
+        """
+        if size > len(self.counts):
+            self.counts = np.pad(self.counts, (0, size - len(self.counts)))
+
+    def add(self, codes):
+        """
+        Counts assigned codes.
+        """
+        self.counts += np.bincount(codes, minlength=len(self.counts))[:len(self.counts)]
+
+    def remove(self, codes):
+        """
+        Removes codes that are no longer assigned.
+        """
+        self.counts -= np.bincount(codes, minlength=len(self.counts))[:len(self.counts)]
+
+    def replace(self, old_codes, new_codes):
+        """
+        Updates the histogram when the slots with old_codes receive new_codes.
+        """
+        self.remove(old_codes)
+        self.add(new_codes)
+
+    def probabilities(self):
+        """
+        :return: Tuple (reference probabilities, anonymized probabilities) for further distance metrics
+        """
+        reference_total = self.reference_counts.sum()
+        anonymized_total = self.counts.sum()
+        reference_probs = self.reference_counts / reference_total if reference_total > 0 else self.reference_counts
+        anonymized_probs = self.counts / anonymized_total if anonymized_total > 0 else self.counts
+        return reference_probs, anonymized_probs
+
+    def tvd(self):
+        """
+        :return: TVD between the reference and the anonymized histogram (float)
+        """
+        return calculate_tvd_from_arrays(self.reference_counts, self.counts)
@@ -0,0 +1,9 @@
+def order_units_by_weight(units):
+    """
+    Orders work units for a process pool: heaviest units first (longest processing time first),
+    so that the large files are started early and do not set the wall-clock time on their own.
+
+    :param units: List of work units, each a dictionary with a 'weight'
+    :return: List of work units sorted by descending weight
+    """
+    return sorted(units, key=lambda unit: unit["weight"], reverse=True)
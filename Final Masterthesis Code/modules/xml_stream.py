@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+
+
+def iter_records(file_path, record_tag="record", iterparse=ET.iterparse):
+    """
+    Yields the <record> elements of an XML file one at a time (streaming with iterparse).
+    After the consumer has processed a record it is removed from the tree, so the memory
+    usage stays flat independent of the file size.
+
+    :param file_path: Path to the XML file
+    :param record_tag: Tag of the record elements (direct children of the root)
+    :param iterparse: iterparse implementation, e.g. lxml.etree.iterparse for lxml elements (getparent)
+    :return: Generator over the record elements
+    """
+    depth = 0
+    root = None
+
+    for event, element in iterparse(file_path, events=("start", "end")):
+        if event == "start":
+            depth += 1
+            if root is None:
+                root = element
+            continue
+
+        depth -= 1
+        if depth == 1:
+            if element.tag == record_tag:
+                yield element
+            root.remove(element)
+
+
+def stream_records(input_path, output_path, transform, record_tag="record"):
+    """
+    Reads an XML file record by record, lets a stage transform each record in place and writes
+    it incrementally to the output. Input and output may be the same file: the output is written
+    to a temporary file in the target folder and moved into place at the end.
+
+    :param input_path: Path to the input XML file
+    :param output_path: Path to the output XML file
+    :param transform: Function that receives a record element and modifies it in place
+    :param record_tag: Tag of the record elements (direct children of the root)
+    :return: Number of records processed
+    """
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    os.makedirs(output_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(suffix=".xml", dir=output_dir)
+
+    records_processed = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as output:
+            output.write("<?xml version='1.0' encoding='utf-8'?>\n")
+
+            depth = 0
+            root = None
+            opened = False
+            pending = None  # The tail of an element is only known once the next element starts
+
+            for event, element in ET.iterparse(input_path, events=("start", "end")):
+                if event == "start":
+                    depth += 1
+                    if root is None:
+                        root = element
+                    continue
+
+                depth -= 1
+                if depth != 1:
+                    continue
+
+                if not opened:
+                    output.write(format_start_tag(root) + escape(root.text or ""))
+                    opened = True
+                if pending is not None:
+                    output.write(ET.tostring(pending, encoding="unicode"))
+
+                if element.tag == record_tag:
+                    transform(element)
+                    records_processed += 1
+                pending = element
+                root.remove(element)
+
+            if root is not None:
+                if not opened:
+                    output.write(format_start_tag(root) + escape(root.text or ""))
+                if pending is not None:
+                    output.write(ET.tostring(pending, encoding="unicode"))
+                output.write(f"</{root.tag}>")
+
+        # mkstemp creates the file with mode 0600, keep the permissions of a regular output file
+        if os.path.exists(output_path):
+            shutil.copymode(output_path, temp_path)
+        else:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, output_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return records_processed
+
+
+def format_start_tag(element):
+    """
+    Serializes the opening tag of an element including its attributes (used for the root element).
+    """
+    attributes = "".join(f" {key}={quoteattr(value)}" for key, value in element.attrib.items())
+    return f"<{element.tag}{attributes}>"
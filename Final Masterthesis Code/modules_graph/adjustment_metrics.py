@@ -18,7 +18,7 @@ from graph_metrics import (
 
 import uuid
 from dummy_generator import create_dummy_node_xml
-from numpy.random import choice
+from modules.rng import get_rng
 
 
 from config.graph_config import graph_config
@@ -26,9 +26,14 @@ from config.graph_config import graph_config
 from config.graph_metric_config import GRAPH_METRIC_CONFIG
 
 from modules_graph.graph_metrics import calculate_degree_distribution, calculate_degree_centrality, calculate_clustering_coefficient
+from modules_graph.metrics_tracker import GraphMetricsTracker
+from modules_graph.connection_rules import ConnectionRules
+from modules_graph.record_store import add_pending_reference, has_record
 
-from lxml.etree import fromstring, tostring, SubElement
+from lxml.etree import SubElement
 
+# graph_config compiled once: validity checks are array lookups instead of walks over the configuration
+connection_rules = ConnectionRules(graph_config)
 
 
 
@@ -56,16 +61,8 @@ def decide_dummy_node_connection(graph, target_node_id):
         print(f"Target node {target_node_id} has no 'resourceType'.")
         return None
 
-    # Find possible connections for this resource type
-    possible_resource_types = set()
-
-    if target_node_type in graph_config:
-        possible_resource_types.update(graph_config[target_node_type].keys())
-
-    # Also search for reverse connections
-    for resource_type, connections in graph_config.items():
-        if target_node_type in connections:
-            possible_resource_types.add(resource_type)
+    # Find possible connections for this resource type (including the reverse connections)
+    possible_resource_types = connection_rules.connection_types(target_node_type)
 
     # If no valid connections are available
     if not possible_resource_types:
@@ -73,21 +70,16 @@ def decide_dummy_node_connection(graph, target_node_id):
         return None
 
     # Select a permitted resource type
-    for resource_type in possible_resource_types:
-        if (
-            (target_node_type in graph_config and resource_type in graph_config[target_node_type])
-            or (resource_type in graph_config and target_node_type in graph_config[resource_type])
-        ):
-            print(f"Valid connection found: {resource_type} -> {target_node_type}")
-            return resource_type, target_node_id
-
-    print(f"No permitted connection for resource type {target_node_type} found.")
-    return None
+    resource_type = possible_resource_types[0]
+    print(f"Valid connection found: {resource_type} -> {target_node_type}")
+    return resource_type, target_node_id
 
 def add_reference_tag(graph, node1_id, node2_id):
     """
     Adds a reference tag to the node based on `graph_config`.
     The key in `graph_config` always determines where the reference tag is saved.
+    The reference is only recorded in the compact reference list of the node; the XML record is
+    updated once in the final streaming write (see main_graph.save_records_by_resource_type).
 
     Args:
         graph (nx.Graph): The graph with the nodes and resources.
@@ -108,9 +100,9 @@ def add_reference_tag(graph, node1_id, node2_id):
         return
 
     # Check whether node1 is the key in `graph_config` (i.e. the reference goes to node1)
-    if node1_type in graph_config and node2_type in graph_config[node1_type]:
+    if connection_rules.stores_reference(node1_type, node2_type):
         target_node_id, source_node_id = node1_id, node2_id
-    elif node2_type in graph_config and node1_type in graph_config[node2_type]:
+    elif connection_rules.stores_reference(node2_type, node1_type):
         print(f"direction in `graph_config` prohibits saving in {node2_type}. "
               f"Storage only in {node1_type} possible.")
         return
@@ -118,67 +110,48 @@ def add_reference_tag(graph, node1_id, node2_id):
         print(f"No valid relationship found in `graph_config`: {node1_type} <-> {node2_type}.")
         return
 
-    # Get XML data of the target node
+    # Record the reference for the XML record of the target node
     reference_text = f"{graph.nodes[source_node_id]['resourceType']}/{source_node_id}"
-    reference_tag = graph.nodes.get(target_node_id, {}).get("full_record")
+    target_node_data = graph.nodes[target_node_id]
 
-    if not reference_tag:
-        print(f"Error: Node {target_node_id} has no `full_record`-XML-data.")
+    if not has_record(target_node_data):
+        print(f"Error: Node {target_node_id} has no XML record.")
         return
 
-    try:
-        # Parse XML structure
-        root = fromstring(reference_tag)
-
-        # Check whether the reference already exists
-        existing_references = [ref.text for ref in root.findall(".//reference")]
-        if reference_text in existing_references:
-            print(f"Reference {reference_text} already exists in {target_node_id}.")
-            return
-
-        # Add new reference tag
-        new_reference_tag = SubElement(root, "reference")
-        new_reference_tag.text = reference_text
-
-        # Save updated XML structure
-        graph.nodes[target_node_id]["full_record"] = tostring(root, encoding="unicode", method="xml")
-        print(f"Reference added: {reference_text} in target resource {graph.nodes[target_node_id]['resourceType']}.")
+    if not add_pending_reference(target_node_data, reference_text):
+        print(f"Reference {reference_text} already exists in {target_node_id}.")
+        return
 
-    except Exception as e:
-        print(f"Error when adding the reference tag to {target_node_id}: {e}")
+    print(f"Reference added: {reference_text} in target resource {target_node_data['resourceType']}.")
 
 
 
-def add_dummy_nodes(graph, xml_root, target_node_id, num_dummy_nodes):
+def add_dummy_nodes(graph, xml_root, target_node_id, num_dummy_nodes, rng=None):
+    rng = get_rng(rng)
     if not graph.has_node(target_node_id):
         print(f"target node {target_node_id} does not exist. Skip.")
         return
 
     target_resource_type = graph.nodes[target_node_id]["resourceType"]
-    possible_resource_types = set()
-
-    if target_resource_type in graph_config:
-        possible_resource_types.update(graph_config[target_resource_type].keys())
-
-    for resource_type, connections in graph_config.items():
-        if target_resource_type in connections:
-            possible_resource_types.add(resource_type)
-
-    possible_resource_types.discard("Patient")
+    possible_resource_types = [
+        resource_type for resource_type in connection_rules.connection_types(target_resource_type)
+        if resource_type != "Patient"
+    ]
 
     if not possible_resource_types:
         print(f"No valid connections for resource type {target_resource_type}.")
         return
 
     for _ in range(num_dummy_nodes):
-        dummy_resource_type = np.random.choice(list(possible_resource_types))
-        dummy_node_id = str(uuid.uuid4())
+        dummy_resource_type = rng.choice(possible_resource_types)
+        dummy_node_id = str(uuid.UUID(bytes=rng.bytes(16), version=4))
         dummy_node_xml = create_dummy_node_xml(
             resource_type=dummy_resource_type,
             dummy_node_id=dummy_node_id,
         )
 
         graph.add_node(dummy_node_id, resourceType=dummy_resource_type, full_record=dummy_node_xml)
+        connection_rules.set_node_type(graph, dummy_node_id)
         if is_valid_connection(graph, dummy_node_id, target_node_id):
             graph.add_edge(dummy_node_id, target_node_id)
             add_reference_tag(graph, dummy_node_id, target_node_id)
@@ -195,8 +168,8 @@ def add_dummy_nodes(graph, xml_root, target_node_id, num_dummy_nodes):
 
 def is_valid_connection(graph, source, target):
     """
-    Checks whether a connection between two nodes based on graph_config is permitted.
-    Measures the execution time for the check.
+    Checks whether a connection between two nodes based on graph_config is permitted
+    (a lookup of the stored type IDs in the compiled connection rules).
 
     Args:
         graph (nx.Graph): The graph.
@@ -206,20 +179,7 @@ def is_valid_connection(graph, source, target):
     Returns:
         bool: True, if the connection is allowed, otherwise False.
     """
-
-
-    source_type = graph.nodes[source]["resourceType"]
-    target_type = graph.nodes[target]["resourceType"]
-
-    
-    valid = (
-        (source_type in graph_config and target_type in graph_config[source_type]) or
-        (target_type in graph_config and source_type in graph_config[target_type])
-    )
-
-
-
-    return valid
+    return connection_rules.is_allowed_between(graph, source, target)
 
 
 
@@ -240,7 +200,7 @@ def add_edge_to_xml(xml_root, source_type, target_type, target_id):
         bool: True if the edge was successfully added, otherwise False.
     """
     # Check whether the connection is allowed in the graph_config
-    if source_type not in graph_config or target_type not in graph_config[source_type]:
+    if not connection_rules.stores_reference(source_type, target_type):
         print(f"Connection between {source_type} and {target_type} not allowed.")
         return False
 
@@ -296,7 +256,8 @@ def remove_edge_from_xml(xml_root, target_type, target_id):
     return False
 
 
-def remove_nodes(graph, xml_root, nodes_to_remove):
+def remove_nodes(graph, xml_root, nodes_to_remove, rng=None):
+    rng = get_rng(rng)
     nodes = list(graph.nodes)
     removed_nodes = []
 
@@ -305,7 +266,7 @@ def remove_nodes(graph, xml_root, nodes_to_remove):
             print("No further nodes available for removal.")
             break
 
-        node_to_remove = choice(nodes)
+        node_to_remove = rng.choice(nodes)
         if graph.has_node(node_to_remove):
             graph.remove_node(node_to_remove)
             nodes.remove(node_to_remove)
@@ -429,7 +390,7 @@ def calculate_average_degree(degree_distribution):
     total_nodes = sum(degree_distribution.values())
     return total_degree / total_nodes if total_nodes > 0 else 0
 
-def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity):
+def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity, rng=None):
     """
     Adjusts the graph iteratively to achieve the target metrics.
 
@@ -438,6 +399,7 @@ def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity):
         xml_root (xml.ElementTree.Element): The XML root of the graph.
         epsilon (float): Privacy parameter.
         sensitivity (float): Sensitivity of the metrics.
+        rng (np.random.Generator, optional): Random generator of the run (see modules.rng).
 
     Returns:
         nx.graph: The customized graph.
@@ -452,6 +414,11 @@ def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity):
     for metric, value in initial_metrics.items():
         print(f"{metric}: {value:.4f}")
 
+    # Store the type IDs of the loaded nodes once, the validity checks then skip the resourceType lookup
+    connection_rules.set_node_types(graph)
+
+    # The adjusters read the current metrics from the tracker instead of recalculating them after every batch
+    metrics_tracker = GraphMetricsTracker(graph, lambda u, v: is_valid_connection(graph, u, v)).attach()
 
     while True:
         print(f"\n--- Iteration {iteration + 1} ---")
@@ -471,21 +438,27 @@ def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity):
                 graph,
                 xml_root,
                 GRAPH_METRIC_CONFIG["degree_distribution"]["target_value"],
-                current_metrics["degree_distribution"]
+                current_metrics["degree_distribution"],
+                rng,
+                metrics_tracker
             )
         elif metric_to_adjust == "clustering_coefficient":
             current_metrics["clustering_coefficient"] = adjust_clustering_coefficient(
                 graph,
                 xml_root,
                 GRAPH_METRIC_CONFIG["clustering_coefficient"]["target_value"],
-                current_metrics["clustering_coefficient"]
+                current_metrics["clustering_coefficient"],
+                rng,
+                metrics_tracker
             )
         elif metric_to_adjust == "degree_centrality":
             current_metrics["degree_centrality"] = adjust_degree_centrality(
                 graph,
                 xml_root,
                 GRAPH_METRIC_CONFIG["degree_centrality"]["target_value"],
-                current_metrics["degree_centrality"]
+                current_metrics["degree_centrality"],
+                rng,
+                metrics_tracker
             )
 
 
@@ -500,6 +473,7 @@ def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity):
 
         iteration += 1
 
+    metrics_tracker.detach()
     final_metrics = calculate_graph_metrics(graph)
 
     print("\nVergleich der Metriken (Initial vs. Final):")
@@ -515,7 +489,7 @@ def adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity):
 
 
 
-def adjust_degree_distribution(graph, xml_root, target_value, current_value):
+def adjust_degree_distribution(graph, xml_root, target_value, current_value, rng=None, metrics_tracker=None):
     """
     Adjusts the degree distribution by removing or adding edges at higher or lower degree nodes.
     removed or added. Contains fallback mechanisms for missing edges or nodes.
@@ -525,31 +499,39 @@ def adjust_degree_distribution(graph, xml_root, target_value, current_value):
         xml_root (xml.ElementTree.Element): The XML root of the graph.
         target_value (float): Target value.
         current_value (float): Current value.
+        rng (np.random.Generator, optional): Random generator of the run (see modules.rng).
+        metrics_tracker (GraphMetricsTracker, optional): Attached tracker of the graph. If None, a tracker
+                                                         is attached for the duration of the adjustment.
 
     Returns:
         float: The updated value.
     """
+    if metrics_tracker is None:
+        with GraphMetricsTracker(graph) as metrics_tracker:
+            return adjust_degree_distribution(graph, xml_root, target_value, current_value, rng, metrics_tracker)
+
+    rng = get_rng(rng)
     print(f"Adjustment of the degree distribution: Target value={target_value:.4f}, Current value={current_value:.4f}")
 
     # Identify patient nodes
-    patient_nodes = [node for node, data in graph.nodes(data=True) if data.get("resourceType") == "Patient"]
+    patient_nodes = list(metrics_tracker.patient_nodes)
     total_patient_nodes = len(patient_nodes)
 
     if total_patient_nodes == 0:
         print("No patient nodes found. Dummy nodes are added.")
-        add_dummy_nodes(graph, xml_root, target_node_id=np.random.choice(list(graph.nodes)), num_dummy_nodes=1)
+        add_dummy_nodes(graph, xml_root, target_node_id=rng.choice(list(graph.nodes)), num_dummy_nodes=1, rng=rng)
         return current_value
-    
+
+    # Edge candidates are drawn from the node types that may be connected to patients
+    candidate_types = [
+        resource_type for resource_type in connection_rules.connection_types("Patient") if resource_type != "Patient"
+    ]
 
     def recalculate_metric():
         """
-        Recalculates the degree distribution based on the current graph state.
+        Returns the average degree of the current graph state, maintained by the metrics tracker.
         """
-        degree_distribution = calculate_degree_distribution(graph)
-        total_degree = sum(degree * count for degree, count in degree_distribution.items())
-        total_nodes = sum(degree_distribution.values())
-        avg_degree = total_degree / total_nodes if total_nodes > 0 else 0
-        return avg_degree
+        return metrics_tracker.average_degree()
 
     iteration = 0 
 
@@ -590,23 +572,21 @@ def adjust_degree_distribution(graph, xml_root, target_value, current_value):
             node_weights /= node_weights.sum()
             #print(f"Node Weights (Added): {node_weights}")
             # Select ALL nodes with weighted probability
-            selected_nodes = np.random.choice(low_degree_nodes, size=batch_size, replace=False, p=node_weights)
+            selected_nodes = rng.choice(low_degree_nodes, size=batch_size, replace=False, p=node_weights)
             
             print(f"Degree distribution of the selected nodes: {[degree_values[node] for node in selected_nodes]}")
             print(f"Selected {len(selected_nodes)} Nodes for new edges.")
 
             for node_to_connect in selected_nodes:
-                target_candidates = [node for node in graph.nodes if graph.nodes[node].get("resourceType") != "Patient"]
+                target_nodes = metrics_tracker.sample_nodes(candidate_types, batch_size, rng)
 
-                if not target_candidates:
+                if not target_nodes:
                     print("No target candidates available. Dummy nodes are added.")
-                    add_dummy_nodes(graph, xml_root, target_node_id=node_to_connect, num_dummy_nodes=1)
+                    add_dummy_nodes(graph, xml_root, target_node_id=node_to_connect, num_dummy_nodes=1, rng=rng)
                     continue
 
-                target_nodes = np.random.choice(target_candidates, size=min(batch_size, len(target_candidates)), replace=False)
-
                 for target_node in target_nodes:
-                    if is_valid_connection(graph, node_to_connect, target_node) and not graph.has_edge(node_to_connect, target_node):
+                    if not graph.has_edge(node_to_connect, target_node):
                         graph.add_edge(node_to_connect, target_node)
                         # add_edge_to_xml(
                         #     xml_root,
@@ -640,7 +620,7 @@ def adjust_degree_distribution(graph, xml_root, target_value, current_value):
             #print(f"Node Weights (Added): {node_weights}")
                                                     
             # Weighted selection of nodes
-            selected_nodes = np.random.choice(high_degree_nodes, size=batch_size, replace=False, p=node_weights)
+            selected_nodes = rng.choice(high_degree_nodes, size=batch_size, replace=False, p=node_weights)
 
             print(f"Degree distribution of the selected nodes: {[degree_values[node] for node in selected_nodes]}")
             print(f"Selected {len(selected_nodes)} Nodes for new edges.")
@@ -654,7 +634,7 @@ def adjust_degree_distribution(graph, xml_root, target_value, current_value):
                 target_nodes = []
 
                 if neighbors:
-                    target_nodes = np.random.choice(neighbors, size=min(batch_size, len(neighbors)), replace=False)
+                    target_nodes = rng.choice(neighbors, size=min(batch_size, len(neighbors)), replace=False)
 
                     for target_node in target_nodes:
                         graph.remove_edge(patient_node, target_node)
@@ -682,25 +662,35 @@ def adjust_degree_distribution(graph, xml_root, target_value, current_value):
 
 
 
-def adjust_degree_centrality(graph, xml_root, target_value, current_value):
+def adjust_degree_centrality(graph, xml_root, target_value, current_value, rng=None, metrics_tracker=None):
     """
     Adjusts the degree centrality specifically for patient nodes, with dynamic batch size.
+    The current values are read from the metrics tracker (one is attached if metrics_tracker is None).
     """
+    if metrics_tracker is None:
+        with GraphMetricsTracker(graph) as metrics_tracker:
+            return adjust_degree_centrality(graph, xml_root, target_value, current_value, rng, metrics_tracker)
+
+    rng = get_rng(rng)
     print(f"Adjustment of degree centrality: target value={target_value:.4f}, Current value={current_value:.4f}")
-    patient_nodes = [node for node, data in graph.nodes(data=True) if data.get("resourceType") == "Patient"]
+    patient_nodes = list(metrics_tracker.patient_nodes)
     total_patient_nodes = len(patient_nodes)
 
     if total_patient_nodes == 0:
         print("No patient nodes found. Dummy nodes are added.")
-        add_dummy_nodes(graph, xml_root, target_node_id=np.random.choice(list(graph.nodes)), num_dummy_nodes=1)
+        add_dummy_nodes(graph, xml_root, target_node_id=rng.choice(list(graph.nodes)), num_dummy_nodes=1, rng=rng)
         return current_value
 
+    # Edge candidates are drawn from the node types that may be connected to patients
+    candidate_types = [
+        resource_type for resource_type in connection_rules.connection_types("Patient") if resource_type != "Patient"
+    ]
+
     def recalculate_metric():
         """
-        Recalculates the degree centrality based on the current graph state.
+        Returns the average degree centrality of the current graph state, maintained by the metrics tracker.
         """
-        centrality_values = calculate_degree_centrality(graph)
-        return sum(centrality_values.values()) / len(centrality_values) if centrality_values else 0
+        return metrics_tracker.average_degree_centrality()
 
     iteration = 0
     max_batch_size = 20
@@ -714,7 +704,7 @@ def adjust_degree_centrality(graph, xml_root, target_value, current_value):
 
         current_value = recalculate_metric()
         # Recalculate degree centrality and sort nodes by value
-        centrality_values = calculate_degree_centrality(graph)
+        centrality_values = metrics_tracker.degree_centrality()
         avg_centrality = sum(centrality_values.values()) / len(centrality_values)
 
         # Only sort patient nodes, not all nodes
@@ -735,19 +725,17 @@ def adjust_degree_centrality(graph, xml_root, target_value, current_value):
 
             print(f"Node Weights (Added): {node_weights[:10]} (First 10 of {len(node_weights)})")
 
-            selected_nodes = np.random.choice(low_centrality_nodes, size=batch_size, replace=False, p=node_weights)
+            selected_nodes = rng.choice(low_centrality_nodes, size=batch_size, replace=False, p=node_weights)
 
             for node_to_connect in selected_nodes:
-                target_candidates = [node for node in graph.nodes if graph.nodes[node].get("resourceType") != "Patient"]
-                if not target_candidates:
+                target_nodes = metrics_tracker.sample_nodes(candidate_types, batch_size, rng)
+                if not target_nodes:
                     print("No target candidates available. Dummy nodes are added.")
-                    add_dummy_nodes(graph, target_node_id=node_to_connect, num_dummy_nodes=1)
+                    add_dummy_nodes(graph, xml_root, target_node_id=node_to_connect, num_dummy_nodes=1, rng=rng)
                     continue
 
-                target_nodes = np.random.choice(target_candidates, size=min(batch_size, len(target_candidates)), replace=False)
-                
                 for target_node in target_nodes:
-                    if is_valid_connection(graph, node_to_connect, target_node) and not graph.has_edge(node_to_connect, target_node):
+                    if not graph.has_edge(node_to_connect, target_node):
                         graph.add_edge(node_to_connect, target_node)
                         # add_edge_to_xml(
                         #     xml_root,
@@ -782,7 +770,7 @@ def adjust_degree_centrality(graph, xml_root, target_value, current_value):
 
             print(f"Node Weights (Removed): {node_weights[:10]} (First 10 of {len(node_weights)})")
 
-            selected_nodes = np.random.choice(high_centrality_nodes, size=batch_size, replace=False, p=node_weights)
+            selected_nodes = rng.choice(high_centrality_nodes, size=batch_size, replace=False, p=node_weights)
 
             for node_to_remove in selected_nodes:
                 if graph.degree(node_to_remove) <= avg_centrality:
@@ -793,7 +781,7 @@ def adjust_degree_centrality(graph, xml_root, target_value, current_value):
                     print(f"No neighbors for {node_to_remove}, cannot remove an edge.")
                     continue
 
-                target_nodes = np.random.choice(neighbors, size=min(batch_size, len(neighbors)), replace=False)
+                target_nodes = rng.choice(neighbors, size=min(batch_size, len(neighbors)), replace=False)
 
                 for target_node in target_nodes:
                     graph.remove_edge(node_to_remove, target_node)
@@ -826,7 +814,7 @@ def adjust_degree_centrality(graph, xml_root, target_value, current_value):
 
 
 
-def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
+def adjust_clustering_coefficient(graph, xml_root, target_value, current_value, rng=None, metrics_tracker=None):
     """
     Adjusts the clustering coefficient specifically for patient nodes, with a focus on triangle formation.
 
@@ -835,17 +823,25 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
         xml_root (xml.ElementTree.Element): The XML root of the graph.
         target_value (float): Target value for the clustering coefficient.
         current_value (float): Current value of the clustering coefficient.
+        rng (np.random.Generator, optional): Random generator of the run (see modules.rng).
+        metrics_tracker (GraphMetricsTracker, optional): Attached tracker of the graph. If None, a tracker
+                                                         is attached for the duration of the adjustment.
 
     Returns:
         float: The updated value of the clustering coefficient.
     """
+    if metrics_tracker is None:
+        with GraphMetricsTracker(graph, lambda u, v: is_valid_connection(graph, u, v)) as metrics_tracker:
+            return adjust_clustering_coefficient(graph, xml_root, target_value, current_value, rng, metrics_tracker)
+
+    rng = get_rng(rng)
     print(f"Adjustment of the clustering coefficient: target value={target_value:.4f}, Current Value={current_value:.4f}")
 
     # Identify patient nodes
-    patient_nodes = [node for node, data in graph.nodes(data=True) if data.get("resourceType") == "Patient"]
+    patient_nodes = list(metrics_tracker.patient_nodes)
 
     def recalculate_metric():
-        return calculate_clustering_coefficient(graph)
+        return metrics_tracker.average_clustering()
 
     # Scaling factor for batch size based on very small values
     scale_factor = 1000 if current_value < 0.01 else 100  # Dynamische Skalierung
@@ -865,7 +861,7 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
 
             for _ in range(batch_size):
                 # Choose a patient node at random
-                patient_node = np.random.choice(patient_nodes)
+                patient_node = rng.choice(patient_nodes)
                 neighbors = list(graph.neighbors(patient_node))
 
                 if len(neighbors) < 2:
@@ -873,16 +869,12 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
                     print(f"Patient node {patient_node} has too few neighbors to form a triangle.")
                     continue
 
-                # Find pairs of neighbors who are not yet connected
-                potential_pairs = [
-                    (n1, n2) for i, n1 in enumerate(neighbors)
-                    for n2 in neighbors[i + 1:]
-                    if not graph.has_edge(n1, n2) and is_valid_connection(graph, n1, n2)
-                ]
+                # Draw a pair of neighbors who are not yet connected (and may be connected)
+                potential_pair = metrics_tracker.sample_open_wedge(patient_node, rng)
 
-                if potential_pairs:
+                if potential_pair:
                     # Choose a pair that forms a new triangle
-                    neighbor1, neighbor2 = potential_pairs[0]  # Select the first pair found
+                    neighbor1, neighbor2 = potential_pair
                     graph.add_edge(neighbor1, neighbor2)
                     # add_edge_to_xml(
                     #     xml_root,
@@ -896,7 +888,7 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
                     # Check whether a dummy node makes sense
                     print(f"No matching neighbor pairs found. Check if dummy nodes can be added.")
                     # Add dummy node only if it can connect at least two neighbors
-                    dummy_node_id = add_dummy_nodes(graph, xml_root, target_node_id=patient_node, num_dummy_nodes=1)
+                    dummy_node_id = add_dummy_nodes(graph, xml_root, target_node_id=patient_node, num_dummy_nodes=1, rng=rng)
 
                     if dummy_node_id is None:  
                         print("Error: No dummy node was added.")
@@ -905,22 +897,22 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
                     # dummy_type = graph.nodes[dummy_node_id].get("resourceType", "Dummy")
                     connected_neighbors = []
 
-                    for other_neighbor in neighbors:
-                        if is_valid_connection(graph, dummy_node_id, other_neighbor):
-                            graph.add_edge(dummy_node_id, other_neighbor)
-                            # add_edge_to_xml(
-                            #     xml_root,
-                            #     source_type=dummy_type,
-                            #     target_type=graph.nodes[other_neighbor]["resourceType"],
-                            #     target_id=other_neighbor
-                            # )
-                            connected_neighbors.append(other_neighbor)
-                            print(f"Dummy-node {dummy_node_id} connected with {other_neighbor}.")
-
-                            # Stop when the dummy knot forms a triangle
-                            if len(connected_neighbors) >= 2:
-                                print(f"Dummy-node {dummy_node_id} forms a triangle with {connected_neighbors}.")
-                                break
+                    # Check all neighbors against the connection rules at once
+                    for other_neighbor in connection_rules.connectable_nodes(graph, dummy_node_id, neighbors):
+                        graph.add_edge(dummy_node_id, other_neighbor)
+                        # add_edge_to_xml(
+                        #     xml_root,
+                        #     source_type=dummy_type,
+                        #     target_type=graph.nodes[other_neighbor]["resourceType"],
+                        #     target_id=other_neighbor
+                        # )
+                        connected_neighbors.append(other_neighbor)
+                        print(f"Dummy-node {dummy_node_id} connected with {other_neighbor}.")
+
+                        # Stop when the dummy knot forms a triangle
+                        if len(connected_neighbors) >= 2:
+                            print(f"Dummy-node {dummy_node_id} forms a triangle with {connected_neighbors}.")
+                            break
                     else:
                         # Remove the dummy node if it does not form a triangle
                         print(f"Dummy-node {dummy_node_id} has not formed a triangle and is removed.")
@@ -938,26 +930,20 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
                     print("No more patients in the graph. Adjustment completed.")
                     break
             
-                patient_node = np.random.choice(patient_nodes)
+                patient_node = rng.choice(patient_nodes)
                 if not graph.has_node(patient_node):  
                     patient_nodes.remove(patient_node)
                     continue
 
-                neighbors = list(graph.neighbors(patient_node))
-
-                # Search specifically for edges that close triangles
-                potential_edges = [
-                    (n1, n2) for n1 in neighbors for n2 in neighbors
-                    if n1 != n2 and graph.has_edge(n1, n2) and n2 in graph.neighbors(n1)
-                ]
+                # Draw an edge that closes a triangle with the patient node
+                edge_to_remove = metrics_tracker.sample_triangle_edge(patient_node, rng)
 
-                if not potential_edges:
+                if not edge_to_remove:
                     print("No more edges to remove. Adjustment finished.")
                     break 
 
-                if potential_edges:
+                if edge_to_remove:
                     # Select an edge that dissolves an existing triangle
-                    edge_to_remove = potential_edges[np.random.randint(len(potential_edges))]
                     # Check whether the node still has edges
                     if graph.degree(edge_to_remove[0]) > 0 and graph.degree(edge_to_remove[1]) > 0:
                         graph.remove_edge(*edge_to_remove)                    
@@ -971,7 +957,7 @@ def adjust_clustering_coefficient(graph, xml_root, target_value, current_value):
                     else:
                         # Remove dummy nodes if no suitable edge exists
                         print(f"No edges found. Dummy nodes are removed.")
-                        remove_nodes(graph, xml_root, nodes_to_remove=1)
+                        remove_nodes(graph, xml_root, nodes_to_remove=1, rng=rng)
 
             # Update the metric
             current_value = recalculate_metric()
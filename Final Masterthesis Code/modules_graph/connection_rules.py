@@ -0,0 +1,140 @@
+import numpy as np
+
+
+class ConnectionRules:
+    """
+    graph_config compiled into a rule table.
+
+    Every resource type receives an integer ID. The permitted reference directions are kept as a boolean
+    matrix (references[key_type, referenced_type] is True if graph_config[key_type] contains referenced_type,
+    i.e. the reference tag is stored in the record of key_type), the permitted connections in either direction
+    as its symmetric closure. The matrices are only used to filter candidate batches in one array lookup;
+    single checks use frozensets of the permitted type pairs and nested lists over the type IDs, which are
+    cheaper than indexing a NumPy array with scalars. The neighbor types of every type (including the reverse
+    connections) are precomputed. Unknown types (and nodes without resourceType) map to an extra ID without
+    any connection.
+
+    The type ID of a node is stored as its "type_id" attribute when the node is added (see set_node_type),
+    so a validity check does not map the resourceType string again.
+    """
+
+    def __init__(self, config):
+        """
+        Args:
+            config (dict): The graph configuration (graph_config).
+        """
+        self.resource_types = sorted(set(config) | {
+            resource_type for connections in config.values() for resource_type in connections
+        })
+        self.type_ids = {resource_type: type_id for type_id, resource_type in enumerate(self.resource_types)}
+        self.unknown_type_id = len(self.resource_types)
+
+        self.references = np.zeros((self.unknown_type_id + 1, self.unknown_type_id + 1), dtype=bool)
+        for key_type, connections in config.items():
+            for referenced_type in connections:
+                self.references[self.type_ids[key_type], self.type_ids[referenced_type]] = True
+        self.allowed = self.references | self.references.T
+
+        self.reference_pairs = frozenset(
+            (key_type, referenced_type) for key_type, connections in config.items() for referenced_type in connections
+        )
+        self.allowed_pairs = self.reference_pairs | {(target, source) for source, target in self.reference_pairs}
+        self.allowed_by_id = self.allowed.tolist()
+
+        self.neighbor_types = {
+            resource_type: [self.resource_types[type_id] for type_id in np.flatnonzero(self.allowed[type_id]).tolist()]
+            for resource_type, type_id in self.type_ids.items()
+        }
+
+    def type_id(self, resource_type):
+        return self.type_ids.get(resource_type, self.unknown_type_id)
+
+    def set_node_type(self, graph, node):
+        """
+        Stores the type ID of a node as its "type_id" attribute (call it whenever a node is added or its
+        resourceType changes).
+
+        Returns:
+            int: The type ID.
+        """
+        node_data = graph.nodes[node]
+        type_id = node_data["type_id"] = self.type_id(node_data.get("resourceType"))
+        return type_id
+
+    def set_node_types(self, graph):
+        """
+        Stores the type IDs of all nodes of a graph (e.g. after loading it from GraphML). Existing IDs are
+        overwritten, they may stem from a different graph_config.
+        """
+        type_ids, unknown_type_id = self.type_ids, self.unknown_type_id
+        for _, node_data in graph.nodes(data=True):
+            node_data["type_id"] = type_ids.get(node_data.get("resourceType"), unknown_type_id)
+
+    def node_type_id(self, graph, node):
+        """
+        Returns:
+            int: The stored type ID of a node (it is stored first if the node has none yet).
+        """
+        type_id = graph.nodes[node].get("type_id")
+        return self.set_node_type(graph, node) if type_id is None else type_id
+
+    def node_type_ids(self, graph, nodes):
+        """
+        Args:
+            graph (nx.Graph): The graph.
+            nodes (iterable): Node IDs.
+
+        Returns:
+            np.ndarray: The type IDs of the nodes (side array for vectorized checks).
+        """
+        return np.array([self.node_type_id(graph, node) for node in nodes], dtype=np.intp)
+
+    def is_allowed(self, source_type, target_type):
+        """
+        Returns:
+            bool: True if graph_config permits a connection between the two resource types (in either direction).
+        """
+        return (source_type, target_type) in self.allowed_pairs
+
+    def is_allowed_between(self, graph, source, target):
+        """
+        Returns:
+            bool: True if graph_config permits a connection between the two nodes (lookup of their stored type IDs).
+        """
+        node_data = graph.nodes
+        try:
+            return self.allowed_by_id[node_data[source]["type_id"]][node_data[target]["type_id"]]
+        except KeyError:
+            # At least one node was added without storing its type ID
+            return self.allowed_by_id[self.node_type_id(graph, source)][self.node_type_id(graph, target)]
+
+    def stores_reference(self, key_type, referenced_type):
+        """
+        Returns:
+            bool: True if graph_config[key_type] contains referenced_type.
+        """
+        return (key_type, referenced_type) in self.reference_pairs
+
+    def connection_types(self, resource_type):
+        """
+        Returns:
+            list: The sorted resource types that may be connected to resource_type (both directions).
+        """
+        return self.neighbor_types.get(resource_type, [])
+
+    def connectable_nodes(self, graph, node, candidates):
+        """
+        Filters candidate nodes by the permitted connections to a node in one array lookup.
+
+        Args:
+            graph (nx.Graph): The graph.
+            node (str): ID of the node.
+            candidates (list): IDs of the candidate nodes.
+
+        Returns:
+            list: The candidates that may be connected to the node (in their original order).
+        """
+        if not candidates:
+            return []
+        mask = self.allowed[self.node_type_id(graph, node), self.node_type_ids(graph, candidates)]
+        return [candidate for candidate, is_allowed in zip(candidates, mask.tolist()) if is_allowed]
@@ -1,5 +1,3 @@
-import numpy as np
-
 import os
 import sys
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -11,9 +9,10 @@ os.chdir(project_dir)
 from config.graph_metric_config import GRAPH_METRIC_CONFIG
 
 from adjustment_metrics import adjust_graph_to_target_metrics, calculate_graph_metrics, update_metric_config
+from modules.rng import get_rng
 
 
-def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None):
+def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None, rng=None):
     """
     Anonymizes the graph based on differential privacy and target metrics.
 
@@ -26,11 +25,13 @@ def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None
                                      Can be global or specific to each metric.
         original_metrics (dict, optional): Already calculated original metrics of the graph. 
                                         If None, they will be recalculated.
+        rng (np.random.Generator, optional): Random generator of the run (see modules.rng).
 
     Returns:
         tuple: The adjusted graph and the updated noisy target metrics.
     """
     print("Starting to anonymize the graph...")
+    rng = get_rng(rng)
 
     # 1. check or calculate original metrics
     if original_metrics is None:
@@ -59,7 +60,7 @@ def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None
                 # Special treatment for the clustering coefficient
                 scale_factor = 1000  # Scale factor
                 scaled_value = value * scale_factor
-                noise = np.random.laplace(0, metric_sensitivity / metric_epsilon)
+                noise = rng.laplace(0, metric_sensitivity / metric_epsilon)
                 scaled_noised_value = max(0, scaled_value + noise)  # Avoid negative values
                 noised_metrics[metric] = scaled_noised_value / scale_factor
                 print(f"Noisy target for {metric}: {noised_metrics[metric]:.4f} "
@@ -68,7 +69,7 @@ def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None
             elif metric == "degree_centrality":
                 scale = metric_sensitivity / metric_epsilon
                 max_noise = 5
-                noise = np.random.laplace(0, scale)
+                noise = rng.laplace(0, scale)
                 noise = max(-max_noise, min(noise, max_noise))  # Limit the noise
                 noised_metrics[metric] = max(0, value + noise)  # Avoid negative values
                 print(f"Noisy target for {metric}: {noised_metrics[metric]:.4f} "
@@ -76,7 +77,7 @@ def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None
             
             else:
                 # Standard noise calculation for other metrics
-                noise = np.random.laplace(0, metric_sensitivity / metric_epsilon)
+                noise = rng.laplace(0, metric_sensitivity / metric_epsilon)
                 noised_metrics[metric] = max(0, value + noise)  
                 print(f"Noisy target for {metric}: {noised_metrics[metric]:.4f} "
                       f"(Original: {value:.4f}, Noise: {noise:.4f}, Epsilon: {metric_epsilon}, Sensitivity: {metric_sensitivity})")
@@ -92,7 +93,7 @@ def anonymize_graph(graph, xml_root, epsilon, sensitivity, original_metrics=None
             print(f"  {metric}: None (no update necessary)")
 
     #4. Customize the graph to the target metrics
-    adjusted_graph = adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity)
+    adjusted_graph = adjust_graph_to_target_metrics(graph, xml_root, epsilon, sensitivity, rng)
 
     print("Anonymization completed.")
     return adjusted_graph, noised_metrics
@@ -1,7 +1,8 @@
 import os
-from lxml import etree as ET  
 from collections import defaultdict
 import networkx as nx  
+from modules.xml_stream import iter_records
+from modules_graph.record_store import DATA_FOLDER, to_record_file
 
 
 G = nx.Graph()  
@@ -25,10 +26,7 @@ def extract_reference_types(folder_path, output_config_path):
             resource_type = filename.split(".")[0]
             file_path = os.path.join(folder_path, filename)
 
-            tree = ET.parse(file_path)
-            root = tree.getroot()
-
-            for i, record in enumerate(root.findall(".//record")):
+            for i, record in enumerate(iter_records(file_path)):
                 if i >= 10:
                     break
 
@@ -74,12 +72,12 @@ def load_or_create_config(folder_path, config_path):
     return graph_config
 
 
-def parse_and_add_nodes_edges(file_path, resource_type, graph_config):
-    tree = ET.parse(file_path)
-    root = tree.getroot()
-
-    for record in root.findall('.//record'):
-        add_record_with_full_xml(record, resource_type)
+def parse_and_add_nodes_edges(file_path, resource_type, graph_config, data_folder=DATA_FOLDER):
+    # Stream the records, ElementTree has no getparent(), so the parents are mapped per record
+    record_file = to_record_file(file_path, data_folder)
+    for record_index, record in enumerate(iter_records(file_path)):
+        parents = build_parent_map(record)
+        add_record_node(record, resource_type, record_file, record_index, parents)
 
         # ID of the current record (source)
         src_id = record.find('id').text
@@ -99,7 +97,7 @@ def parse_and_add_nodes_edges(file_path, resource_type, graph_config):
                     # Case 1: Reference to Organization, Practitioner or Location
                     if ref_resource in {"Organization", "Practitioner", "Location"}:
                         # Hole den <display>-Text
-                        parent = ref_tag.getparent()  
+                        parent = parents.get(ref_tag)
                         display_name = None
                         if parent is not None and parent.find("display") is not None:
                             display_name = parent.find("display").text.strip()
@@ -125,11 +123,39 @@ def parse_and_add_nodes_edges(file_path, resource_type, graph_config):
 
 
 
-def add_record_with_full_xml(record, resource_type):
+def build_parent_map(record):
+    """
+    Map every element of a record to its parent element.
+
+    Args:
+        record (Element): The <record> element.
+
+    Returns:
+        dict: {child: parent}
+    """
+    return {child: parent for parent in record.iter() for child in parent}
+
+
+def add_record_node(record, resource_type, record_file, record_index, parents=None):
+    """
+    Adds the node of a record. Instead of the serialized XML the node keeps a pointer to the record
+    (source file and index of the record in the file); the record is only materialized in the final write.
+
+    Args:
+        record (Element): The <record> element.
+        resource_type (str): Resource type of the record.
+        record_file (str): Path of the source XML file relative to the data folder (see to_record_file).
+        record_index (int): Index of the record in the source file.
+        parents (dict, optional): Parent map of the record (see build_parent_map).
+    """
+    if parents is None:
+        parents = build_parent_map(record)
+
     res_id = record.find('id').text
     attributes = {
         'resourceType': resource_type,
-        'full_record': ET.tostring(record, encoding="unicode").strip()  
+        'record_file': record_file,
+        'record_index': record_index,
     }
     G.add_node(res_id, **attributes)  
 
@@ -139,7 +165,8 @@ def add_record_with_full_xml(record, resource_type):
             ref_resource = ref_text.split("?")[0] if "?" in ref_text else ref_text.split("/")[0]
 
             if ref_resource in {"Practitioner", "Organization", "Location"}:
-                display_name = ref_tag.getparent().find("display").text if ref_tag.getparent() is not None else "Unknown"
+                parent = parents.get(ref_tag)
+                display_name = parent.find("display").text if parent is not None else "Unknown"
                 if not G.has_node(display_name):
                     G.add_node(display_name, resourceType=ref_resource, display_name=display_name)
 
@@ -4,10 +4,14 @@ from lxml import etree as ET
 
 import sys
 import os
+from contextlib import ExitStack
+from copy import deepcopy
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from config.graph_config import graph_config
 from graph_tracker import GraphTracker
+from modules_graph.record_store import get_pending_references, iter_graph_records
+from modules.rng import create_rng, create_seed_sequence
 import numpy as np
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,110 +35,102 @@ sensitivity_config = {
     "degree_centrality": 1,
 }
 
+# Seed of the graph anonymization (None = fresh entropy)
+seed = None
 
-def update_references_in_graph(graph):
+
+def update_references_in_record(graph, node, root):
     """
-    Update the references in the anonymized graph:
+    Update the references of a record of the anonymized graph (in place):
     - Removes references if the associated edge no longer exists.
     - Removes the associated 'display' values when the reference is deleted.
     - Removes empty XML tags that do not contain any further information.
-    - Add missing references if a relationship exists according to the graph.
+    - Add missing references if a relationship exists according to the graph
+      (the references recorded during the adjustment first, in the order in which they were added).
     
     Args:
         graph (nx.Graph): The anonymized graph.
+        node (str): ID of the node of the record.
+        root (lxml.etree.Element): The record.
     """
-    from lxml import etree as ET
-    from config.graph_config import graph_config
-
-    for node, data in graph.nodes(data=True):
-        if "full_record" not in data:
-            continue
-
-        full_record = data["full_record"]
-        resource_type = data["resourceType"]
-
-        try:
-            root = ET.fromstring(full_record)
-        except Exception as e:
-            print(f"Error parsing XML for node {node}: {e}")
-            continue
-
-        # 1. extract existing references (as dictionary: text -> element)
-        existing_refs = {}
-        for ref in root.findall(".//reference"):
-            if ref.text:
-                ref_text = ref.text.strip()
-                existing_refs[ref_text] = ref
-
-        # 2. Determine valid references: Based on the neighbors in the graph and the graph_config
-        valid_refs = set()
-        for neighbor in graph.neighbors(node):
-            neighbor_data = graph.nodes[neighbor]
-            neighbor_type = neighbor_data.get("resourceType")
-            if resource_type in graph_config and neighbor_type in graph_config[resource_type]:
-                valid_refs.add(f"{neighbor_type}/{neighbor}")
-
-        # 3. remove outdated references (not included in valid_refs)
-        for ref_text, ref_element in list(existing_refs.items()):
-            if ref_text not in valid_refs:
-                parent = ref_element.getparent()
-                if parent is not None:
-                    parent.remove(ref_element)
+    resource_type = graph.nodes[node]["resourceType"]
+
+    # 1. extract existing references (as dictionary: text -> element)
+    existing_refs = {}
+    for ref in root.findall(".//reference"):
+        if ref.text:
+            ref_text = ref.text.strip()
+            existing_refs[ref_text] = ref
+
+    # 2. Determine valid references: Based on the neighbors in the graph and the graph_config
+    valid_refs = set()
+    for neighbor in graph.neighbors(node):
+        neighbor_data = graph.nodes[neighbor]
+        neighbor_type = neighbor_data.get("resourceType")
+        if resource_type in graph_config and neighbor_type in graph_config[resource_type]:
+            valid_refs.add(f"{neighbor_type}/{neighbor}")
+
+    # 3. remove outdated references (not included in valid_refs)
+    for ref_text, ref_element in list(existing_refs.items()):
+        if ref_text not in valid_refs:
+            parent = ref_element.getparent()
+            if parent is not None:
+                parent.remove(ref_element)
+
+                display_elem = parent.find("display")
+                if display_elem is not None:
+                    parent.remove(display_elem)
+        
 
-                    display_elem = parent.find("display")
-                    if display_elem is not None:
-                        parent.remove(display_elem)
-            
+    #4. Recursively remove empty XML tags
+    def remove_empty_elements(element):
+        for child in list(element):
+            remove_empty_elements(child)
+            if (child.text is None or child.text.strip() == "") and len(child) == 0:
+                element.remove(child)
+    remove_empty_elements(root)
+
+    #5. Add missing references (only if they don't already exist): the references recorded during the
+    #   adjustment in their order, then the others
+    pending_refs = [ref_text for ref_text in get_pending_references(graph.nodes[node]) if ref_text in valid_refs]
+    for ref_text in pending_refs + sorted(valid_refs.difference(pending_refs)):
+        if ref_text not in existing_refs:
+            try:
+                target_type, target_id = ref_text.split("/", 1)
+            except ValueError:
+                print(f"Invalid reference format: {ref_text}. skip.")
+                continue
 
-        #4. Recursively remove empty XML tags
-        def remove_empty_elements(element):
-            for child in list(element):
-                remove_empty_elements(child)
-                if (child.text is None or child.text.strip() == "") and len(child) == 0:
-                    element.remove(child)
-        remove_empty_elements(root)
-
-        #5. Add missing references (only if they don't already exist)
-        for ref_text in valid_refs:
-            if ref_text not in existing_refs:
-                try:
-                    target_type, target_id = ref_text.split("/", 1)
-                except ValueError:
-                    print(f"Invalid reference format: {ref_text}. skip.")
-                    continue
+            
+            new_ref = ET.Element("reference")
+            new_ref.text = ref_text
+            new_ref.tail = "\n    "  
 
-                
-                new_ref = ET.Element("reference")
-                new_ref.text = ref_text
-                new_ref.tail = "\n    "  
+            
+            last_occurrence = None
+            for ref in root.iter("reference"):
+                if ref.text and ref.text.strip().startswith(target_type + "/"):
+                    last_occurrence = ref
 
-                
-                last_occurrence = None
-                for ref in root.iter("reference"):
-                    if ref.text and ref.text.strip().startswith(target_type + "/"):
-                        last_occurrence = ref
-
-                if last_occurrence is not None:
-                    parent = last_occurrence.getparent()
-                    if parent is not None:
-                        index = parent.index(last_occurrence)
-                        parent.insert(index + 1, new_ref)
-                        
-                    else:
-                        root.append(new_ref)
-                        
-                else:
+            if last_occurrence is not None:
+                parent = last_occurrence.getparent()
+                if parent is not None:
+                    index = parent.index(last_occurrence)
+                    parent.insert(index + 1, new_ref)
                     
+                else:
                     root.append(new_ref)
                     
-
-        # 6. Update the node's “full_record”
-        graph.nodes[node]["full_record"] = ET.tostring(root, encoding="unicode", pretty_print=True)
+            else:
+                
+                root.append(new_ref)
 
 def save_records_by_resource_type(graph, output_dir):
     """
     Saves the anonymized records from the graph in separate XML files
-    based on the resource type.
+    based on the resource type. This is the final streaming write: the records are read from their
+    source files (see iter_graph_records), their references are updated (see update_references_in_record)
+    and they are written incrementally, so every record is parsed and serialized exactly once.
 
     Args:
         graph (nx.Graph): The anonymized graph.
@@ -143,45 +139,42 @@ def save_records_by_resource_type(graph, output_dir):
     
     os.makedirs(output_dir, exist_ok=True)
 
-  
-    resource_records = {}
-
-    for node, data in graph.nodes(data=True):
-        if "resourceType" in data and "full_record" in data:
-            resource_type = data["resourceType"]
-            if resource_type not in resource_records:
-                resource_records[resource_type] = []
-            try:
-                record_xml = ET.fromstring(data["full_record"])
-                resource_records[resource_type].append(record_xml)
-            except ET.XMLSyntaxError as e:
-                print(f"failed to parse {node}: {e}")
-
-    # Write each group in a separate XML file
-    for resource_type, records in resource_records.items():
+    # One incremental writer per resource type, opened with the first record of the type
+    writers = {}
+    with ExitStack() as stack:
+        for node, resource_type, record in iter_graph_records(graph):
+            writer = writers.get(resource_type)
+            if writer is None:
+                resource_file_path = os.path.join(output_dir, f"{resource_type}.xml")
+                writer = stack.enter_context(ET.xmlfile(resource_file_path, encoding="utf-8"))
+                writer.write_declaration()
+                stack.enter_context(writer.element("records"))
+                writer.write("\n")
+                writers[resource_type] = writer
+
+            update_references_in_record(graph, node, record)
+            record.tail = None
+            writer.write(record, pretty_print=True)
+
+    for resource_type in writers:
         resource_file_path = os.path.join(output_dir, f"{resource_type}.xml")
-        root = ET.Element("records")  
-        root.extend(records)  
-        tree = ET.ElementTree(root)
-        tree.write(resource_file_path, pretty_print=True, encoding="utf-8", xml_declaration=True)
         print(f"Resources of type {resource_type} saved in: {resource_file_path}")
 
 
 def extract_xml_root_from_graph(graph):
     """
-    Extracts the XML root from the 'full_record' attributes of the nodes in the graph.
+    Extracts the XML root from the records of the nodes in the graph (see iter_graph_records).
 
     Args:
-        graph (nx.Graph): The graph with the XML records in the nodes.
+        graph (nx.Graph): The graph with the record pointers (or XML records) in the nodes.
 
     Returns:
-        xml.etree.ElementTree.Element: The combined XML root.
+        lxml.etree.Element: The combined XML root.
     """
     root = ET.Element("records") 
-    for node, data in graph.nodes(data=True):
-        if "full_record" in data:
-            record_xml = ET.fromstring(data["full_record"])
-            root.append(record_xml)
+    for node, resource_type, record in iter_graph_records(graph):
+        # The streamed record still belongs to the tree of its source file
+        root.append(deepcopy(record))
     return root
 
 def remove_isolated_nodes(graph):
@@ -215,11 +208,14 @@ def main():
 
         
         print("\nStart anonymization...")
+        seed_sequence = create_seed_sequence(seed)
+        print(f"Seed of the run: {seed_sequence.entropy}")
         anonymized_graph, noised_metrics = anonymize_graph(
             graph, 
             xml_root, 
             epsilon_config, 
-            sensitivity_config
+            sensitivity_config,
+            rng=create_rng(seed_sequence, "graph")
         )
 
       
@@ -255,12 +251,7 @@ def main():
         print("done.")
 
         
-        print("\nUpdate the references in the anonymized graph...")
-        update_references_in_graph(anonymized_graph)
-        print("done.")
-
-       
-        print("\nSave anonymized resources in separate files...")
+        print("\nUpdate the references and save anonymized resources in separate files...")
         save_records_by_resource_type(anonymized_graph, output_folder)
         print("done.")
 
@@ -0,0 +1,389 @@
+import numpy as np
+import networkx as nx
+
+
+class CandidateSet:
+    """
+    Set of nodes or node pairs with O(1) insertion, removal and uniform random draws. The items are kept in
+    a list together with their positions; a removed item is replaced by the last item of the list.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.positions = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        position = self.positions.pop(item, None)
+        if position is None:
+            return
+        last_item = self.items.pop()
+        if position < len(self.items):
+            self.items[position] = last_item
+            self.positions[last_item] = position
+
+    def choice(self, rng):
+        """
+        Args:
+            rng (np.random.Generator): Random generator of the run.
+
+        Returns:
+            A random item of the set.
+        """
+        return self.items[rng.integers(len(self.items))]
+
+
+class GraphMetricsTracker:
+    """
+    Keeps the Patient metrics of a graph up to date while Algorithm 3 adjusts it.
+
+    The tracker maintains an index of the nodes by resourceType (nodes_by_type), the index of the Patient
+    nodes, the sum of their degrees and the number of triangles through every Patient node. Like GraphTracker,
+    it wraps add_edge, remove_edge, add_node and remove_node of the graph instance, so every change updates the
+    running values in O(1) (degrees) or O(deg) (triangles through the common neighbors of the edge). The
+    average degree, degree centrality and clustering coefficient of the Patient nodes are then available
+    without scanning the graph.
+
+    The triangle counts are only set up when the clustering coefficient is first needed, so adjusting the
+    degree metrics costs no triangle counting. Algorithm 3 draws the edges that close or open a triangle by
+    rejection sampling over the neighbors (sample_open_wedge, sample_triangle_edge), the neighbor pairs
+    themselves are never stored.
+    """
+
+    def __init__(self, graph, is_candidate_pair=None):
+        """
+        Args:
+            graph (nx.Graph): The graph.
+            is_candidate_pair (callable, optional): Filter for the open wedges, called with two node IDs
+                                                    (e.g. is_valid_connection). If None, all pairs are accepted.
+        """
+        self.graph = graph
+        self.is_candidate_pair = is_candidate_pair
+        self.nodes_by_type = {}
+        self.patient_nodes = {}  # Insertion-ordered index of the Patient nodes (same order as graph.nodes)
+        self.degree_sum = 0
+        self.tracks_clustering = False
+        self.triangles = {}
+        self.clustering = {}
+        self.clustering_sum = 0.0
+        self.wrapped_methods = {}
+
+        for node, data in graph.nodes(data=True):
+            self.nodes_by_type.setdefault(data.get("resourceType"), CandidateSet()).add(node)
+            if data.get("resourceType") == "Patient":
+                self.add_patient(node)
+
+    def __enter__(self):
+        return self.attach()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.detach()
+
+    def attach(self):
+        """
+        Wraps the graph methods that change the structure (the methods already patched by a GraphTracker
+        are wrapped in turn, so both trackers see every change).
+
+        Returns:
+            GraphMetricsTracker: The tracker itself.
+        """
+        for name in ("add_edge", "remove_edge", "add_node", "remove_node"):
+            self.wrapped_methods[name] = (name in vars(self.graph), getattr(self.graph, name))
+            setattr(self.graph, name, getattr(self, name))
+        return self
+
+    def detach(self):
+        """
+        Restores the graph methods that were wrapped by attach.
+        """
+        for name, (was_patched, method) in self.wrapped_methods.items():
+            if was_patched:
+                setattr(self.graph, name, method)
+            else:
+                delattr(self.graph, name)
+        self.wrapped_methods = {}
+
+    # ----- Graph methods -----
+
+    def add_edge(self, u, v, **attr):
+        is_new_edge = not self.graph.has_edge(u, v)
+        self.wrapped_methods["add_edge"][1](u, v, **attr)
+        if not is_new_edge:
+            return
+
+        for node in (u, v):
+            if node in self.patient_nodes:
+                self.degree_sum += 1
+        if u == v or not self.tracks_clustering:
+            return
+
+        common_neighbors = self.common_neighbors(u, v)
+        self.change_triangles(u, len(common_neighbors))
+        self.change_triangles(v, len(common_neighbors))
+        for node in common_neighbors:
+            self.change_triangles(node, 1)
+
+    def remove_edge(self, u, v):
+        common_neighbors = []
+        if self.tracks_clustering and u != v and self.graph.has_edge(u, v):
+            common_neighbors = self.common_neighbors(u, v)
+        self.wrapped_methods["remove_edge"][1](u, v)
+
+        for node in (u, v):
+            if node in self.patient_nodes:
+                self.degree_sum -= 1
+        if u == v:
+            return
+
+        self.change_triangles(u, -len(common_neighbors))
+        self.change_triangles(v, -len(common_neighbors))
+        for node in common_neighbors:
+            self.change_triangles(node, -1)
+
+    def add_node(self, node, **attr):
+        previous_type = self.graph.nodes[node].get("resourceType") if self.graph.has_node(node) else None
+        self.wrapped_methods["add_node"][1](node, **attr)
+        resource_type = self.graph.nodes[node].get("resourceType")
+        if previous_type != resource_type and previous_type in self.nodes_by_type:
+            self.nodes_by_type[previous_type].discard(node)
+        self.nodes_by_type.setdefault(resource_type, CandidateSet()).add(node)
+
+        is_patient = resource_type == "Patient"
+        if is_patient and node not in self.patient_nodes:
+            self.add_patient(node)
+        elif not is_patient and node in self.patient_nodes:
+            self.remove_patient(node)
+
+    def remove_node(self, node):
+        # Triangles through the removed node are lost by its Patient neighbors
+        lost_triangles = {}
+        if self.graph.has_node(node):
+            lost_triangles = {
+                neighbor: len(self.common_neighbors(node, neighbor)) if self.tracks_clustering else 0
+                for neighbor in self.graph[node] if neighbor != node and neighbor in self.patient_nodes
+            }
+            resource_type = self.graph.nodes[node].get("resourceType")
+            if resource_type in self.nodes_by_type:
+                self.nodes_by_type[resource_type].discard(node)
+        if node in self.patient_nodes:
+            self.remove_patient(node)
+
+        self.wrapped_methods["remove_node"][1](node)
+
+        for neighbor, count in lost_triangles.items():
+            self.degree_sum -= 1
+            self.change_triangles(neighbor, -count)
+
+    # ----- Bookkeeping -----
+
+    def common_neighbors(self, u, v):
+        """
+        Returns the common neighbors of two nodes (without the nodes themselves), iterating the smaller
+        neighborhood.
+        """
+        adjacency = self.graph.adj
+        if len(adjacency[u]) > len(adjacency[v]):
+            u, v = v, u
+        return [node for node in adjacency[u] if node in adjacency[v] and node != u and node != v]
+
+    def is_candidate(self, u, v):
+        return self.is_candidate_pair is None or self.is_candidate_pair(u, v)
+
+    def add_patient(self, node):
+        self.patient_nodes[node] = None
+        self.degree_sum += self.graph.degree(node)
+        if self.tracks_clustering:
+            self.triangles[node] = nx.triangles(self.graph, node)
+            self.update_clustering(node)
+
+    def remove_patient(self, node):
+        del self.patient_nodes[node]
+        self.degree_sum -= self.graph.degree(node)
+        if self.tracks_clustering:
+            self.clustering_sum -= self.clustering.pop(node)
+            del self.triangles[node]
+
+    def track_clustering(self):
+        """
+        Counts the triangles of all Patient nodes once; from then on every change updates them.
+        """
+        if self.tracks_clustering:
+            return
+        self.tracks_clustering = True
+        for node in self.patient_nodes:
+            self.triangles[node] = nx.triangles(self.graph, node)
+            self.update_clustering(node)
+
+    def change_triangles(self, node, delta):
+        if self.tracks_clustering and node in self.patient_nodes:
+            self.triangles[node] += delta
+            self.update_clustering(node)
+
+    def update_clustering(self, node):
+        """
+        Updates the clustering coefficient of a Patient node from its triangle count and degree
+        (self-loops are ignored, as in nx.clustering).
+        """
+        neighbors = self.graph.adj[node]
+        degree = len(neighbors) - (node in neighbors)
+        clustering = 2 * self.triangles[node] / (degree * (degree - 1)) if degree > 1 else 0.0
+        self.clustering_sum += clustering - self.clustering.get(node, 0.0)
+        self.clustering[node] = clustering
+
+    # ----- Sampling -----
+
+    def sample_open_wedge(self, node, rng, max_attempts=64):
+        """
+        Draws two random neighbors of a Patient node that are not connected and pass the candidate filter,
+        i.e. an edge that closes a new triangle. Pairs that are connected or filtered out are rejected. If the
+        random draws only hit such pairs, the pairs of neighbors are scanned in random order.
+
+        Args:
+            node (str): ID of the Patient node.
+            rng (np.random.Generator): Random generator of the run.
+            max_attempts (int): Number of random draws before the scan.
+
+        Returns:
+            tuple: The two neighbors, or None if no pair of neighbors is open and passes the filter.
+        """
+        self.track_clustering()
+        neighbors = [neighbor for neighbor in self.graph.adj[node] if neighbor != node]
+        degree = len(neighbors)
+        # Every pair of neighbors is already connected
+        if degree < 2 or self.triangles[node] >= degree * (degree - 1) // 2:
+            return None
+
+        adjacency = self.graph.adj
+        for _ in range(max_attempts):
+            index1 = int(rng.integers(degree))
+            index2 = int(rng.integers(degree - 1))
+            neighbor1 = neighbors[index1]
+            neighbor2 = neighbors[index2 + (index2 >= index1)]
+            if neighbor2 not in adjacency[neighbor1] and self.is_candidate(neighbor1, neighbor2):
+                return neighbor1, neighbor2
+
+        # Every pair is visited once: each neighbor in random order with the neighbors after it in that order
+        order = [neighbors[index] for index in rng.permutation(degree).tolist()]
+        for position, neighbor1 in enumerate(order[:-1]):
+            for neighbor2 in order[position + 1:]:
+                if neighbor2 not in adjacency[neighbor1] and self.is_candidate(neighbor1, neighbor2):
+                    return neighbor1, neighbor2
+        return None
+
+    def sample_triangle_edge(self, node, rng, max_attempts=64):
+        """
+        Draws an edge between two neighbors of a Patient node, i.e. an edge that opens a triangle: a random
+        neighbor is drawn and its adjacency is intersected with the one of the Patient node. If the random
+        draws only hit neighbors outside a triangle, the neighbors are scanned in random order.
+
+        Args:
+            node (str): ID of the Patient node.
+            rng (np.random.Generator): Random generator of the run.
+            max_attempts (int): Number of random draws before the scan.
+
+        Returns:
+            tuple: The two neighbors, or None if the Patient node lies on no triangle.
+        """
+        self.track_clustering()
+        if not self.triangles[node]:
+            return None
+
+        neighbors = [neighbor for neighbor in self.graph.adj[node] if neighbor != node]
+        draws = rng.integers(len(neighbors), size=min(max_attempts, len(neighbors)))
+        for index in (*draws.tolist(), *rng.permutation(len(neighbors)).tolist()):
+            common_neighbors = self.common_neighbors(node, neighbors[index])
+            if common_neighbors:
+                return neighbors[index], common_neighbors[rng.integers(len(common_neighbors))]
+        return None
+
+    def sample_nodes(self, resource_types, size, rng):
+        """
+        Draws distinct nodes uniformly from the nodes of the given resource types, without building the
+        list of candidates: the indices are drawn over the concatenated type buckets and mapped to the
+        buckets by their offsets.
+
+        Args:
+            resource_types (iterable): The resource types of the candidates.
+            size (int): Number of nodes (at most the number of candidates).
+            rng (np.random.Generator): Random generator of the run.
+
+        Returns:
+            list: The drawn nodes in random order (empty if there are no candidates).
+        """
+        buckets = [self.nodes_by_type[resource_type] for resource_type in resource_types
+                   if self.nodes_by_type.get(resource_type)]
+        if not buckets:
+            return []
+
+        bucket_sizes = np.array([len(bucket) for bucket in buckets])
+        bucket_ends = np.cumsum(bucket_sizes)
+        total = int(bucket_ends[-1])
+        indices = rng.choice(total, size=min(size, total), replace=False)
+        bucket_indices = np.searchsorted(bucket_ends, indices, side="right")
+        offsets = indices - (bucket_ends - bucket_sizes)[bucket_indices]
+        return [
+            buckets[bucket_index].items[offset]
+            for bucket_index, offset in zip(bucket_indices.tolist(), offsets.tolist())
+        ]
+
+    # ----- Metrics -----
+
+    def average_degree(self):
+        """
+        Returns:
+            float: The average degree of the Patient nodes (see calculate_degree_distribution).
+        """
+        return self.degree_sum / len(self.patient_nodes) if self.patient_nodes else 0
+
+    def degree_centrality(self):
+        """
+        Returns:
+            dict: The degree centrality of every Patient node (see calculate_degree_centrality).
+        """
+        num_patient_nodes = len(self.patient_nodes)
+        if num_patient_nodes <= 1:
+            return {}
+        return {node: self.graph.degree(node) / (num_patient_nodes - 1) for node in self.patient_nodes}
+
+    def average_degree_centrality(self):
+        """
+        Returns:
+            float: The average degree centrality of the Patient nodes.
+        """
+        num_patient_nodes = len(self.patient_nodes)
+        if num_patient_nodes <= 1:
+            return 0
+        return self.degree_sum / (num_patient_nodes * (num_patient_nodes - 1))
+
+    def average_clustering(self):
+        """
+        Returns:
+            float: The average clustering coefficient of the Patient nodes (see calculate_clustering_coefficient).
+        """
+        self.track_clustering()
+        # The running sum may drift by rounding errors just below zero
+        return max(0.0, self.clustering_sum / len(self.patient_nodes)) if self.patient_nodes else 0.0
+
+    def metrics(self):
+        """
+        Returns:
+            dict: The current metrics in the format of calculate_graph_metrics.
+        """
+        return {
+            "degree_distribution": self.average_degree(),
+            "clustering_coefficient": self.average_clustering(),
+            "degree_centrality": self.average_degree_centrality(),
+        }
@@ -1,6 +1,7 @@
 import os
 import xml.etree.ElementTree as ET
 import json
+from modules.xml_stream import iter_records
 
 
 def analyze_dataset_and_create_node_config(dataset_path, config_path):
@@ -24,11 +25,8 @@ def analyze_dataset_and_create_node_config(dataset_path, config_path):
             
             
             try:
-                tree = ET.parse(file_path)
-                root = tree.getroot()
-                
-                
-                first_record = root.find(".//record")
+                # Only the first record is needed, stop reading after it
+                first_record = next(iter_records(file_path), None)
                 if first_record is None:
                     print(f"Keine <record>-Einträge in Datei {filename} gefunden.")
                     continue
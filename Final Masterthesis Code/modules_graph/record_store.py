@@ -0,0 +1,139 @@
+import os
+
+from lxml import etree as ET
+
+from modules.xml_stream import iter_records
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Folder the record_file of a node is relative to, so the GraphML stays valid when the project is moved
+DATA_FOLDER = os.path.join(BASE_DIR, "data")
+
+# Separator of the pending references of a node (GraphML only stores scalar attributes, display names may contain spaces)
+REFERENCE_SEPARATOR = "\n"
+
+
+def to_record_file(file_path, data_folder=DATA_FOLDER):
+    """
+    Args:
+        file_path (str): Path of a source XML file inside the data folder.
+        data_folder (str): The data folder.
+
+    Returns:
+        str: The path relative to the data folder, with "/" as separator (the record_file of a node).
+    """
+    return os.path.relpath(os.path.abspath(file_path), data_folder).replace(os.sep, "/")
+
+
+def resolve_record_file(record_file, data_folder=DATA_FOLDER):
+    """
+    Args:
+        record_file (str): The record_file of a node (see to_record_file).
+        data_folder (str): The data folder.
+
+    Returns:
+        str: The path of the source XML file.
+    """
+    return os.path.join(data_folder, *record_file.split("/"))
+
+
+def has_record(node_data):
+    """
+    Checks whether a node has an XML record: a pointer into the source file (record_file, record_index)
+    or, for dummy nodes, the generated XML string (full_record).
+
+    Args:
+        node_data (dict): The attributes of the node.
+
+    Returns:
+        bool: True if the node has a record.
+    """
+    return "record_file" in node_data or "full_record" in node_data
+
+
+def get_pending_references(node_data):
+    """
+    Args:
+        node_data (dict): The attributes of the node.
+
+    Returns:
+        list: The references added to the node during the adjustment, in the order in which they were added.
+    """
+    references = node_data.get("references")
+    return references.split(REFERENCE_SEPARATOR) if references else []
+
+
+def add_pending_reference(node_data, reference_text):
+    """
+    Records a reference for the node in its compact reference list. The XML record is not touched,
+    the reference is written in the final streaming write (see save_records_by_resource_type).
+
+    Args:
+        node_data (dict): The attributes of the node.
+        reference_text (str): The reference, e.g. "Patient/<id>".
+
+    Returns:
+        bool: False if the reference was already recorded, otherwise True.
+    """
+    references = get_pending_references(node_data)
+    if reference_text in references:
+        return False
+    node_data["references"] = REFERENCE_SEPARATOR.join(references + [reference_text])
+    return True
+
+
+def iter_graph_records(graph, data_folder=DATA_FOLDER):
+    """
+    Materializes the XML records of the graph nodes. Every source file is streamed once and only the
+    records that nodes point to are yielded, followed by the records of the dummy nodes. The source files
+    must not change between building the graph and the final write, a record whose ID does not match its
+    node raises a ValueError.
+
+    Args:
+        graph (nx.Graph): The graph.
+        data_folder (str): The folder the record_file of the nodes is relative to.
+
+    Yields:
+        tuple: (node ID, resource type, record as lxml element)
+    """
+    nodes_by_file = {}
+    inline_nodes = []
+    for node, data in graph.nodes(data=True):
+        if "resourceType" not in data:
+            continue
+        if "record_file" in data:
+            nodes_by_file.setdefault(data["record_file"], {})[int(data["record_index"])] = node
+        elif "full_record" in data:
+            inline_nodes.append(node)
+
+    for record_file, nodes_by_index in nodes_by_file.items():
+        file_path = resolve_record_file(record_file, data_folder)
+        remaining = len(nodes_by_index)
+        for index, record in enumerate(iter_records(file_path, iterparse=ET.iterparse)):
+            node = nodes_by_index.get(index)
+            if node is None:
+                continue
+            record_id = record.findtext("id")
+            if record_id != node:
+                raise ValueError(
+                    f"Record {index} of {file_path} has the ID {record_id}, but belongs to node {node}. "
+                    f"The source file changed after the graph was built."
+                )
+            yield node, graph.nodes[node]["resourceType"], record
+            remaining -= 1
+            if remaining == 0:
+                break
+
+        if remaining:
+            raise ValueError(
+                f"{file_path} has fewer records than the graph nodes point to. "
+                f"The source file changed after the graph was built."
+            )
+
+    for node in inline_nodes:
+        try:
+            record = ET.fromstring(graph.nodes[node]["full_record"])
+        except ET.XMLSyntaxError as e:
+            print(f"failed to parse {node}: {e}")
+            continue
+        yield node, graph.nodes[node]["resourceType"], record
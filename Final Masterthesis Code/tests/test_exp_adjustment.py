@@ -0,0 +1,24 @@
+import math
+
+import numpy as np
+
+from modules.exp_adjustment import erfc, expected_absolute_value
+
+
+def test_erfc_matches_math_erfc():
+    x = np.linspace(-6, 6, 2001)
+    expected = np.array([math.erfc(value) for value in x])
+
+    assert np.allclose(erfc(x), expected, rtol=2e-7, atol=0)
+
+
+def test_expected_absolute_value_matches_folded_normal_mean():
+    mu = np.array([-2.0, 0.0, 0.5, 3.0])
+    sigma = np.array([1.0, 2.0, 0.0, 0.5])
+    expected = [
+        s * math.sqrt(2 / math.pi) * math.exp(-m ** 2 / (2 * s ** 2)) + m * math.erf(m / (s * math.sqrt(2)))
+        if s > 0 else abs(m)
+        for m, s in zip(mu, sigma)
+    ]
+
+    assert np.allclose(expected_absolute_value(mu, sigma), expected, rtol=1e-6)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from modules.mechanisms import ExponentialSampler, exponential_mechanism_with_noisy_counters
+
+
+def draw_with_sampler(utility_scores, counters, epsilon, size, trials, rng):
+    keys = list(counters)
+    draws = np.empty((trials, size), dtype=np.int64)
+    for trial in range(trials):
+        sampler = ExponentialSampler(utility_scores, counters, epsilon, rng=rng)
+        draws[trial] = [keys.index(key) for key in sampler.sample(size)]
+    return draws
+
+
+def draw_with_baseline(utility_scores, counters, epsilon, size, trials, rng):
+    keys = list(counters)
+    draws = np.empty((trials, size), dtype=np.int64)
+    for trial in range(trials):
+        remaining = dict(counters)
+        draws[trial] = [
+            keys.index(exponential_mechanism_with_noisy_counters(utility_scores, remaining, epsilon, None, "x", rng))
+            for _ in range(size)
+        ]
+    return draws
+
+
+def position_frequencies(draws, num_keys):
+    return np.array([np.bincount(column, minlength=num_keys) / draws.shape[0] for column in draws.T])
+
+
+def test_first_draw_does_not_weight_by_remaining_count():
+    rng = np.random.default_rng(0)
+    draws = draw_with_sampler({"A": 0.5, "B": 0.5}, {"A": 100, "B": 1}, 1.0, 1, 4000, rng)
+    assert abs(np.mean(draws[:, 0] == 1) - 0.5) < 0.04
+
+
+def test_draw_distribution_matches_baseline_on_skewed_counts():
+    utility_scores = {"a": 0.2, "b": 0.5, "c": 1.0}
+    counters = {"a": 50, "b": 2, "c": 1}
+    sampler_draws = draw_with_sampler(utility_scores, counters, 2.0, 4, 4000, np.random.default_rng(1))
+    baseline_draws = draw_with_baseline(utility_scores, counters, 2.0, 4, 4000, np.random.default_rng(2))
+
+    difference = position_frequencies(sampler_draws, 3) - position_frequencies(baseline_draws, 3)
+    assert np.abs(difference).max() < 0.05
+
+
+def test_sampling_stops_when_all_counters_are_exhausted():
+    sampler = ExponentialSampler.from_arrays(np.array([0.0, 1.0, 2.0]), np.array([1, 3, 2]), 2.0,
+                                             rng=np.random.default_rng(3))
+    drawn = sampler.sample_indices(10)
+
+    assert np.bincount(drawn, minlength=3).tolist() == [1, 3, 2]
+    assert sampler.remaining() == 0
+    assert sampler.sample_indices(3).size == 0
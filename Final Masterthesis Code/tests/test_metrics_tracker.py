@@ -0,0 +1,43 @@
+import itertools
+
+import networkx as nx
+import numpy as np
+
+from modules_graph.metrics_tracker import GraphMetricsTracker
+
+
+def star_graph(num_leaves):
+    graph = nx.Graph()
+    graph.add_node("patient", resourceType="Patient")
+    leaves = [f"leaf{index}" for index in range(num_leaves)]
+    for leaf in leaves:
+        graph.add_node(leaf, resourceType="Observation")
+        graph.add_edge("patient", leaf)
+    return graph, leaves
+
+
+def test_sample_open_wedge_finds_single_open_pair_in_large_star():
+    graph, leaves = star_graph(200)
+    graph.add_edges_from(itertools.combinations(leaves, 2))
+    graph.remove_edge("leaf17", "leaf154")
+    tracker = GraphMetricsTracker(graph)
+
+    for seed in range(20):
+        wedge = tracker.sample_open_wedge("patient", np.random.default_rng(seed))
+        assert set(wedge) == {"leaf17", "leaf154"}
+
+
+def test_sample_open_wedge_finds_single_candidate_pair_in_large_star():
+    graph, leaves = star_graph(200)
+    tracker = GraphMetricsTracker(graph, lambda u, v: {u, v} == {"leaf3", "leaf121"})
+
+    for seed in range(20):
+        wedge = tracker.sample_open_wedge("patient", np.random.default_rng(seed))
+        assert set(wedge) == {"leaf3", "leaf121"}
+
+
+def test_sample_open_wedge_returns_none_without_candidate_pair():
+    graph, leaves = star_graph(50)
+    tracker = GraphMetricsTracker(graph, lambda u, v: False)
+
+    assert tracker.sample_open_wedge("patient", np.random.default_rng(0)) is None
@@ -0,0 +1,55 @@
+import networkx as nx
+import pytest
+
+from modules_graph.record_store import iter_graph_records, resolve_record_file, to_record_file
+
+
+def write_records(path, ids):
+    records = "".join(f"<record><id>{record_id}</id></record>" for record_id in ids)
+    path.write_text(f"<?xml version='1.0' encoding='utf-8'?><records>{records}</records>", encoding="utf-8")
+
+
+def record_graph(data_folder, ids):
+    graph = nx.Graph()
+    for index, record_id in enumerate(ids):
+        graph.add_node(record_id, resourceType="Patient",
+                       record_file=to_record_file(data_folder / "anonymized" / "Patient.xml", data_folder),
+                       record_index=index)
+    return graph
+
+
+def test_record_file_is_relative_to_data_folder(tmp_path):
+    record_file = to_record_file(tmp_path / "anonymized" / "Patient.xml", tmp_path)
+
+    assert record_file == "anonymized/Patient.xml"
+    assert resolve_record_file(record_file, tmp_path) == str(tmp_path / "anonymized" / "Patient.xml")
+
+
+def test_iter_graph_records_streams_records_of_moved_data_folder(tmp_path):
+    (tmp_path / "anonymized").mkdir()
+    write_records(tmp_path / "anonymized" / "Patient.xml", ["p1", "p2", "p3"])
+    graph = record_graph(tmp_path, ["p1", "p2", "p3"])
+    graph.remove_node("p2")
+    moved_folder = tmp_path.rename(tmp_path.with_name(tmp_path.name + "_moved"))
+
+    records = [(node, record.findtext("id")) for node, _, record in iter_graph_records(graph, moved_folder)]
+
+    assert records == [("p1", "p1"), ("p3", "p3")]
+
+
+def test_iter_graph_records_rejects_changed_source_file(tmp_path):
+    (tmp_path / "anonymized").mkdir()
+    graph = record_graph(tmp_path, ["p1", "p2"])
+    write_records(tmp_path / "anonymized" / "Patient.xml", ["p2", "p1"])
+
+    with pytest.raises(ValueError, match="has the ID p2, but belongs to node p1"):
+        list(iter_graph_records(graph, tmp_path))
+
+
+def test_iter_graph_records_rejects_truncated_source_file(tmp_path):
+    (tmp_path / "anonymized").mkdir()
+    graph = record_graph(tmp_path, ["p1", "p2"])
+    write_records(tmp_path / "anonymized" / "Patient.xml", ["p1"])
+
+    with pytest.raises(ValueError, match="fewer records"):
+        list(iter_graph_records(graph, tmp_path))